@@ -0,0 +1,75 @@
+import argparse
+import os
+import sys
+import time
+import pandas as pd
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+# Get current file directory
+current_dir = os.path.dirname(__file__)
+
+# Get project root directory
+project_dir = os.path.abspath(os.path.join(current_dir, '..'))
+
+# Get file .env directory
+env_path = os.path.join(project_dir, '.env')
+
+# Import the pipeline modules the same way main.py does
+sys.path.insert(0, os.path.join(project_dir, 'source'))
+
+from transform import cleaning_data
+from load import loadtodb
+
+def make_rows(n_rows):
+    # Repeat the transformed rows of data.csv up to n_rows, with unique link_description
+    df = pd.read_csv(os.path.join(project_dir, 'data', 'data.csv'))
+    df['created_date'] = pd.to_datetime(df['created_date'])
+    cleaning_data(df)
+
+    df = df.sample(n=n_rows, replace=True, random_state=0).reset_index(drop=True)
+    df['link_description'] = df['link_description'] + '&bench=' + df.index.astype(str)
+    return df
+
+def bench_load(df, db_conn_uri, tgt_table, use_copy):
+    engine = create_engine(db_conn_uri)
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP TABLE IF EXISTS {tgt_table}"))
+
+    start = time.perf_counter()
+    loadtodb(df, db_conn_uri, tgt_table, use_copy=use_copy)
+    elapsed = time.perf_counter() - start
+
+    with engine.begin() as connection:
+        loaded = connection.execute(text(f"SELECT COUNT(*) FROM {tgt_table}")).scalar()
+        connection.execute(text(f"DROP TABLE IF EXISTS {tgt_table}"))
+    engine.dispose()
+
+    if loaded != len(df):
+        raise RuntimeError(f"Only {loaded}/{len(df)} rows were loaded")
+    return elapsed
+
+if __name__ == '__main__':
+    # Compare rows/sec of the COPY path and the to_sql (INSERT) path of loadtodb
+    # Usage: python benchmark/bench_load.py --rows 100000 1000000
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--table', default='Bench_JobList')
+    args = parser.parse_args()
+
+    load_dotenv(dotenv_path=env_path)
+
+    db_host = os.environ.get('DB_HOST')
+    db_port = os.environ.get('DB_PORT')
+    db_name = os.environ.get('DB_NAME')
+    db_user = os.environ.get('DB_USER')
+    db_pass = os.environ.get('DB_PASS')
+
+    db_conn_uri = f'postgresql://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}'
+
+    for n_rows in args.rows:
+        df = make_rows(n_rows)
+
+        for use_copy, name in [(False, 'to_sql'), (True, 'copy')]:
+            elapsed = bench_load(df, db_conn_uri, args.table, use_copy)
+            print(f"{name:>7} | {n_rows:>9} rows | {elapsed:8.2f} s | {n_rows / elapsed:10.0f} rows/sec")
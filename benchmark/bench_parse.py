@@ -0,0 +1,64 @@
+import argparse
+import glob
+import os
+import sys
+import time
+
+# Get current file directory
+current_dir = os.path.dirname(__file__)
+
+# Get project root directory
+project_dir = os.path.abspath(os.path.join(current_dir, '..'))
+
+# Import the pipeline modules the same way main.py does
+sys.path.insert(0, os.path.join(project_dir, 'source'))
+
+from data_scrapping_TopCV import parse_job_list, parse_job_item, parse_job_detail, parser_backends
+
+def load_pages(fixture_dir):
+    # Saved pages of the directory: listing_*.html and detail_*.html
+    pages = {}
+    for kind in ['listing', 'detail']:
+        pages[kind] = []
+        for path in sorted(glob.glob(os.path.join(fixture_dir, f'{kind}_*.html'))):
+            with open(path, encoding='utf-8') as f:
+                pages[kind].append(f.read())
+    return pages
+
+def parse_listing(html, backend):
+    return [parse_job_item(job) for job in parse_job_list(html, backend)]
+
+def bench_parse(pages, parse, backend, repeat):
+    # Return (pages/sec, CPU milliseconds per page)
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+
+    for _ in range(repeat):
+        for html in pages:
+            parse(html, backend)
+
+    elapsed_wall = time.perf_counter() - start_wall
+    elapsed_cpu = time.process_time() - start_cpu
+    n_pages = len(pages) * repeat
+
+    return n_pages / elapsed_wall, elapsed_cpu / n_pages * 1000
+
+if __name__ == '__main__':
+    # Compare the parsing backends on saved listing and detail pages
+    # Usage: python benchmark/bench_parse.py --fixtures test/fixtures/topcv --repeat 200
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fixtures', default=os.path.join(project_dir, 'test', 'fixtures', 'topcv'))
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--backends', nargs='+', default=list(parser_backends))
+    args = parser.parse_args()
+
+    pages = load_pages(args.fixtures)
+
+    for kind, parse in [('listing', parse_listing), ('detail', parse_job_detail)]:
+        if not pages[kind]:
+            print(f"No {kind} page in {args.fixtures}")
+            continue
+
+        for backend in args.backends:
+            pages_per_sec, cpu_ms = bench_parse(pages[kind], parse, backend, args.repeat)
+            print(f"{kind:>7} | {backend:>11} | {pages_per_sec:10.0f} pages/sec | {cpu_ms:8.3f} ms CPU/page")
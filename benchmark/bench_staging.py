@@ -0,0 +1,82 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+# Get current file directory
+current_dir = os.path.dirname(__file__)
+
+# Get project root directory
+project_dir = os.path.abspath(os.path.join(current_dir, '..'))
+
+# Import the pipeline modules the same way main.py does
+sys.path.insert(0, os.path.join(project_dir, 'source'))
+
+from staging import write_parquet, read_staging, job_columns
+
+def make_rows(n_rows, n_days):
+    # Repeat the rows of data.csv up to n_rows, spread over the last n_days days (data.csv has only one day)
+    df = pd.read_csv(os.path.join(project_dir, 'data', 'data.csv'))
+    df = df.sample(n=n_rows, replace=True, random_state=0).reset_index(drop=True)
+
+    days = np.random.default_rng(0).integers(0, n_days, n_rows)
+    df['created_date'] = (pd.Timestamp('2025-11-16') - pd.to_timedelta(days, unit='D')).strftime('%Y-%m-%d')
+    df['link_description'] = df['link_description'] + '&bench=' + df.index.astype(str)
+    return df
+
+def path_size(path):
+    # Size in bytes of a file, or of all the files of a directory
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def time_read(read, repeat):
+    # Best time of repeat reads
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df = read()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(df)
+
+if __name__ == '__main__':
+    # Compare file size and read time of the CSV and Parquet staging files
+    # Usage: python benchmark/bench_staging.py --rows 100000 1000000 --days 90
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--last-days', type=int, default=7)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for n_rows in args.rows:
+        df = make_rows(n_rows, args.days)
+        start_date = pd.Timestamp('2025-11-16') - pd.Timedelta(days=args.last_days - 1)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            csv_path = os.path.join(tmp_dir, 'data.csv')
+            parquet_path = os.path.join(tmp_dir, 'data.parquet')
+            df.to_csv(csv_path, index=False)
+            write_parquet(df, parquet_path)
+
+            print(f"--- {n_rows} rows, {args.days} days: CSV {path_size(csv_path) / 2 ** 20:.1f} MB, "
+                  f"Parquet {path_size(parquet_path) / 2 ** 20:.1f} MB ---")
+
+            cases = [
+                ('csv all', lambda: read_staging(csv_path)),
+                ('parquet all', lambda: read_staging(parquet_path)),
+                (f'csv last {args.last_days} days',
+                 lambda: read_staging(csv_path, columns=job_columns, start_date=start_date)),
+                (f'parquet last {args.last_days} days',
+                 lambda: read_staging(parquet_path, columns=job_columns, start_date=start_date)),
+                ('csv 3 columns', lambda: read_staging(csv_path, columns=['created_date', 'salary', 'address'])),
+                ('parquet 3 columns', lambda: read_staging(parquet_path, columns=['created_date', 'salary', 'address'])),
+            ]
+
+            for name, read in cases:
+                elapsed, n_read = time_read(read, args.repeat)
+                print(f"{name:>22} | {n_read:>9} rows | {elapsed:8.3f} s")
@@ -0,0 +1,140 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+# Get current file directory
+current_dir = os.path.dirname(__file__)
+
+# Get project root directory
+project_dir = os.path.abspath(os.path.join(current_dir, '..'))
+
+# Get file .env directory
+env_path = os.path.join(project_dir, '.env')
+
+# Import the pipeline modules the same way main.py does
+sys.path.insert(0, os.path.join(project_dir, 'source'))
+
+from staging import read_staging, job_columns
+from transform import cleaning_data
+from load import loadtodb
+from aggregates import agg_tables
+from report import draw_salary_stats, draw_job_heatmap, draw_techtrend
+from report_query import query_salary_stats, query_job_counts, query_tech_term_counts
+from techterms import get_tech_term_matcher
+from synthetic import write_jobs_csv
+
+def git_commit():
+    # Commit of the benchmarked code, to compare the results across commits
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=project_dir, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+class StageTimer:
+    # Time the stages of a run and keep the results as a list of dicts
+    def __init__(self):
+        self.results = []
+
+    def run(self, n_rows, stage, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        seconds = time.perf_counter() - start
+
+        self.results.append({'rows': n_rows, 'stage': stage, 'seconds': round(seconds, 6),
+                             'rows_per_sec': round(n_rows / seconds, 1) if seconds > 0 else None})
+        print(f"{n_rows:>9} rows | {stage:>24} | {seconds:9.3f} s")
+        return result
+
+def bench_rows(timer, n_rows, db_conn_uri, tgt_table, tmp_dir, typed, workers=1, partition_size=100000,
+               aggregates=False, convert_rate=25000):
+    csv_path = os.path.join(tmp_dir, f'jobs_{n_rows}.csv')
+    timer.run(n_rows, 'generate', write_jobs_csv, csv_path, n_rows)
+
+    # Extract and transform
+    df = timer.run(n_rows, 'extract', read_staging, csv_path, columns=job_columns, typed=typed)
+    timer.run(n_rows, 'transform', cleaning_data, df, typed=typed, workers=workers, partition_size=partition_size)
+    timer.results[-1]['memory_bytes'] = int(df.memory_usage(deep=True).sum())
+    os.remove(csv_path)
+
+    if db_conn_uri is None:
+        return
+
+    # Load into an empty table
+    engine = create_engine(db_conn_uri)
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP TABLE IF EXISTS {tgt_table}"))
+
+    timer.run(n_rows, 'load', loadtodb, df, db_conn_uri, tgt_table, aggregates=aggregates)
+    del df
+
+    # Reports: the queries, then the charts drawn from their results
+    df_stats = timer.run(n_rows, 'report.query_salary_stats', query_salary_stats, engine, tgt_table, convert_rate,
+                         aggregates=aggregates)
+    df_pivot = timer.run(n_rows, 'report.query_job_counts', query_job_counts, engine, tgt_table,
+                         aggregates=aggregates)
+    df_tech = timer.run(n_rows, 'report.query_tech_term_counts', query_tech_term_counts, engine, tgt_table,
+                        get_tech_term_matcher(), aggregates=aggregates)
+
+    timer.run(n_rows, 'report.draw_salary_stats', draw_salary_stats, df_stats,
+              os.path.join(tmp_dir, 'salary_distribution.png'))
+    timer.run(n_rows, 'report.draw_job_heatmap', draw_job_heatmap, df_pivot, os.path.join(tmp_dir, 'job_heatmap.png'))
+    timer.run(n_rows, 'report.draw_techtrend', draw_techtrend, df_tech, os.path.join(tmp_dir, 'techtrend.png'))
+
+    with engine.begin() as connection:
+        for table in [tgt_table, *agg_tables(tgt_table).values()]:
+            connection.execute(text(f"DROP TABLE IF EXISTS {table}"))
+    engine.dispose()
+
+if __name__ == '__main__':
+    # Time each stage (extract, transform, load, reports) on synthetic data and write the results as JSON
+    # Usage: python benchmark/bench_suite.py --rows 10000 1000000 10000000 --output bench_results.json
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 1000000])
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--table', default='Bench_JobList')
+    parser.add_argument('--untyped', action='store_true', help='object columns instead of the typed schema')
+    parser.add_argument('--no-db', action='store_true', help='only extract and transform')
+    parser.add_argument('--workers', type=int, default=1, help='transform processes (0: one per CPU)')
+    parser.add_argument('--partition-size', type=int, default=100000)
+    parser.add_argument('--aggregates', action='store_true', help='maintain and read the report aggregate tables')
+    args = parser.parse_args()
+
+    load_dotenv(dotenv_path=env_path)
+
+    db_conn_uri = None
+    if not args.no_db:
+        db_conn_uri = (f"postgresql://{os.environ.get('DB_USER')}:{os.environ.get('DB_PASS')}"
+                       f"@{os.environ.get('DB_HOST')}:{os.environ.get('DB_PORT')}/{os.environ.get('DB_NAME')}")
+
+    timer = StageTimer()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_rows in args.rows:
+            bench_rows(timer, n_rows, db_conn_uri, args.table, tmp_dir, typed=not args.untyped,
+                       workers=args.workers or None, partition_size=args.partition_size, aggregates=args.aggregates)
+
+    summary = {
+        'commit': git_commit(),
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'typed': not args.untyped,
+        'workers': args.workers,
+        'aggregates': args.aggregates,
+        'results': timer.results,
+    }
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+    print(f"Results written to {args.output}")
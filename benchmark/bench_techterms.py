@@ -0,0 +1,75 @@
+import argparse
+import os
+import re
+import sys
+import time
+import pandas as pd
+
+# Get current file directory
+current_dir = os.path.dirname(__file__)
+
+# Get project root directory
+project_dir = os.path.abspath(os.path.join(current_dir, '..'))
+
+# Import the pipeline modules the same way main.py does
+sys.path.insert(0, os.path.join(project_dir, 'source'))
+
+from techterms import TechTermMatcher, default_tech_terms
+
+def make_texts(n_rows):
+    # Title and description of the postings of dataTopCV.csv repeated up to n_rows.
+    # A number is appended so every text is distinct (the matcher scans a repeated text only once)
+    df = pd.read_csv(os.path.join(project_dir, 'data', 'dataTopCV.csv'))
+    df = df.sample(n=n_rows, replace=True, random_state=0).reset_index(drop=True)
+    df['job_title'] = df['job_title'] + ' #' + df.index.astype(str)
+    return df[['job_title', 'job_description']]
+
+def make_terms(n_terms):
+    # The terms of the report, then made-up terms (never found: the worst case of the keyword loop)
+    terms = dict(default_tech_terms)
+    for i in range(n_terms - len(terms)):
+        terms[f'tech{i:04d}'] = [f'tech{i:04d}', f'tech {i:04d} framework']
+    return dict(list(terms.items())[:n_terms])
+
+def keyword_loop(df, terms):
+    # One str.contains scan of the text per alias (the tech trend report before the matcher)
+    text = (df['job_title'].fillna('') + '\n' + df['job_description'].fillna('')).str.lower()
+    counts = {}
+    for term, aliases in terms.items():
+        mask = pd.Series(False, index=df.index)
+        for alias in aliases:
+            mask |= text.str.contains(r'(?<!\w)' + re.escape(alias) + r'(?!\w)', regex=True)
+        counts[term] = int(mask.sum())
+    return pd.DataFrame({'tech': list(counts), 'count': list(counts.values())})
+
+def time_best(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+if __name__ == '__main__':
+    # Compare the single-pass matcher with one str.contains per keyword, for a growing number of terms
+    # Usage: python benchmark/bench_techterms.py --rows 20000 --terms 10 100 300
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--terms', type=int, nargs='+', default=[10, 100, 300])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_texts(args.rows)
+
+    for n_terms in args.terms:
+        terms = make_terms(n_terms)
+        matcher = TechTermMatcher(terms)
+
+        matcher_seconds, (_, matcher_counts) = time_best(lambda: matcher.extract(df), args.repeat)
+        loop_seconds, loop_counts = time_best(lambda: keyword_loop(df, terms), args.repeat)
+
+        # Both count the postings mentioning each term
+        same = matcher_counts['count'].tolist() == loop_counts['count'].tolist()
+        print(f"{n_terms:4d} terms: matcher {matcher_seconds:.2f}s, keyword loop {loop_seconds:.2f}s "
+              f"({loop_seconds / matcher_seconds:.1f}x), same counts: {same}")
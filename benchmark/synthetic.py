@@ -0,0 +1,66 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+# Get current file directory
+current_dir = os.path.dirname(__file__)
+
+# Get project root directory
+project_dir = os.path.abspath(os.path.join(current_dir, '..'))
+
+# Columns sampled from the distribution of data.csv (each column independently, with the real frequencies)
+sampled_columns = ['job_title', 'company', 'salary', 'address', 'time']
+
+def column_distributions(sample_path=None):
+    # Distinct values and their frequencies for each sampled column (missing values included)
+    df = pd.read_csv(sample_path or os.path.join(project_dir, 'data', 'data.csv'))
+
+    distributions = {}
+    for column in sampled_columns:
+        counts = df[column].value_counts(dropna=False)
+        distributions[column] = (counts.index.to_numpy(dtype=object), (counts / counts.sum()).to_numpy())
+    return distributions
+
+def generate_jobs(n_rows, seed=0, n_days=90, end_date='2025-11-16', first_id=2000000, distributions=None):
+    # n_rows synthetic TopCV jobs with the columns of data.csv:
+    # salary/address/title/company/time drawn from the real distributions, created_date spread over n_days days,
+    # unique TopCV-like links (job id from first_id)
+    rng = np.random.default_rng(seed)
+    if distributions is None:
+        distributions = column_distributions()
+
+    df = pd.DataFrame(index=pd.RangeIndex(n_rows))
+
+    days = rng.integers(0, n_days, n_rows)
+    df['created_date'] = (pd.Timestamp(end_date) - pd.to_timedelta(days, unit='D')).strftime('%Y-%m-%d')
+
+    for column in sampled_columns:
+        values, probabilities = distributions[column]
+        df[column] = values[rng.choice(len(values), size=n_rows, p=probabilities)]
+
+    job_id = pd.Series(np.arange(first_id, first_id + n_rows)).astype(str)
+    df['link_description'] = ('https://www.topcv.vn/viec-lam/job/' + job_id +
+                              '.html?ta_source=JobSearchList_LinkDetail')
+
+    return df[['created_date', 'job_title', 'company', 'salary', 'address', 'time', 'link_description']]
+
+def write_jobs_csv(path, n_rows, seed=0, chunksize=1000000, **options):
+    # Write n_rows synthetic jobs to a CSV file, chunksize rows at a time (10M rows do not need to fit in memory)
+    distributions = column_distributions()
+
+    for i, start in enumerate(range(0, n_rows, chunksize)):
+        size = min(chunksize, n_rows - start)
+        df = generate_jobs(size, seed=seed + i, first_id=2000000 + start, distributions=distributions, **options)
+        df.to_csv(path, index=False, mode='w' if i == 0 else 'a', header=(i == 0))
+
+if __name__ == '__main__':
+    # Usage: python benchmark/synthetic.py --rows 10000000 --output /tmp/jobs_10m.csv
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--output', required=True)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    write_jobs_csv(args.output, args.rows, seed=args.seed)
+    print(f"{args.rows} rows written to {args.output}")
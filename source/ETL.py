@@ -1,18 +1,76 @@
+import concurrent.futures
 import pandas as pd
 from transform import cleaning_data
-from load import loadtodb
+from load import loadtodb, loadtodb_chunks
+from staging import job_columns, read_staging, iter_staging
+from instrument import stage, iter_stage
 
-def etl(data_path, db_conn_uri, tgt_table):
+def transform_chunks(chunks, memoize=False, typed=True, workers=1, partition_size=100000, executor=None):
+    # Transform each chunk only when the loader asks for it, so only one chunk is in memory at a time
+    for df in chunks:
+        # created_date is already a date in Parquet files
+        if not pd.api.types.is_datetime64_any_dtype(df['created_date']):
+            df['created_date'] = pd.to_datetime(df['created_date'])
+        with stage('transform', rows_in=len(df)) as record:
+            cleaning_data(df, memoize=memoize, typed=typed, workers=workers, partition_size=partition_size,
+                          executor=executor)
+            record['rows_out'] = len(df)
+        yield df
+
+def etl(data_path, db_conn_uri, tgt_table, memoize=False, chunksize=None, incremental=False, engine=None,
+        start_date=None, end_date=None, typed=True, workers=1, partition_size=100000, aggregates=False,
+        partitioned=False, retention_months=None):
+    # data_path: CSV file or Parquet dataset partitioned by created_date (see staging.py)
+    # chunksize=None: read the whole file at once
+    # chunksize=N: stream the file N rows at a time (extract -> transform -> load chunk by chunk) with bounded memory
+    # incremental=True: upsert on the natural key and skip unchanged rows (see load.loadtodb_chunks)
+    # engine: shared engine to load with (default: the engine of db_conn_uri from db.get_engine)
+    # start_date/end_date: only load the jobs created between these days (Parquet: only these partitions are read)
+    # typed=True: typed schema (categoricals, Arrow strings, see schema.py) from extract to load, less memory
+    # workers > 1 (None: one per CPU): transform partitions of partition_size rows in a process pool
+    # (see transform.cleaning_data_parallel), same result as workers=1
+    # aggregates=True: maintain the aggregate tables of the reports in the load transaction (see aggregates.py)
+    # partitioned=True / retention_months: target table partitioned by month, old partitions dropped (see partitions.py)
     try:
-        # Extract the data from .csv file.
-        df = pd.read_csv(data_path, delimiter=',')
+        if chunksize:
+            # Extract the data chunk by chunk (only the columns of the target table)
+            chunks = iter_stage('extract', iter_staging(data_path, chunksize, columns=job_columns, start_date=start_date,
+                                                        end_date=end_date, typed=typed))
+
+            # Transform and load each chunk as it is ready
+            # (the load stage pulls the chunks: its self time excludes the extract and transform of the chunks)
+            # Parallel mode: one process pool for all the chunks
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers) if workers != 1 else None
+            try:
+                with stage('load') as record:
+                    counts = loadtodb_chunks(transform_chunks(chunks, memoize=memoize, typed=typed, workers=workers,
+                                                              partition_size=partition_size, executor=executor),
+                                             db_conn_uri, tgt_table, incremental=incremental, engine=engine,
+                                             aggregates=aggregates, partitioned=partitioned,
+                                             retention_months=retention_months)
+                    if counts:
+                        record['rows_out'] = counts['inserted'] + counts['updated']
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+            return
+
+        # Extract the data from .csv file or Parquet dataset (created_date already converted)
+        with stage('extract') as record:
+            df = read_staging(data_path, columns=job_columns, start_date=start_date, end_date=end_date, typed=typed)
+            record['rows_out'] = len(df)
 
         # Transform the data
-        df['created_date'] = pd.to_datetime(df['created_date'])
-        cleaning_data(df)
+        with stage('transform', rows_in=len(df)) as record:
+            cleaning_data(df, memoize=memoize, typed=typed, workers=workers, partition_size=partition_size)
+            record['rows_out'] = len(df)
 
         # # Load the transformed data into the target table
-        loadtodb(df, db_conn_uri, tgt_table)
+        # rows_out: inserted + updated rows when incremental
+        with stage('load', rows_in=len(df)) as record:
+            counts = loadtodb(df, db_conn_uri, tgt_table, incremental=incremental, engine=engine,
+                              aggregates=aggregates, partitioned=partitioned, retention_months=retention_months)
+            record['rows_out'] = counts['inserted'] + counts['updated'] if counts else len(df)
 
     except FileNotFoundError :
         print(f"File not found error.")
@@ -20,4 +78,3 @@ def etl(data_path, db_conn_uri, tgt_table):
         print(f"Data error.")
     except Exception as e:
         print(f"An error has occurred: {e}")
-
@@ -0,0 +1,163 @@
+from sqlalchemy import text
+
+# Aggregate tables of the reports, maintained by load.loadtodb (aggregates=True) in the transaction of the merge:
+# - {tgt_table}_agg_jobs: number of jobs per day, city and job group (heatmap)
+# - {tgt_table}_agg_salary: number of jobs per day, job group and salary (min_salary, max_salary, USD or not),
+#   a histogram with one bucket per distinct salary, enough for the exact box plot statistics
+# - {tgt_table}_agg_titles: number of jobs per job title (tech terms of the titles, see techterms.py)
+# Each load applies only the delta of the rows it inserts or updates: their old values are subtracted before
+# the merge and their new values added after it, so the reports read a few thousand rows whatever the size of
+# the target table.
+# - {tgt_table}_agg_state: oid of the target table the aggregates were built from. When the target table is
+#   dropped and created again, the aggregates are rebuilt from scratch. A load without aggregates empties it
+#   (mark_aggregates_stale), so the next load with aggregates rebuilds them too
+# The unique keys treat NULL as a value (jobs without city or job group are counted too) with indexes on
+# expressions, UNIQUE NULLS NOT DISTINCT needs PostgreSQL 15
+
+# Temp table of the keys (id or job_key) of the target rows written by the load
+delta_keys_table = 'agg_delta_keys'
+
+# Key columns of the aggregate tables which can be NULL, with the value replacing NULL in the unique index
+jobs_key = [('created_date', "'infinity'::date"), ('city', "''"), ('job_group', "''")]
+salary_key = [('created_date', "'infinity'::date"), ('job_group', "''"), ('is_usd', 'false'), ('min_salary', '0'),
+              ('max_salary', '0')]
+
+def agg_tables(tgt_table):
+    return {'jobs': f'{tgt_table}_agg_jobs', 'salary': f'{tgt_table}_agg_salary', 'titles': f'{tgt_table}_agg_titles',
+            'state': f'{tgt_table}_agg_state'}
+
+def null_safe_key(columns):
+    # Index expressions where NULL equals NULL: the value with NULL replaced, and whether it is NULL
+    # (used by the unique index and by ON CONFLICT, which must name the same expressions)
+    return ', '.join(f"(COALESCE({column}, {default})), ({column} IS NULL)" for column, default in columns)
+
+def create_aggregate_tables(connection, tgt_table):
+    tables = agg_tables(tgt_table)
+
+    connection.execute(text(f'''
+        CREATE TABLE IF NOT EXISTS {tables['jobs']} (
+            created_date DATE,
+            city TEXT,
+            job_group TEXT,
+            job_count BIGINT NOT NULL);'''))
+    connection.execute(text(f'''
+        CREATE UNIQUE INDEX IF NOT EXISTS {tables['jobs']}_key
+        ON {tables['jobs']} ({null_safe_key(jobs_key)});'''))
+
+    connection.execute(text(f'''
+        CREATE TABLE IF NOT EXISTS {tables['salary']} (
+            created_date DATE,
+            job_group TEXT NOT NULL,
+            is_usd BOOLEAN NOT NULL,
+            min_salary NUMERIC(12, 2),
+            max_salary NUMERIC(12, 2),
+            job_count BIGINT NOT NULL);'''))
+    connection.execute(text(f'''
+        CREATE UNIQUE INDEX IF NOT EXISTS {tables['salary']}_key
+        ON {tables['salary']} ({null_safe_key(salary_key)});'''))
+
+    connection.execute(text(f'''
+        CREATE TABLE IF NOT EXISTS {tables['titles']} (
+            job_title TEXT PRIMARY KEY,
+            job_count BIGINT NOT NULL);'''))
+
+    connection.execute(text(f"CREATE TABLE IF NOT EXISTS {tables['state']} (source_oid OID);"))
+
+def apply_rows(connection, tgt_table, where, sign):
+    # Add (sign=1) or subtract (sign=-1) the target rows matching where to the aggregates
+    tables = agg_tables(tgt_table)
+
+    connection.execute(text(f'''
+        INSERT INTO {tables['jobs']} AS a (created_date, city, job_group, job_count)
+        SELECT created_date, city, job_group, :sign * COUNT(*)
+        FROM {tgt_table}
+        WHERE {where}
+        GROUP BY created_date, city, job_group
+        ON CONFLICT ({null_safe_key(jobs_key)}) DO UPDATE
+        SET job_count = a.job_count + EXCLUDED.job_count;'''), {'sign': sign})
+
+    connection.execute(text(f'''
+        INSERT INTO {tables['salary']} AS a (created_date, job_group, is_usd, min_salary, max_salary, job_count)
+        SELECT created_date, job_group, COALESCE(unit IN ('usd', 'USD'), false), min_salary, max_salary,
+               :sign * COUNT(*)
+        FROM {tgt_table}
+        WHERE ({where}) AND job_group IS NOT NULL AND (min_salary IS NOT NULL OR max_salary IS NOT NULL)
+        GROUP BY 1, 2, 3, 4, 5
+        ON CONFLICT ({null_safe_key(salary_key)}) DO UPDATE
+        SET job_count = a.job_count + EXCLUDED.job_count;'''), {'sign': sign})
+
+    connection.execute(text(f'''
+        INSERT INTO {tables['titles']} AS a (job_title, job_count)
+        SELECT job_title, :sign * COUNT(*)
+        FROM {tgt_table}
+        WHERE {where}
+        GROUP BY job_title
+        ON CONFLICT (job_title) DO UPDATE
+        SET job_count = a.job_count + EXCLUDED.job_count;'''), {'sign': sign})
+
+def rebuild_aggregates(connection, tgt_table):
+    # Compute the aggregates again from all the rows of the target table
+    tables = agg_tables(tgt_table)
+
+    connection.execute(text(f"TRUNCATE {tables['jobs']}, {tables['salary']}, {tables['titles']}, {tables['state']};"))
+    apply_rows(connection, tgt_table, 'true', 1)
+    connection.execute(text(f"INSERT INTO {tables['state']} (source_oid) VALUES ('{tgt_table}'::regclass);"))
+
+def prepare_aggregates(connection, tgt_table):
+    # Create the aggregate tables, build them when one of them is new or they were built from another target table
+    is_missing = connection.execute(text("SELECT bool_or(to_regclass(name) IS NULL) FROM unnest(:names) AS name;"),
+                                    {'names': list(agg_tables(tgt_table).values())}).scalar()
+    create_aggregate_tables(connection, tgt_table)
+
+    is_current = connection.execute(text(f'''
+        SELECT EXISTS (SELECT 1 FROM {agg_tables(tgt_table)['state']}
+                       WHERE source_oid = '{tgt_table}'::regclass);''')).scalar()
+    if is_missing or not is_current:
+        rebuild_aggregates(connection, tgt_table)
+
+def mark_aggregates_stale(connection, tgt_table):
+    # Load without aggregates: the target table changes but not the aggregates, forget which table they were built
+    # from so the next load with aggregates rebuilds them
+    state_table = agg_tables(tgt_table)['state']
+    if connection.execute(text("SELECT to_regclass(:table) IS NOT NULL;"), {'table': state_table}).scalar():
+        connection.execute(text(f"DELETE FROM {state_table};"))
+
+def capture_delta_keys(connection, tgt_table, tmp_table, incremental):
+    # Keys of the target rows the merge will write, saved before the merge
+    # incremental=False: the ids of the temp table (merge on id)
+    # incremental=True: the job_keys which are new or whose content changed (unchanged postings are skipped)
+    if incremental:
+        select_keys = f'''
+            SELECT s.job_key AS key
+            FROM (SELECT DISTINCT ON (job_key) job_key, content_hash
+                  FROM {tmp_table}
+                  ORDER BY job_key, id DESC) AS s
+            LEFT JOIN {tgt_table} AS t ON t.job_key = s.job_key
+            WHERE t.content_hash IS DISTINCT FROM s.content_hash'''
+    else:
+        select_keys = f"SELECT id AS key FROM {tmp_table}"
+
+    connection.execute(text(f"DROP TABLE IF EXISTS {delta_keys_table};"))
+    connection.execute(text(f"CREATE TEMP TABLE {delta_keys_table} ON COMMIT DROP AS {select_keys};"))
+    connection.execute(text(f"ANALYZE {delta_keys_table};"))
+
+def delta_where(incremental):
+    key_column = 'job_key' if incremental else 'id'
+    return f"{key_column} IN (SELECT key FROM {delta_keys_table})"
+
+def subtract_old_rows(connection, tgt_table, tmp_table, incremental):
+    # Before the merge: subtract the current values of the rows the merge will write
+    capture_delta_keys(connection, tgt_table, tmp_table, incremental)
+    apply_rows(connection, tgt_table, delta_where(incremental), -1)
+
+def add_new_rows(connection, tgt_table, incremental):
+    # After the merge: add the new values of these rows, then forget the empty groups
+    apply_rows(connection, tgt_table, delta_where(incremental), 1)
+    delete_empty_groups(connection, tgt_table)
+
+def delete_empty_groups(connection, tgt_table):
+    tables = agg_tables(tgt_table)
+
+    connection.execute(text(f"DELETE FROM {tables['jobs']} WHERE job_count = 0;"))
+    connection.execute(text(f"DELETE FROM {tables['salary']} WHERE job_count = 0;"))
+    connection.execute(text(f"DELETE FROM {tables['titles']} WHERE job_count = 0;"))
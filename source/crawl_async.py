@@ -0,0 +1,194 @@
+import asyncio
+import concurrent.futures
+import functools
+from urllib.parse import urlsplit
+import pandas as pd
+from http_client import get_client, retriable_errors
+from detail_cache import get_detail_cache, job_id_from_link
+from data_scrapping_TopCV import topcv_url, parse_job_list, parse_job_item, parse_job_detail
+from instrument import stage
+
+# asyncio crawl engine: listing pages and detail pages are fetched at the same time,
+# under one global concurrency limit and at most per_host requests at the same time per host.
+# The politeness rules are those of the sync scraper: the requests go through the shared HTTP client
+# (see http_client.py), its rate limiter per host (slower on 429/503 and Retry-After) and its retry delays.
+# The blocking requests calls run in a thread pool of the same size as the concurrency limit.
+
+class AsyncCrawler:
+    # client: HttpClient (default: the shared client of http_client.get_client)
+    # detail_retries: attempts per detail page (default: retries of the client)
+    def __init__(self, concurrency=10, per_host=5, timeout=None, detail_retries=None, client=None):
+        self.client = client or get_client()
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout or self.client.timeout
+        self.detail_retries = detail_retries or self.client.retries
+
+        self.hosts = {}
+        self.detail_tasks = {}
+
+    def host_semaphore(self, url):
+        host = urlsplit(url).netloc
+        if host not in self.hosts:
+            self.hosts[host] = asyncio.Semaphore(self.per_host)
+        return self.hosts[host]
+
+    async def run_blocking(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def fetch(self, url, headers=None):
+        # Host slot and rate limiter first, so that a slow host does not hold the slots of the global limit
+        # while waiting. The wait of the limiter is awaited instead of sleeping in a thread of the pool
+        limiter = self.client.limiter(url)
+        async with self.host_semaphore(url):
+            wait = limiter.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            async with self.semaphore:
+                response = await self.run_blocking(self.client.session.get, url, timeout=self.timeout,
+                                                   headers=headers)
+
+        self.client.observe(limiter, response)
+        return response
+
+    async def fetch_listing(self, url):
+        # Return the jobs of a listing page ([] if no job), or None if the page could not be retrieved
+        try:
+            response = await self.fetch(url)
+
+            if response.status_code != 200:
+                print(f"Error retrieving data from server ({url})")
+                return None
+
+            all_jobs = await self.run_blocking(parse_job_list, response.text)
+            job_list = [parse_job_item(job) for job in all_jobs]
+
+        except Exception as e:
+            print(f"Error while scrapping data: {e}")
+            return None
+
+        # Start fetching the detail pages as soon as the listing page arrives (once per link)
+        for job in job_list:
+            link_description = job['link_description']
+            if link_description and link_description not in self.detail_tasks:
+                self.detail_tasks[link_description] = asyncio.create_task(self.fetch_detail(link_description))
+
+        return job_list
+
+    async def fetch_detail(self, detail_url):
+        # Same as data_scrapping_TopCV.detail_scrapping: retry when the server does not return the data
+        time_remain, job_description = None, None
+
+        # Persistent cache of the detail pages, same rules as detail_scrapping
+        cache = get_detail_cache()
+        entry = None
+        if cache is not None:
+            job_id = job_id_from_link(detail_url)
+            entry = cache.get(job_id)
+
+            if entry is not None and cache.is_fresh(entry):
+                cache.count('hit')
+                return entry['time_remain'], entry['job_description']
+
+        for attempt in range(self.detail_retries):
+            response = None
+
+            try:
+                response = await self.fetch(detail_url, headers=cache.request_headers(entry) if cache is not None else None)
+
+                if response.status_code == 304 and entry is not None:
+                    cache.count('not_modified')
+                    cache.touch(job_id)
+                    return entry['time_remain'], entry['job_description']
+
+                if response.status_code == 200:
+                    time_remain, job_description = await self.run_blocking(parse_job_detail, response.text)
+
+                    # Found data -> success
+                    if time_remain is not None or job_description is not None:
+                        if cache is not None:
+                            cache.count('miss')
+                            cache.put(job_id, time_remain, job_description, response.headers)
+                        return time_remain, job_description
+
+                print(f"Warning: Attempt {attempt + 1} for {detail_url} failed (code: {response.status_code}).")
+
+            except retriable_errors as e:
+                print(f"Error while scraping the page {detail_url}: {e}")
+
+            except Exception as e:
+                # Not a network error (invalid URL, parse error...): no other attempt
+                print(f"Error while scraping the page {detail_url}: {e}")
+                break
+
+            # Same wait as detail_scrapping: the pause of the limiter after Retry-After, else exponential backoff
+            if attempt + 1 < self.detail_retries:
+                await asyncio.sleep(self.client.retry_delay(attempt, response))
+
+        return time_remain, job_description
+
+    async def crawl(self, base_url=topcv_url, pages=range(1, 5)):
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency)
+
+        try:
+            page_list = list(pages)
+            listing_list = await asyncio.gather(*(self.fetch_listing(base_url.format(page_number))
+                                                  for page_number in page_list))
+
+            # Merge the pages in order with the rules of data_scrapping:
+            # stop at the first page with an error, without job, or starting with an already seen job
+            all_jobs_list = []
+            existed_links = set()
+            page_count = 0
+
+            for page_number, job_list in zip(page_list, listing_list):
+                if not job_list:
+                    print(f"No jobs found on page {page_number}. No more page.")
+                    break
+
+                if job_list[0]['link_description'] in existed_links:
+                    print(f"Duplicate page detected (page {page_number}). Stop.")
+                    break
+
+                page_count += 1
+                for job in job_list:
+                    link_description = job['link_description']
+                    if link_description in existed_links:
+                        continue
+                    existed_links.add(link_description)
+
+                    task = self.detail_tasks.get(link_description)
+                    job['time'], job['job_description'] = await task if task else (None, None)
+                    all_jobs_list.append(job)
+
+            # Detail pages of the jobs after the stop page are not needed
+            for task in self.detail_tasks.values():
+                task.cancel()
+
+        finally:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+
+        print("\n--- DATA SCRAPPING COMPLETE ---")
+
+        if all_jobs_list:
+            df = pd.DataFrame(all_jobs_list)
+            print(f"Total {len(df)} jobs were scrapped from {page_count} pages.")
+            return df
+        else:
+            print("No data can be scrapped.")
+            return None
+
+def data_scrapping_async(base_url=topcv_url, pages=range(1, 5), concurrency=10, per_host=5, timeout=None,
+                         detail_retries=None, client=None):
+    # Same result (DataFrame schema) as data_scrapping_TopCV.data_scrapping, with concurrent requests
+    crawler = AsyncCrawler(concurrency=concurrency, per_host=per_host, timeout=timeout,
+                           detail_retries=detail_retries, client=client)
+
+    # The pages are crawled at the same time: one stage for the whole crawl
+    with stage('scrape') as record:
+        df = asyncio.run(crawler.crawl(base_url=base_url, pages=pages))
+        record['rows_out'] = len(df) if df is not None else 0
+    return df
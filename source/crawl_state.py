@@ -0,0 +1,81 @@
+import json
+import os
+from sqlalchemy import text
+from detail_cache import job_id_from_link
+
+# State of the crawls in a local JSON file:
+# - known_job_ids: TopCV job ids already scraped by the previous crawls (incremental crawl stops when it reaches them)
+# - checkpoint: progress of the current crawl (next page, number of jobs already scraped), None when the last crawl
+#   finished. The jobs themselves are appended page by page to a JSON lines file next to the state file
+#   (<state_path>.jobs.jsonl): a checkpoint writes one page, not every job of the crawl again
+
+def load_crawl_state(state_path):
+    # Return the state saved in state_path, an empty state if the file does not exist
+    state = {'known_job_ids': [], 'checkpoint': None}
+
+    if state_path and os.path.exists(state_path):
+        with open(state_path, encoding='utf-8') as f:
+            state.update(json.load(f))
+
+    return state
+
+def save_crawl_state(state_path, state):
+    # Write to a temporary file then rename it: a crash while writing does not corrupt the previous state
+    tmp_path = f'{state_path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, state_path)
+
+def checkpoint_jobs_path(state_path):
+    return f'{state_path}.jobs.jsonl'
+
+def append_checkpoint_jobs(state_path, jobs):
+    # Append the jobs of a page, one JSON line per job. Written before the state file that counts them
+    with open(checkpoint_jobs_path(state_path), 'a', encoding='utf-8') as f:
+        f.write(''.join(json.dumps(job, ensure_ascii=False) + '\n' for job in jobs))
+        f.flush()
+        os.fsync(f.fileno())
+
+def load_checkpoint_jobs(state_path, count):
+    # The first count jobs of the file (the pages of the checkpoint). The lines after them (a page written when
+    # the crawl stopped, before its checkpoint) are removed. Return None if the file has fewer jobs
+    jobs = []
+    path = checkpoint_jobs_path(state_path)
+    if not os.path.exists(path):
+        return jobs if count == 0 else None
+
+    with open(path, 'rb+') as f:
+        while len(jobs) < count:
+            line = f.readline()
+            if not line.endswith(b'\n'):
+                return None
+            jobs.append(json.loads(line))
+        f.truncate(f.tell())
+    return jobs
+
+def clear_checkpoint_jobs(state_path):
+    if os.path.exists(checkpoint_jobs_path(state_path)):
+        os.remove(checkpoint_jobs_path(state_path))
+
+def known_job_ids_from_db(engine, tgt_table):
+    # TopCV job ids already in tgt_table (same key as detail_cache.job_id_from_link and load.normalize_job_key)
+    try:
+        with engine.connect() as connection:
+            result = connection.execute(text(f'''
+                SELECT DISTINCT COALESCE(substring(link_description from '/(\\d+)\\.html'),
+                                         split_part(link_description, '?', 1))
+                FROM {tgt_table}
+                WHERE link_description IS NOT NULL'''))
+            return {row[0] for row in result}
+    except Exception as e:
+        print(f"Could not read the known postings of {tgt_table}: {e}")
+        return set()
+
+def remember_job_ids(state_path, jobs):
+    # End of a crawl: add the job ids of jobs (dicts with 'link_description') to the known postings
+    # and remove the checkpoint
+    state = load_crawl_state(state_path)
+    known_job_ids = set(state['known_job_ids'])
+    known_job_ids.update(job_id_from_link(job['link_description']) for job in jobs if job['link_description'])
+    save_crawl_state(state_path, {'known_job_ids': sorted(known_job_ids), 'checkpoint': None})
+    clear_checkpoint_jobs(state_path)
@@ -1,13 +1,20 @@
 from dotenv import load_dotenv
 import os
-import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 import pandas as pd
 import time
 import re
 from datetime import date, timedelta
 from dateutil.relativedelta import relativedelta
 import concurrent.futures
+from http_client import get_client, configure_client, retriable_errors
+from detail_cache import get_detail_cache, configure_detail_cache, job_id_from_link
+from crawl_state import load_crawl_state, save_crawl_state, remember_job_ids, known_job_ids_from_db, \
+    append_checkpoint_jobs, load_checkpoint_jobs, clear_checkpoint_jobs
+from instrument import start_stage, end_stage, log_run_summary
+
+# data scrapping url ({} = page number)
+topcv_url = "https://www.topcv.vn/tim-viec-lam-moi-nhat?type_keyword=1&page={}&sba=1"
 
 def convert_created_date(created_date_str):
     # Function to generate 'created_date'
@@ -40,75 +47,252 @@ def convert_created_date(created_date_str):
 
     return created_date.strftime('%Y-%m-%d')
 
-def detail_scrapping(detail_url):
+# HTML parsing backends (BeautifulSoup tree builders) -> can they parse only the needed subtrees (SoupStrainer)
+# html5lib always builds the whole page (and is the slowest), lxml is the fastest
+parser_backends = {
+    'lxml': True,
+    'html.parser': True,
+    'html5lib': False,
+}
+
+def class_pattern(*class_names):
+    # Match a 'class' attribute containing one of class_names (the attribute is still one string while parsing)
+    return re.compile(r'(?:^|\s)(?:' + '|'.join(re.escape(name) for name in class_names) + r')(?:\s|$)')
+
+# Subtrees needed from a listing page (the jobs) and from a detail page (deadline and description)
+job_list_strainer = SoupStrainer('div', class_=class_pattern('job-item-search-result'))
+job_detail_strainer = SoupStrainer(['span', 'div'], class_=class_pattern('deadline', 'job-description__item--content'))
+
+def default_parser_backend():
+    # lxml if it is installed, else the parser of the standard library
+    try:
+        import lxml
+        return 'lxml'
+    except ImportError:
+        print("Warning: lxml is not installed (see requirements.txt), HTML is parsed with the slower html.parser")
+        return 'html.parser'
+
+parser_backend = default_parser_backend()
+
+def set_parser_backend(backend):
+    # Change the backend used by parse_job_list and parse_job_detail
+    global parser_backend
+    if backend not in parser_backends:
+        raise ValueError(f"Unknown parser backend {backend} (available: {', '.join(parser_backends)})")
+    parser_backend = backend
+
+def make_soup(html, strainer, backend=None):
+    # Parse html with the backend (default: parser_backend), only the subtrees of strainer when supported
+    backend = backend or parser_backend
+
+    if parser_backends[backend]:
+        return BeautifulSoup(html, backend, parse_only=strainer)
+    return BeautifulSoup(html, backend)
+
+def parse_job_detail(html, backend=None):
+    # Get 'time_remain' and 'job_description' from the html of a job detail page (None if not found)
+    time_remain = None
+    job_description = None
+
+    soup = make_soup(html, job_detail_strainer, backend)
+
+    # get 'time_remain'
+    time_tag = soup.select_one('span.deadline')
+
+    if time_tag:
+        time_remain = " ".join(time_tag.stripped_strings)
+
+    # get 'job_description'
+    desc_tag = soup.select_one('div.job-description__item--content')
+    if desc_tag:
+        job_description = " ".join(desc_tag.stripped_strings)
+
+    return time_remain, job_description
+
+def parse_job_item(job):
+    # Get the information of one job (tag div.job-item-search-result) of a listing page
+    # get 'link_description'
+    link_tag = job.select_one('h3.title a')
+    if link_tag and link_tag.has_attr('href'):
+        link_description = link_tag['href'].split('&u_sr_id=')[0]
+    else:
+        link_description = None
+
+    # get 'job title'
+    job_tag = job.select_one('h3.title a span')
+    if job_tag:
+        job_title = job_tag.text.strip()
+    else:
+        job_title = None
+
+    # get 'company'
+    company_tag = job.select_one('span.company-name')
+    if company_tag:
+        company = company_tag.text.strip()
+    else:
+        company = None
+
+    # get 'salary'
+    salary_tag = job.select_one('div.info label.salary span')
+    if salary_tag:
+        salary = salary_tag.text.strip()
+    else:
+        salary = None
+
+    # get 'address'
+    address_tag = job.select_one('div.info label.address')
+    if address_tag and address_tag.has_attr('title'):
+        html_string = address_tag['title']
+        # There are 2 cases of address. With and without <li> tag
+        # Find address with the pattern <li> first
+        address_pattern_li = re.findall(r'<li>(.*?)</li>', html_string)
+
+        if address_pattern_li:
+            # If pattern <li> is found -> Join all address with ":"
+            cleaned_list = [addr.strip() for addr in address_pattern_li]
+            address = ":".join(cleaned_list)
+        else:
+            # If pattern <li> is found -> Remove unnecessary tags
+            address_cleaned = re.sub(r'<br\s*/?>', ': ', html_string)
+            address = re.sub(r'<[^>]+>', '', address_cleaned).strip()
+    else:
+        address = None
+
+    # get 'created_date'
+    created_date_tag = job.select_one('label.label-update')
+
+    if created_date_tag:
+        created_date_str = created_date_tag.text.strip()
+
+        created_date = convert_created_date(created_date_str)
+    else:
+        created_date = None
+
+    return {
+        'created_date': created_date,
+        'job_title': job_title,
+        'company': company,
+        'salary': salary,
+        'address': address,
+        'link_description': link_description}
+
+def parse_job_list(html, backend=None):
+    # Get the tags of all jobs of a listing page
+    soup = make_soup(html, job_list_strainer, backend)
+
+    # Get the parent tag containing all jobs
+    return soup.select('div.job-item-search-result')
+
+def detail_scrapping(detail_url, retries=None):
     # Function to generate 'time_remain' and 'job_description'
+    client = get_client()
 
-    # Default 2 times, if information is still not obtained then wait and try again
+    # Retry budget (default: retries of the shared client), if information is still not obtained then wait and try again
     # To handle the case of crawling too fast, the server does not return data
-    for attempt in range(2):
-        time_remain = None
-        job_description = None
+    # The wait follows Retry-After of the server (pause of the rate limiter), else an exponential backoff with jitter.
+    # Only after an answer without the data or a network error: other errors are not retried
+    if retries is None:
+        retries = client.retries
+
+    time_remain = None
+    job_description = None
+
+    # Persistent cache (see detail_cache.py): fresh entry -> no request,
+    # stale entry -> conditional request, the page is only downloaded again if it changed
+    # (no cache for a listing item without link: the request below fails and (None, None) is returned)
+    cache = get_detail_cache() if detail_url else None
+    entry = None
+    if cache is not None:
+        job_id = job_id_from_link(detail_url)
+        entry = cache.get(job_id)
+
+        if entry is not None and cache.is_fresh(entry):
+            cache.count('hit')
+            return entry['time_remain'], entry['job_description']
+
+    for attempt in range(retries):
+        response = None
 
         try:
-            response = requests.get(detail_url, timeout=10)
-
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.text, 'html.parser')
-
-                # get 'time_remain'
-                time_tag = soup.select_one('span.deadline')
+            # Pooled connection, sent when the rate limiter of the host allows it
+            response = client.get(detail_url, headers=cache.request_headers(entry) if cache is not None else None)
 
-                if time_tag:
-                    time_remain = " ".join(time_tag.stripped_strings)
+            if response.status_code == 304 and entry is not None:
+                cache.count('not_modified')
+                cache.touch(job_id)
+                return entry['time_remain'], entry['job_description']
 
-                # get 'job_description'
-                desc_tag = soup.select_one('div.job-description__item--content')
-                if desc_tag:
-                    job_description = " ".join(desc_tag.stripped_strings)
+            if response.status_code == 200:
+                time_remain, job_description = parse_job_detail(response.text)
 
                 # Found data -> success
-                if time_tag or desc_tag:
+                if time_remain is not None or job_description is not None:
+                    if cache is not None:
+                        cache.count('miss')
+                        cache.put(job_id, time_remain, job_description, response.headers)
                     return time_remain, job_description
 
             # If the code runs to here (status != 200 or tag data not found)
             print(f"Warning: Attempt {attempt + 1} for {detail_url} failed (code: {response.status_code}). Please wait...")
-            time.sleep(10)  # Default wait 10 seconds and try again
 
-        except Exception as e:
+        except retriable_errors as e:
             print(f"Error while scraping the page {detail_url}: {e}")
 
-    return time_remain, job_description
+        except Exception as e:
+            # Not a network error (invalid URL, parse error...): no other attempt
+            print(f"Error while scraping the page {detail_url}: {e}")
+            break
 
-def data_scrapping():
-    # data scrapping url
-    base_url = "https://www.topcv.vn/tim-viec-lam-moi-nhat?type_keyword=1&page={}&sba=1"
-    all_jobs_list = []
-    page_number = 1
+        if attempt + 1 < retries:
+            time.sleep(client.retry_delay(attempt, response))
 
-    existed_links = set()
+    return time_remain, job_description
 
-    # Use the command below to loop through each page of data until it is finished then break
-    # while True:
-    # Use the command below to select the data range you want to get
-    for page_number in range(1, 5):
+def iter_scrape_pages(base_url=topcv_url, first_page=1, last_page=4, known_job_ids=None, stop_after_known=3,
+                      progress=None):
+    # Crawl the listing pages one by one and yield (page_number, jobs of the page with their details)
+    # as soon as a page is done, so the caller can process it before the next page is crawled
+    # last_page: last page to crawl, None to loop through each page of data until it is finished
+    # known_job_ids: incremental crawl, stop when reaching postings already scraped (TopCV job ids).
+    #                The newest postings come first but highlighted ones may be older:
+    #                stop after stop_after_known known postings in a row
+    # progress: dict updated during the crawl (next_page, existed_links, known_streak, finished),
+    #           pass the progress of an interrupted crawl to resume it
+    if progress is None:
+        progress = {}
+    progress.setdefault('next_page', first_page)
+    progress.setdefault('existed_links', set())
+    progress.setdefault('known_streak', 0)
+
+    # The crawl is finished when there is no more page to crawl, but not when it stopped on an error
+    progress['finished'] = False
+
+    if known_job_ids is None:
+        known_job_ids = set()
+
+    existed_links = progress['existed_links']
+
+    while last_page is None or progress['next_page'] <= last_page:
+        page_number = progress['next_page']
         url = base_url.format(page_number)
         print(f"\n--- Crawling page {page_number} ---")
 
+        # rows_out: jobs of the page scrapped with their details
+        record = start_stage('scrape_page')
         try:
-            res = requests.get(url, timeout=10)
+            res = get_client().get(url)
 
             if res.status_code != 200:
                 print("Error retrieving data from server")
-                break
-
-            soup = BeautifulSoup(res.text, "html5lib")
+                return
 
             # Get the parent tag containing all jobs
-            all_jobs = soup.select('div.job-item-search-result')
+            all_jobs = parse_job_list(res.text)
 
             if not all_jobs:
                 print("No jobs found. No more page.")
-                break
+                progress['finished'] = True
+                return
 
             tmp_jobs_list = []
             link_description_list = []
@@ -124,82 +308,33 @@ def data_scrapping():
                     is_duplicate_page = True
 
             if is_duplicate_page:
-                break
+                progress['finished'] = True
+                return
 
             # Loop processing of each job
+            reached_known = False
             for job in all_jobs:
-                # get 'link_description'
-                link_tag = job.select_one('h3.title a')
-                if link_tag and link_tag.has_attr('href'):
-                    link_description = link_tag['href'].split('&u_sr_id=')[0]
-                else:
-                    link_description = None
+                job_info = parse_job_item(job)
+                link_description = job_info['link_description']
 
                 # If the link already exists in the existed_links -> Move to next job
                 if link_description in existed_links:
                     print(f"Job already exists. Skip job")
                     continue
 
+                # Incremental crawl: the posting was scraped by a previous crawl -> skip it (no detail page)
+                if link_description and job_id_from_link(link_description) in known_job_ids:
+                    progress['known_streak'] += 1
+                    if progress['known_streak'] >= stop_after_known:
+                        reached_known = True
+                        break
+                    continue
+                progress['known_streak'] = 0
+
                 # Add a existed_links set containing existing links to check with first_link
                 existed_links.add(link_description)
 
-                # get 'job title'
-                job_tag = job.select_one('h3.title a span')
-                if job_tag:
-                    job_title = job_tag.text.strip()
-                else:
-                    job_title = None
-
-                # get 'company'
-                company_tag = job.select_one('span.company-name')
-                if company_tag:
-                    company = company_tag.text.strip()
-                else:
-                    company = None
-
-                # get 'salary'
-                salary_tag = job.select_one('div.info label.salary span')
-                if salary_tag:
-                    salary = salary_tag.text.strip()
-                else:
-                    salary = None
-
-                # get 'address'
-                address_tag = job.select_one('div.info label.address')
-                if address_tag and address_tag.has_attr('title'):
-                    html_string = address_tag['title']
-                    # There are 2 cases of address. With and without <li> tag
-                    # Find address with the pattern <li> first
-                    address_pattern_li = re.findall(r'<li>(.*?)</li>', html_string)
-
-                    if address_pattern_li:
-                        # If pattern <li> is found -> Join all address with ":"
-                        cleaned_list = [addr.strip() for addr in address_pattern_li]
-                        address = ":".join(cleaned_list)
-                    else:
-                        # If pattern <li> is found -> Remove unnecessary tags
-                        address_cleaned = re.sub(r'<br\s*/?>', ': ', html_string)
-                        address = re.sub(r'<[^>]+>', '', address_cleaned).strip()
-                else:
-                    address = None
-
-                # get 'created_date'
-                created_date_tag = job.select_one('label.label-update')
-
-                if created_date_tag:
-                    created_date_str = created_date_tag.text.strip()
-
-                    created_date = convert_created_date(created_date_str)
-                else:
-                    created_date = None
-
-                tmp_jobs_list.append({
-                    'created_date': created_date,
-                    'job_title': job_title,
-                    'company': company,
-                    'salary': salary,
-                    'address': address,
-                    'link_description': link_description})
+                tmp_jobs_list.append(job_info)
 
                 # Create a list containing job links on the current page
                 link_description_list.append(link_description)
@@ -228,19 +363,80 @@ def data_scrapping():
                 tmp_jobs['time'] = time_remain
                 tmp_jobs['job_description'] = job_description
 
-                all_jobs_list.append(tmp_jobs)
-
-            page_number += 1
-            time.sleep(10)  # Wait 10 seconds before scrapping the next page
+            record['rows_out'] = len(tmp_jobs_list)
 
         except Exception as e:
             print(f"Error while scrapping data: {e}")
-            break
+            return
+        finally:
+            end_stage(record)
+
+        # The page is done
+        progress['next_page'] = page_number + 1
+        yield page_number, tmp_jobs_list
+
+        if reached_known:
+            print(f"Reached {stop_after_known} postings already scrapped. Stop.")
+            progress['finished'] = True
+            return
+
+        time.sleep(10)  # Wait 10 seconds before scrapping the next page
+
+    # last_page reached
+    progress['finished'] = True
+
+def data_scrapping(base_url=topcv_url, first_page=1, last_page=4, known_job_ids=None, stop_after_known=3,
+                   state_path=None):
+    # Crawl the pages (see iter_scrape_pages) and return all the jobs in a DataFrame
+    # state_path: checkpoint the progress after each page in this file (see crawl_state.py),
+    #             an interrupted crawl resumes where it stopped
+    all_jobs_list = []
+    progress = {'next_page': first_page, 'existed_links': set(), 'known_streak': 0}
+
+    state = load_crawl_state(state_path)
+    checkpoint = state['checkpoint']
+    resumed_jobs = None
+    if checkpoint and checkpoint.get('mode') == 'scrape' and checkpoint['base_url'] == base_url:
+        resumed_jobs = load_checkpoint_jobs(state_path, checkpoint['jobs_count'])
+        if resumed_jobs is None:
+            print(f"The jobs of the checkpoint are missing: crawl again from page {first_page}")
+
+    if resumed_jobs is not None:
+        all_jobs_list = resumed_jobs
+        # The links already scrapped are the links of these jobs (see iter_scrape_pages)
+        progress = {'next_page': checkpoint['next_page'],
+                    'existed_links': {job['link_description'] for job in all_jobs_list},
+                    'known_streak': checkpoint['known_streak']}
+        print(f"Resume the crawl from page {progress['next_page']} ({len(all_jobs_list)} jobs already scrapped)")
+    elif checkpoint and checkpoint.get('mode') != 'scrape':
+        # Checkpoint of an interrupted pipeline (pipeline.run_pipeline) in the same file:
+        # kept for the pipeline to resume, this crawl is not checkpointed
+        print(f"{state_path} has the checkpoint of another crawl: the crawl runs without checkpoint")
+        state_path = None
+    elif state_path:
+        clear_checkpoint_jobs(state_path)
+
+    for page_number, jobs in iter_scrape_pages(base_url, first_page, last_page, known_job_ids, stop_after_known,
+                                               progress):
+        all_jobs_list.extend(jobs)
+
+        # Checkpoint: the page is done. Its jobs are appended to the jobs file, the state file only keeps
+        # the position of the crawl
+        if state_path:
+            append_checkpoint_jobs(state_path, jobs)
+            state['checkpoint'] = {'mode': 'scrape', 'base_url': base_url, 'next_page': progress['next_page'],
+                                   'jobs_count': len(all_jobs_list), 'known_streak': progress['known_streak']}
+            save_crawl_state(state_path, state)
+
+    if state_path and progress['finished']:
+        # Remember the postings of this crawl for the next incremental crawl
+        remember_job_ids(state_path, all_jobs_list)
+
     print("\n--- DATA SCRAPPING COMPLETE ---")
 
     if all_jobs_list:
         df = pd.DataFrame(all_jobs_list)
-        print(f"Total {len(df)} jobs were scrapped from {page_number - 1} pages.")
+        print(f"Total {len(df)} jobs were scrapped from {progress['next_page'] - first_page} pages.")
         return df
     else:
         print("No data can be scrapped.")
@@ -256,15 +452,63 @@ project_dir = os.path.abspath(os.path.join(current_dir, '..'))
 env_path = os.path.join(project_dir, '.env')
 
 if __name__ == "__main__":
-    df = data_scrapping()
-
     load_dotenv(dotenv_path=env_path)
     data_path = os.environ.get('DATA_PATH')
 
+    # Optional: settings of the HTTP client (requests per second at start / at most, retries per detail page)
+    configure_client(rate=float(os.environ.get('HTTP_RATE', 5)),
+                     max_rate=float(os.environ.get('HTTP_MAX_RATE', 20)),
+                     retries=int(os.environ.get('HTTP_RETRIES', 3)))
+
+    # Persistent cache of the detail pages (DETAIL_CACHE_PATH empty to disable), entries fresh for DETAIL_CACHE_TTL seconds
+    detail_cache_path = os.environ.get('DETAIL_CACHE_PATH', f'{data_path}/detail_cache.sqlite3')
+    configure_detail_cache(detail_cache_path, ttl=int(os.environ.get('DETAIL_CACHE_TTL', 86400)))
+
+    # Optional: HTML parser (lxml, html.parser or html5lib)
+    if os.environ.get('HTML_PARSER'):
+        set_parser_backend(os.environ.get('HTML_PARSER'))
+
+    # CRAWL_ASYNC=1: fetch listing and detail pages concurrently (see crawl_async.py)
+    if os.environ.get('CRAWL_ASYNC') == '1':
+        from crawl_async import data_scrapping_async
+
+        df = data_scrapping_async(concurrency=int(os.environ.get('CRAWL_CONCURRENCY', 10)))
+    else:
+        # Checkpoint after each page and postings already scraped (CRAWL_STATE_PATH empty to disable)
+        crawl_state_path = os.environ.get('CRAWL_STATE_PATH', f'{data_path}/crawl_state.json') or None
+
+        # Last page to crawl (CRAWL_LAST_PAGE=0: until there is no more page)
+        crawl_last_page = int(os.environ.get('CRAWL_LAST_PAGE', 4)) or None
+
+        # CRAWL_INCREMENTAL=1: stop at the postings already in JobList or in the crawl state
+        known_job_ids = None
+        if os.environ.get('CRAWL_INCREMENTAL') == '1':
+            from db import get_engine
+
+            db_conn_uri = (f"postgresql://{os.environ.get('DB_USER')}:{os.environ.get('DB_PASS')}"
+                           f"@{os.environ.get('DB_HOST')}:{os.environ.get('DB_PORT')}/{os.environ.get('DB_NAME')}")
+
+            known_job_ids = set(load_crawl_state(crawl_state_path)['known_job_ids'])
+            known_job_ids |= known_job_ids_from_db(get_engine(db_conn_uri), 'JobList')
+
+        df = data_scrapping(last_page=crawl_last_page, known_job_ids=known_job_ids, state_path=crawl_state_path)
+
+    if get_detail_cache() is not None:
+        print(f"Detail cache: {get_detail_cache().stats}")
+
     try:
-        df.to_csv(f'{data_path}/dataTopCV.csv', index=False, encoding='utf-8-sig')
+        # STAGING_FORMAT=parquet: Parquet dataset partitioned by created_date (see staging.py) instead of CSV
+        if os.environ.get('STAGING_FORMAT') == 'parquet':
+            from staging import write_parquet
+
+            write_parquet(df, f'{data_path}/dataTopCV.parquet')
+        else:
+            df.to_csv(f'{data_path}/dataTopCV.csv', index=False, encoding='utf-8-sig')
 
         print(f"\n--- DATA SAVED SUCCESSFULLY ---")
 
     except Exception as e:
         print(f"\n--- ERROR WHEN SAVING CSV FILE: {e} ---")
+
+    # Time, CPU, memory and rows of each page (JSON line, also appended to RUN_SUMMARY_PATH if set)
+    log_run_summary(os.environ.get('RUN_SUMMARY_PATH'))
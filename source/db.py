@@ -0,0 +1,42 @@
+import atexit
+import threading
+from sqlalchemy import create_engine
+
+# Default connection pool settings of the engines
+# pool_pre_ping: test a connection before using it (the database may have closed it between 2 cron runs)
+# pool_recycle: replace connections older than this number of seconds
+pool_options = {
+    'pool_size': 5,
+    'max_overflow': 10,
+    'pool_pre_ping': True,
+    'pool_recycle': 1800,
+}
+
+# One engine (one connection pool) per database URI for the whole process
+engines = {}
+engines_lock = threading.Lock()
+
+def configure_pool(**options):
+    # Change the default pool settings, used by the engines created after this call
+    pool_options.update(options)
+
+def get_engine(db_conn_uri, **options):
+    # Return the engine of db_conn_uri, created at the first call then reused by ETL, load and report
+    # options override the default pool settings, only when the engine is created
+    with engines_lock:
+        engine = engines.get(db_conn_uri)
+
+        if engine is None:
+            engine = create_engine(db_conn_uri, **{**pool_options, **options})
+            engines[db_conn_uri] = engine
+
+    return engine
+
+def dispose_engines():
+    # Close all connections of all engines
+    with engines_lock:
+        for engine in engines.values():
+            engine.dispose()
+        engines.clear()
+
+atexit.register(dispose_engines)
@@ -0,0 +1,106 @@
+import re
+import sqlite3
+import threading
+import time
+
+# Persistent cache of the detail pages (SQLite file), keyed by TopCV job id:
+# a posting already scraped in a previous run is not downloaded again while its entry is fresh (TTL),
+# then it is revalidated with a conditional request (ETag / Last-Modified) and only downloaded if it changed
+
+def job_id_from_link(link_description):
+    # TopCV job id (the number before .html), or the link without its query string for other links
+    job_id = re.search(r'/(\d+)\.html', link_description)
+    if job_id:
+        return job_id[1]
+    return link_description.split('?')[0]
+
+class DetailCache:
+    def __init__(self, path, ttl=86400):
+        # ttl: number of seconds an entry is used without asking the server
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.stats = {'hit': 0, 'not_modified': 0, 'miss': 0}
+
+        # One connection shared by the scraper threads (protected by the lock)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS detail_cache (
+                job_id TEXT PRIMARY KEY,
+                time_remain TEXT,
+                job_description TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL
+            )''')
+        self.connection.commit()
+
+    def get(self, job_id):
+        # Return the entry of job_id as a dict, None if not cached
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT time_remain, job_description, etag, last_modified, fetched_at FROM detail_cache "
+                "WHERE job_id = ?", (job_id,)).fetchone()
+
+        if row is None:
+            return None
+
+        return dict(zip(['time_remain', 'job_description', 'etag', 'last_modified', 'fetched_at'], row))
+
+    def is_fresh(self, entry):
+        return time.time() - entry['fetched_at'] < self.ttl
+
+    def request_headers(self, entry):
+        # Headers of the conditional request revalidating entry (the server answers 304 if the page did not change)
+        headers = {}
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, job_id, time_remain, job_description, response_headers):
+        with self.lock:
+            self.connection.execute('''
+                INSERT INTO detail_cache (job_id, time_remain, job_description, etag, last_modified, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (job_id) DO UPDATE SET
+                    time_remain = excluded.time_remain,
+                    job_description = excluded.job_description,
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    fetched_at = excluded.fetched_at''',
+                (job_id, time_remain, job_description, response_headers.get('ETag'),
+                 response_headers.get('Last-Modified'), time.time()))
+            self.connection.commit()
+
+    def touch(self, job_id):
+        # The server confirmed the page did not change (304): the entry is fresh again
+        with self.lock:
+            self.connection.execute("UPDATE detail_cache SET fetched_at = ? WHERE job_id = ?", (time.time(), job_id))
+            self.connection.commit()
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+# Cache used by the scrapers (None = no cache, every detail page is downloaded)
+detail_cache = None
+
+def configure_detail_cache(path, ttl=86400):
+    # Open the cache file (created if needed) for the next crawls. path=None to disable the cache
+    global detail_cache
+    if detail_cache is not None:
+        detail_cache.close()
+
+    detail_cache = DetailCache(path, ttl) if path else None
+    return detail_cache
+
+def get_detail_cache():
+    return detail_cache
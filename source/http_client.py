@@ -0,0 +1,177 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+# HTTP layer of the scrapers: one connection-pooled session (keep-alive, no new TCP/TLS handshake per page)
+# and a rate limiter per host that slows down when the server says it is overloaded
+
+# Status codes meaning "too many requests": slow down and retry later
+throttle_status = (429, 503)
+
+# Network errors worth another attempt. The other errors (invalid URL, parse error...) would fail the same way again
+retriable_errors = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+def new_session(pool_size=10):
+    # requests Session keeping up to pool_size connections open per host
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def parse_retry_after(value):
+    # Header Retry-After: a number of seconds or an HTTP date. Return the seconds to wait (None if missing/invalid)
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(0.0, retry_at.timestamp() - time.time())
+
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    # Exponential backoff with full jitter: random wait in [0, min(cap, base * 2^attempt)]
+    # The jitter spreads the retries of the threads instead of sending them back at the same time
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class RateLimiter:
+    # Token bucket: 'rate' requests per second on average, bursts of at most 'burst' requests
+    # The rate adapts to the server: divided by 2 when throttled (429/503), increased by 'step' after each success,
+    # between min_rate and max_rate
+    def __init__(self, rate=5.0, burst=5, min_rate=0.2, max_rate=20.0, step=0.1, clock=time.monotonic,
+                 sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.step = step
+        self.clock = clock
+        self.sleep = sleep
+
+        self.lock = threading.Lock()
+        self.tokens = float(burst)
+        self.updated = clock()
+        self.paused_until = 0.0
+        self.decreased_at = None
+
+    def reserve(self):
+        # Take one token and return the number of seconds to wait before sending the request
+        # The bucket can go below 0: the next callers wait for the tokens they took in advance
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            self.sleep(wait)
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.step)
+
+    def on_throttle(self, retry_after=None):
+        # retry_after: seconds given by the server (Retry-After), no request is sent before then
+        with self.lock:
+            now = self.clock()
+
+            # Several threads get throttled by the same burst: divide the rate at most once per second
+            if self.decreased_at is None or now - self.decreased_at >= 1.0:
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.decreased_at = now
+
+            # No burst after a throttle
+            self.tokens = min(self.tokens, 0.0)
+
+            if retry_after is not None:
+                self.paused_until = max(self.paused_until, now + retry_after)
+
+class HttpClient:
+    # Pooled session + one RateLimiter per host, shared by all the threads of a scraper
+    def __init__(self, pool_size=10, rate=5.0, burst=5, min_rate=0.2, max_rate=20.0, retries=3, backoff_base=1.0,
+                 backoff_cap=60.0, timeout=10):
+        self.session = new_session(pool_size)
+        self.limiter_options = {'rate': rate, 'burst': burst, 'min_rate': min_rate, 'max_rate': max_rate}
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+
+        self.limiters = {}
+        self.lock = threading.Lock()
+
+    def limiter(self, url):
+        host = urlsplit(url).netloc
+        with self.lock:
+            if host not in self.limiters:
+                self.limiters[host] = RateLimiter(**self.limiter_options)
+            return self.limiters[host]
+
+    def get(self, url, **kwargs):
+        # One GET request, sent when the rate limiter of the host allows it. The limiter learns from the answer
+        limiter = self.limiter(url)
+        limiter.acquire()
+
+        kwargs.setdefault('timeout', self.timeout)
+        response = self.session.get(url, **kwargs)
+
+        self.observe(limiter, response)
+        return response
+
+    def observe(self, limiter, response):
+        # The limiter slows down when the server is overloaded (429/503, Retry-After), speeds up after a success
+        if response.status_code in throttle_status:
+            limiter.on_throttle(parse_retry_after(response.headers.get('Retry-After')))
+        elif response.status_code < 400:
+            limiter.on_success()
+
+    def retry_delay(self, attempt, response=None):
+        # Seconds to wait before retrying after the failed attempt number 'attempt' (from 0):
+        # 0 after a 429/503 with Retry-After (observe paused the limiter of the host until then, the next request
+        # waits for it), else exponential backoff with jitter
+        if response is not None and response.status_code in throttle_status \
+                and parse_retry_after(response.headers.get('Retry-After')) is not None:
+            return 0.0
+
+        return backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+
+    def close(self):
+        self.session.close()
+
+# Default settings of the shared client
+client_options = {}
+
+# One client for the whole process (created at the first call of get_client)
+client = None
+client_lock = threading.Lock()
+
+def configure_client(**options):
+    # Change the settings of the shared client (HttpClient arguments), the current client is closed
+    global client
+    with client_lock:
+        client_options.update(options)
+        if client is not None:
+            client.close()
+            client = None
+
+def get_client():
+    global client
+    with client_lock:
+        if client is None:
+            client = HttpClient(**client_options)
+        return client
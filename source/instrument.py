@@ -0,0 +1,215 @@
+import contextlib
+import cProfile
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Windows: no peak RSS
+    resource = None
+
+# Per-stage instrumentation of the pipeline (scrape pages, extract, transform, load, reports):
+# each run of a stage records its wall time, CPU time, peak RSS and rows in/out,
+# run_summary() aggregates them by stage and log_run_summary() prints the summary as one JSON line.
+#
+# Profiling of one stage, enabled by environment variables:
+# PROFILE_STAGE=transform   name of the stage to profile
+# PROFILE=cprofile          cProfile stats (.prof, open with pstats or snakeviz)
+# PROFILE=tracemalloc       tracemalloc snapshot (.tracemalloc) and the top allocations printed
+# PROFILE_DIR=/tmp/profile  output folder (default: current folder), one file per run of the stage
+
+# Records of the finished stages (stages run in several threads in the pipeline)
+stage_records = []
+records_lock = threading.Lock()
+
+# Stages running in the current thread (a stage can run inside another one, e.g. transform inside load)
+running = threading.local()
+
+run_started = time.time()
+
+def peak_rss_mb():
+    # Peak resident memory of the process so far (ru_maxrss is in KB on Linux, in bytes on macOS)
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+def cpu_seconds():
+    # CPU time of the process (all threads) and of its finished child processes (process pools)
+    seconds = time.process_time()
+    if resource is not None:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        seconds += children.ru_utime + children.ru_stime
+    return seconds
+
+def stage_stack():
+    if not hasattr(running, 'stack'):
+        running.stack = []
+    return running.stack
+
+def start_stage(name, rows_in=None):
+    # Start timing a stage. Return its record: set record['rows_out'] (and rows_in) before end_stage(record)
+    record = {'stage': name, 'rows_in': rows_in, 'rows_out': None, 'children_seconds': 0.0,
+              'start_wall': time.perf_counter(), 'start_cpu': cpu_seconds(), 'start_rss_mb': peak_rss_mb()}
+    record['profiler'] = start_profile(name)
+    stage_stack().append(record)
+    return record
+
+def end_stage(record):
+    wall = time.perf_counter() - record.pop('start_wall')
+    record['wall_seconds'] = wall
+    record['cpu_seconds'] = cpu_seconds() - record.pop('start_cpu')
+    record['self_seconds'] = wall - record.pop('children_seconds')
+
+    # Peak RSS is the high-water mark of the process: rss_growth_mb > 0 when this stage raised it
+    start_rss = record.pop('start_rss_mb')
+    record['peak_rss_mb'] = peak_rss_mb()
+    record['rss_growth_mb'] = record['peak_rss_mb'] - start_rss if start_rss is not None else None
+
+    stop_profile(record.pop('profiler'))
+
+    stack = stage_stack()
+    if stack and stack[-1] is record:
+        stack.pop()
+    if stack:
+        stack[-1]['children_seconds'] += wall
+
+    if not record.pop('discard', False):
+        with records_lock:
+            stage_records.append(record)
+    return record
+
+@contextlib.contextmanager
+def stage(name, rows_in=None):
+    # with stage('transform', rows_in=len(df)) as record: ...; record['rows_out'] = len(df)
+    record = start_stage(name, rows_in)
+    try:
+        yield record
+    finally:
+        end_stage(record)
+
+def iter_stage(name, iterable):
+    # Time the production of each item of an iterable (e.g. the chunks read from a file) as one run of the stage
+    iterator = iter(iterable)
+    while True:
+        with stage(name) as record:
+            item = next(iterator, None)
+            # The end of the iterable is not a run of the stage
+            record['discard'] = item is None
+            record['rows_out'] = len(item) if item is not None else 0
+        if item is None:
+            return
+        yield item
+
+def start_profile(name):
+    # Start the profiler of PROFILE when PROFILE_STAGE is this stage
+    if os.environ.get('PROFILE_STAGE') != name:
+        return None
+
+    mode = os.environ.get('PROFILE', 'cprofile')
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return (name, mode, profiler)
+    if mode == 'tracemalloc':
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        return (name, mode, None)
+
+    print(f"Unknown profiler {mode}: use PROFILE=cprofile or PROFILE=tracemalloc")
+    return None
+
+def profile_path(name, extension):
+    # One file per run of the stage: <stage>-<n>.<extension>
+    profile_dir = os.environ.get('PROFILE_DIR', '.')
+    os.makedirs(profile_dir, exist_ok=True)
+
+    n = 1
+    while os.path.exists(os.path.join(profile_dir, f'{name}-{n}.{extension}')):
+        n += 1
+    return os.path.join(profile_dir, f'{name}-{n}.{extension}')
+
+def stop_profile(profile):
+    if profile is None:
+        return
+    name, mode, profiler = profile
+
+    try:
+        if mode == 'cprofile':
+            profiler.disable()
+            path = profile_path(name, 'prof')
+            profiler.dump_stats(path)
+            print(f"cProfile stats of stage {name} written to {path}")
+        else:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            path = profile_path(name, 'tracemalloc')
+            snapshot.dump(path)
+            print(f"tracemalloc snapshot of stage {name} written to {path} (peak {peak / 2 ** 20:.1f} MB)")
+            for line in snapshot.statistics('lineno')[:10]:
+                print(line)
+    except Exception as e:
+        print(f"Could not write the profile of stage {name}: {e}")
+
+def reset_stages():
+    # Forget the recorded stages (start of a new run)
+    global run_started
+    with records_lock:
+        stage_records.clear()
+    run_started = time.time()
+
+def run_summary():
+    # Stages of the run aggregated by name, in the order they first ran
+    stages = {}
+    with records_lock:
+        records = list(stage_records)
+
+    for record in records:
+        summary = stages.setdefault(record['stage'], {
+            'stage': record['stage'], 'calls': 0, 'wall_seconds': 0.0, 'self_seconds': 0.0, 'cpu_seconds': 0.0,
+            'rows_in': None, 'rows_out': None, 'peak_rss_mb': None, 'rss_growth_mb': None,
+        })
+        summary['calls'] += 1
+        for key in ['wall_seconds', 'self_seconds', 'cpu_seconds']:
+            summary[key] += record[key]
+        for key in ['rows_in', 'rows_out', 'rss_growth_mb']:
+            if record[key] is not None:
+                summary[key] = (summary[key] or 0) + record[key]
+        if record['peak_rss_mb'] is not None:
+            summary['peak_rss_mb'] = max(summary['peak_rss_mb'] or 0, record['peak_rss_mb'])
+
+    for summary in stages.values():
+        for key in ['wall_seconds', 'self_seconds', 'cpu_seconds', 'peak_rss_mb', 'rss_growth_mb']:
+            if summary[key] is not None:
+                summary[key] = round(summary[key], 3)
+
+    return {
+        'event': 'run_summary',
+        'started': datetime.datetime.fromtimestamp(run_started).isoformat(timespec='seconds'),
+        'wall_seconds': round(time.time() - run_started, 3),
+        'peak_rss_mb': round(peak_rss_mb(), 1) if resource is not None else None,
+        'stages': list(stages.values()),
+    }
+
+def log_run_summary(path=None):
+    # Print the run summary as one JSON line (and append it to the JSON lines file path)
+    summary = run_summary()
+    line = json.dumps(summary)
+    print(line)
+
+    if path:
+        try:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+        except OSError as e:
+            print(f"Could not write the run summary to {path}: {e}")
+    return summary
@@ -1,12 +1,249 @@
+import io
+import pandas as pd
 from sqlalchemy import text
-from sqlalchemy import create_engine
+from db import get_engine
+from aggregates import prepare_aggregates, subtract_old_rows, add_new_rows, mark_aggregates_stale
+from partitions import is_partitioned, create_partitioned_table, create_month_partitions, delete_moved_rows, \
+    drop_expired_partitions
 
-def loadtodb(df, db_conn_uri, tgt_table):
+def create_tables(connection, tgt_table, tmp_table, partitioned=False):
+    # Create target table
+    # partitioned=True: partitioned by month of created_date (see partitions.py), when the table does not exist yet
+    if partitioned:
+        create_partitioned_table(connection, tgt_table)
+
+    connection.execute(text(f'''   
+        CREATE TABLE IF NOT EXISTS {tgt_table} (
+            id SERIAL PRIMARY KEY,
+            created_date DATE,
+            job_title TEXT NOT NULL,
+            company TEXT,
+            salary TEXT,
+            address TEXT,
+            time VARCHAR(256),
+            link_description TEXT NOT NULL,
+            min_salary NUMERIC(12, 2),
+            max_salary NUMERIC(12, 2),
+            unit VARCHAR(25),
+            city TEXT,
+            district TEXT,
+            job_group TEXT);'''))
+
+    # Create temp table
+    # Dropped at the end of the transaction: the pooled connection (and its session) is reused by the next load
+    connection.execute(text(f'''
+        CREATE TEMP TABLE IF NOT EXISTS {tmp_table}(
+            id SERIAL PRIMARY KEY,
+            created_date DATE,
+            job_title TEXT NOT NULL,
+            company TEXT,
+            salary TEXT,
+            address TEXT,
+            time VARCHAR(256),
+            link_description TEXT NOT NULL UNIQUE,
+            min_salary NUMERIC(12, 2),
+            max_salary NUMERIC(12, 2),
+            unit VARCHAR(25),
+            city TEXT,
+            district TEXT,
+            job_group TEXT,
+            job_key TEXT,
+            content_hash BIGINT)
+        ON COMMIT DROP;'''))
+
+def has_incremental_columns(connection, tgt_table):
+    # The target table has the job_key and content_hash columns of the incremental mode
+    return connection.execute(text('''
+        SELECT EXISTS (SELECT 1 FROM pg_attribute
+                       WHERE attrelid = to_regclass(:tgt_table) AND attname = 'job_key' AND NOT attisdropped);'''),
+                              {'tgt_table': tgt_table}).scalar()
+
+def merge_tables(connection, tgt_table, tmp_table, partitioned=False):
+    # Merge data from temp table to target table
+    # partitioned=True: the unique key of a partitioned table contains created_date (see partitions.py)
+    conflict = 'id, created_date' if partitioned else 'id'
+
+    # A table also loaded in the incremental mode: the row overwritten by id is another posting, so its job_key
+    # and content_hash are reset. The next incremental load fills job_key again from link_description
+    # (see prepare_incremental) and rewrites the posting instead of skipping it as unchanged
+    reset_keys = ',\n            job_key = NULL,\n            content_hash = NULL' \
+        if has_incremental_columns(connection, tgt_table) else ''
+    connection.execute(text(f'''
+        INSERT INTO {tgt_table} (id, created_date, job_title, company, salary, address, time, link_description,
+                                 min_salary, max_salary, unit, city, district, job_group)
+        SELECT id, created_date, job_title, company, salary, address, time, link_description,
+                min_salary, max_salary, unit, city, district, job_group
+        FROM {tmp_table}
+        ON CONFLICT ({conflict}) DO UPDATE
+        SET created_date = EXCLUDED.created_date,
+            job_title = EXCLUDED.job_title,
+            company = EXCLUDED.company,
+            salary = EXCLUDED.salary,
+            address = EXCLUDED.address,
+            time = EXCLUDED.time,
+            link_description = EXCLUDED.link_description,
+            min_salary = EXCLUDED.min_salary,
+            max_salary = EXCLUDED.max_salary,
+            unit = EXCLUDED.unit,
+            city = EXCLUDED.city,
+            district = EXCLUDED.district,
+            job_group = EXCLUDED.job_group{reset_keys};'''))
+
+# Columns compared to detect a changed posting in the incremental mode
+# (not link_description: its tracking parameters change between crawls of the same posting)
+content_columns = ['created_date', 'job_title', 'company', 'salary', 'address', 'time',
+                   'min_salary', 'max_salary', 'unit', 'city', 'district', 'job_group']
+
+def normalize_job_key(link_series):
+    # Natural key of a posting: the TopCV job id in the link (.../1080379.html?ta_source=...),
+    # or the link without its query string when there is no id
+    job_id = link_series.str.extract(r'/(\d+)\.html', expand=False)
+    return job_id.fillna(link_series.str.split('?').str[0])
+
+def add_incremental_columns(df):
+    # Return a copy of df with 'job_key' and 'content_hash' (64-bit hash of the content columns)
+    df = df.copy()
+    df['job_key'] = normalize_job_key(df['link_description'])
+
+    columns = [column for column in content_columns if column in df.columns]
+    content_hash = pd.util.hash_pandas_object(df[columns].astype('string'), index=False)
+    # PostgreSQL BIGINT is signed
+    df['content_hash'] = content_hash.to_numpy().view('int64')
+    return df
+
+def prepare_incremental(connection, tgt_table, partitioned=False):
+    # Natural key and content hash columns in the target table, with a unique index on the natural key
+    connection.execute(text(f'''
+        ALTER TABLE {tgt_table}
+            ADD COLUMN IF NOT EXISTS job_key TEXT,
+            ADD COLUMN IF NOT EXISTS content_hash BIGINT;'''))
+
+    # Rows loaded before the incremental mode: fill job_key (same rule as normalize_job_key),
+    # only for the last row of each key so that the unique index can be created
+    connection.execute(text(f'''
+        UPDATE {tgt_table} AS t
+        SET job_key = k.job_key
+        FROM (
+            SELECT MAX(id) AS id,
+                   COALESCE(substring(link_description from '/(\\d+)\\.html'),
+                            split_part(link_description, '?', 1)) AS job_key
+            FROM {tgt_table}
+            WHERE job_key IS NULL
+            GROUP BY 2) AS k
+        WHERE t.id = k.id
+          AND NOT EXISTS (SELECT 1 FROM {tgt_table} AS e WHERE e.job_key = k.job_key);'''))
+
+    # A partitioned table has a unique index on (job_key, created_date) instead (see partitions.py)
+    if not partitioned:
+        connection.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {tgt_table}_job_key_idx ON {tgt_table} (job_key);"))
+
+    # The merge mode inserts explicit ids without using the SERIAL sequence -> move the sequence after MAX(id)
+    connection.execute(text(f'''
+        SELECT setval(pg_get_serial_sequence('{tgt_table}', 'id'),
+                      COALESCE((SELECT MAX(id) FROM {tgt_table}), 0) + 1, false);'''))
+
+def merge_incremental(connection, tgt_table, tmp_table, partitioned=False):
+    # Upsert the temp table into the target table on job_key.
+    # Rows with the same content_hash are skipped, only new or changed postings are written
+    # Return the number of inserted, updated and skipped rows
+    # partitioned=True: conflict on (job_key, created_date), and xmax cannot be read from a partitioned table:
+    # the inserted rows are the returned keys which are not in the table yet (the statement reads the table as
+    # it was before the upsert)
+    if partitioned:
+        conflict, returning = 'job_key, created_date', 'job_key'
+        is_inserted = f"NOT EXISTS (SELECT 1 FROM {tgt_table} AS t WHERE t.job_key = upserted.job_key)"
+    else:
+        conflict, returning, is_inserted = 'job_key', '(xmax = 0) AS inserted', 'inserted'
+
+    result = connection.execute(text(f'''
+        WITH src AS (
+            SELECT DISTINCT ON (job_key) *
+            FROM {tmp_table}
+            ORDER BY job_key, id DESC
+        ),
+        upserted AS (
+            INSERT INTO {tgt_table} (created_date, job_title, company, salary, address, time, link_description,
+                                     min_salary, max_salary, unit, city, district, job_group, job_key, content_hash)
+            SELECT created_date, job_title, company, salary, address, time, link_description,
+                   min_salary, max_salary, unit, city, district, job_group, job_key, content_hash
+            FROM src
+            ON CONFLICT ({conflict}) DO UPDATE
+            SET created_date = EXCLUDED.created_date,
+                job_title = EXCLUDED.job_title,
+                company = EXCLUDED.company,
+                salary = EXCLUDED.salary,
+                address = EXCLUDED.address,
+                time = EXCLUDED.time,
+                link_description = EXCLUDED.link_description,
+                min_salary = EXCLUDED.min_salary,
+                max_salary = EXCLUDED.max_salary,
+                unit = EXCLUDED.unit,
+                city = EXCLUDED.city,
+                district = EXCLUDED.district,
+                job_group = EXCLUDED.job_group,
+                content_hash = EXCLUDED.content_hash
+            WHERE {tgt_table}.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+            RETURNING {returning}
+        )
+        SELECT
+            (SELECT COUNT(*) FROM upserted WHERE {is_inserted}) AS inserted,
+            (SELECT COUNT(*) FROM upserted WHERE NOT {is_inserted}) AS updated,
+            (SELECT COUNT(*) FROM {tmp_table}) AS staged;''')).one()
+
+    return {'inserted': result.inserted, 'updated': result.updated,
+            'skipped': result.staged - result.inserted - result.updated}
+
+def copy_to_table(connection, df, table):
+    # Stream the DataFrame into the table with PostgreSQL COPY ... FROM STDIN (psycopg2),
+    # through an in-memory CSV buffer. Much faster than the INSERT statements of df.to_sql()
+    buffer = io.StringIO()
+    # Missing values are written as \N so that empty strings stay empty strings (same as to_sql)
+    df.to_csv(buffer, index=False, header=False, na_rep='\\N')
+    buffer.seek(0)
+
+    columns = ', '.join(f'"{column}"' for column in df.columns)
+
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+    finally:
+        cursor.close()
+
+def stage_to_table(connection, df, table, use_copy=True):
+    # COPY needs the psycopg2 driver, otherwise fall back to df.to_sql()
+    if use_copy and connection.dialect.driver == 'psycopg2':
+        copy_to_table(connection, df, table)
+    else:
+        df.to_sql(table, con=connection, if_exists='append', index=False)
+
+def loadtodb(df, db_conn_uri, tgt_table, use_copy=True, incremental=False, engine=None, aggregates=False,
+             partitioned=False, retention_months=None):
+    return loadtodb_chunks([df], db_conn_uri, tgt_table, use_copy=use_copy, incremental=incremental, engine=engine,
+                           aggregates=aggregates, partitioned=partitioned, retention_months=retention_months)
+
+def loadtodb_chunks(chunks, db_conn_uri, tgt_table, use_copy=True, incremental=False, engine=None,
+                    aggregates=False, partitioned=False, retention_months=None):
+    # Load an iterable of DataFrames (e.g. a generator of transformed chunks) into the target table.
+    # Each chunk is copied into the temp table as soon as it is ready, then the temp table is merged once,
+    # all in one transaction: same result as loading the whole DataFrame, without holding it in memory
+
+    # incremental=False: merge on id (rows of the temp table overwrite the target rows with the same id)
+    # incremental=True: upsert on the natural key (job id in link_description), skip unchanged rows
+    #                   and return {'inserted': ..., 'updated': ..., 'skipped': ...}
+    # aggregates=True: also maintain the aggregate tables of the reports with the delta of this load
+    #                  (see aggregates.py), in the same transaction. A load without it marks existing aggregates
+    #                  as out of date, they are rebuilt by the next load with aggregates=True
+    # partitioned=True: create the target table partitioned by month of created_date (see partitions.py).
+    #                   A table created partitioned stays partitioned: the partitions of new months are created
+    #                   by every load
+    # retention_months: drop the partitions older than this number of months (partitioned table only)
     tmp_table = 'tmptable'
 
     # Connect to PostgreSQL database
+    # engine=None: use the shared engine of db_conn_uri (see db.get_engine)
     try:
-        engine = create_engine(db_conn_uri)
+        if engine is None:
+            engine = get_engine(db_conn_uri)
         print('Connected to database successfully')
     except Exception as e:
         print('Connection to database failed. Please check again.')
@@ -14,68 +251,58 @@ def loadtodb(df, db_conn_uri, tgt_table):
 
     with engine.begin() as connection:
         try:
-            # Create target table
-            connection.execute(text(f'''   
-                CREATE TABLE IF NOT EXISTS {tgt_table} (
-                    id SERIAL PRIMARY KEY,
-                    created_date DATE,
-                    job_title TEXT NOT NULL,
-                    company TEXT,
-                    salary TEXT,
-                    address TEXT,
-                    time VARCHAR(256),
-                    link_description TEXT NOT NULL,
-                    min_salary NUMERIC(12, 2),
-                    max_salary NUMERIC(12, 2),
-                    unit VARCHAR(25),
-                    city TEXT,
-                    district TEXT,
-                    job_group TEXT);'''))
-
-            # Create temp table
-            connection.execute(text(f'''
-                CREATE TEMP TABLE IF NOT EXISTS {tmp_table}(
-                    id SERIAL PRIMARY KEY,
-                    created_date DATE,
-                    job_title TEXT NOT NULL,
-                    company TEXT,
-                    salary TEXT,
-                    address TEXT,
-                    time VARCHAR(256),
-                    link_description TEXT NOT NULL UNIQUE,
-                    min_salary NUMERIC(12, 2),
-                    max_salary NUMERIC(12, 2),
-                    unit VARCHAR(25),
-                    city TEXT,
-                    district TEXT,
-                    job_group TEXT);'''))
-
-            # Load data from DataFrame into temp table
-            df.to_sql(tmp_table, con=connection, if_exists='append', index=False)
+            # Create target table and temp table
+            create_tables(connection, tgt_table, tmp_table, partitioned=partitioned)
+            partitioned = is_partitioned(connection, tgt_table)
+
+            if incremental:
+                prepare_incremental(connection, tgt_table, partitioned=partitioned)
+
+            # Load data from DataFrames into temp table
+            # use_copy=True: bulk load with COPY, use_copy=False: INSERT with df.to_sql()
+            for df in chunks:
+                if incremental:
+                    df = add_incremental_columns(df)
+                stage_to_table(connection, df, tmp_table, use_copy=use_copy)
+
+            if partitioned:
+                create_month_partitions(connection, tgt_table, tmp_table)
+
+            # Aggregates: subtract the current values of the rows about to be written
+            if aggregates:
+                prepare_aggregates(connection, tgt_table)
+                subtract_old_rows(connection, tgt_table, tmp_table, incremental)
+
+            # Partitioned table: the rows changing partition are deleted, then inserted again by the merge
+            moved = delete_moved_rows(connection, tgt_table, tmp_table, incremental) if partitioned else 0
 
             # Merge data from temp table to target table
-            connection.execute(text(f'''
-                INSERT INTO {tgt_table} (id, created_date, job_title, company, salary, address, time, link_description,
-                                         min_salary, max_salary, unit, city, district, job_group)
-                SELECT id, created_date, job_title, company, salary, address, time, link_description,
-                        min_salary, max_salary, unit, city, district, job_group
-                FROM {tmp_table}
-                ON CONFLICT (id) DO UPDATE
-                SET created_date = EXCLUDED.created_date,
-                    job_title = EXCLUDED.job_title,
-                    company = EXCLUDED.company,
-                    salary = EXCLUDED.salary,
-                    address = EXCLUDED.address,
-                    time = EXCLUDED.time,
-                    link_description = EXCLUDED.link_description,
-                    min_salary = EXCLUDED.min_salary,
-                    max_salary = EXCLUDED.max_salary,
-                    unit = EXCLUDED.unit,
-                    city = EXCLUDED.city,
-                    district = EXCLUDED.district,
-                    job_group = EXCLUDED.job_group;'''))
+            if incremental:
+                counts = merge_incremental(connection, tgt_table, tmp_table, partitioned=partitioned)
+                # A moved row is an updated posting
+                counts['inserted'] -= moved
+                counts['updated'] += moved
+            else:
+                merge_tables(connection, tgt_table, tmp_table, partitioned=partitioned)
+
+            # Aggregates: add the new values of the written rows, without aggregates they are now out of date
+            if aggregates:
+                add_new_rows(connection, tgt_table, incremental)
+            else:
+                mark_aggregates_stale(connection, tgt_table)
+
+            # Retention: drop the expired partitions in the same transaction
+            if retention_months:
+                if partitioned:
+                    drop_expired_partitions(connection, tgt_table, retention_months, aggregates=aggregates)
+                else:
+                    print(f"Retention needs a partitioned table: {tgt_table} is not partitioned")
+
+            if incremental:
+                print(f"Incremental load: {counts['inserted']} inserted, {counts['updated']} updated, "
+                      f"{counts['skipped']} skipped")
+                return counts
 
         except Exception as e:
             connection.rollback()
             print(f"An error occurred while loading data into the database: {e}")
-
@@ -1,7 +1,8 @@
 import os
 from dotenv import load_dotenv
 from ETL import etl
-from report import getdata_fromdb, plot_salary_distribution, plot_job_heatmap, plot_techtrend
+from db import get_engine, dispose_engines
+from instrument import stage, log_run_summary
 
 # Get current file directory
 current_dir = os.path.dirname(__file__)
@@ -23,37 +24,128 @@ if __name__ == '__main__':
     db_pass = os.environ.get('DB_PASS')
     data_path = os.environ.get('DATA_PATH')
 
-    db_conn_uri = f'postgresql://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}'
+    # Optional: number of rows per chunk to stream the ETL with bounded memory (empty = whole file at once)
+    etl_chunksize = os.environ.get('ETL_CHUNKSIZE')
+    etl_chunksize = int(etl_chunksize) if etl_chunksize else None
 
-    data_path = f'{data_path}/data.csv'
+    # Optional: ETL_INCREMENTAL=1 to only insert new postings and update changed ones
+    etl_incremental = os.environ.get('ETL_INCREMENTAL') == '1'
 
-    tgt_table = 'JobList'
+    # Optional: TRANSFORM_MEMOIZE=1 to parse each distinct salary, address and job title only once (LRU caches,
+    # faster when the data repeats a lot of values)
+    transform_memoize = os.environ.get('TRANSFORM_MEMOIZE') == '1'
 
-    # ETL data
-    print("--- Running ETL ---")
-    etl(data_path, db_conn_uri, tgt_table)
-    print("--- ETL Finished ---\n")
+    # Optional: TRANSFORM_WORKERS processes to transform the data (0: one per CPU, default 1: no process pool),
+    # partitions of TRANSFORM_PARTITION_SIZE rows
+    transform_workers = int(os.environ.get('TRANSFORM_WORKERS', 1)) or None
+    transform_partition_size = int(os.environ.get('TRANSFORM_PARTITION_SIZE', 100000))
 
-    # Create data reports
-    print("--- Running Data Analysis from PostgreSQL Data ---")
-    try:
-        # Get data from PostgreSQL
-        df_from_db = getdata_fromdb(db_conn_uri, tgt_table)
+    # Optional: AGGREGATES=1 to maintain the aggregate tables of the reports at load time and read the reports from them
+    # (after a run without it, the first run with AGGREGATES=1 rebuilds them from JobList)
+    aggregates = os.environ.get('AGGREGATES') == '1'
 
-        convert_rate = 25000
-        report_path =  os.environ.get('REPORT_PATH')
+    # Optional: JOBLIST_PARTITIONED=1 to create JobList partitioned by month of created_date (when JobList does not
+    # exist yet: an existing plain JobList is not migrated and stays unpartitioned),
+    # RETENTION_MONTHS=N to drop the partitions older than N months (see partitions.py)
+    partitioned = os.environ.get('JOBLIST_PARTITIONED') == '1'
+    retention_months = int(os.environ.get('RETENTION_MONTHS', 0)) or None
 
-        os.makedirs(report_path, exist_ok=True)
+    db_conn_uri = f'postgresql://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}'
 
-        # 1. Vẽ biểu đồ phân bố mức lương theo vị trí
-        plot_salary_distribution(df_from_db, convert_rate, report_path)
+    # ETL input in DATA_PATH: data.csv or a Parquet dataset, e.g. ETL_SOURCE=data.parquet (see staging.py)
+    data_path = f"{data_path}/{os.environ.get('ETL_SOURCE', 'data.csv')}"
 
-        # 2. Vẽ bản đồ nhiệt (heatmap) phân bố việc làm theo khu vực
-        plot_job_heatmap(df_from_db, report_path)
+    tgt_table = 'JobList'
 
-        # 3. Biểu đồ xu hướng công nghệ hot
-        plot_techtrend(df_from_db, report_path)
+    # One connection pool shared by the ETL and the reports
+    engine = get_engine(db_conn_uri,
+                        pool_size=int(os.environ.get('DB_POOL_SIZE', 5)),
+                        pool_pre_ping=os.environ.get('DB_POOL_PRE_PING', '1') == '1',
+                        pool_recycle=int(os.environ.get('DB_POOL_RECYCLE', 1800)))
+
+    if os.environ.get('PIPELINE') == '1':
+        # PIPELINE=1: crawl TopCV and load each page into the database as soon as it is scraped (no CSV file)
+        from pipeline import run_pipeline
+
+        print("--- Running scraping pipeline ---")
+        # Checkpoint of the pipeline, in its own file: the sequential crawl (data_scrapping_TopCV.py) keeps its
+        # checkpoint in CRAWL_STATE_PATH. PIPELINE_STATE_PATH empty to disable
+        crawl_state_path = os.environ.get('PIPELINE_STATE_PATH', f"{os.environ.get('DATA_PATH')}/pipeline_state.json")
+
+        # CRAWL_INCREMENTAL=1: skip the postings already in JobList or in the pipeline state (no detail page request),
+        # as the sequential crawl of data_scrapping_TopCV.py
+        known_job_ids = None
+        if os.environ.get('CRAWL_INCREMENTAL') == '1':
+            from crawl_state import load_crawl_state, known_job_ids_from_db
+
+            known_job_ids = set(load_crawl_state(crawl_state_path or None)['known_job_ids'])
+            known_job_ids |= known_job_ids_from_db(engine, tgt_table)
+
+        run_pipeline(db_conn_uri, tgt_table,
+                     last_page=int(os.environ.get('CRAWL_LAST_PAGE', 4)) or None,
+                     known_job_ids=known_job_ids,
+                     state_path=crawl_state_path or None,
+                     queue_size=int(os.environ.get('PIPELINE_QUEUE_SIZE', 2)),
+                     engine=engine,
+                     aggregates=aggregates,
+                     partitioned=partitioned,
+                     retention_months=retention_months)
+        print("--- Pipeline Finished ---\n")
+    else:
+        # ETL data
+        print("--- Running ETL ---")
+        etl(data_path, db_conn_uri, tgt_table, memoize=transform_memoize, chunksize=etl_chunksize,
+            incremental=etl_incremental, engine=engine, workers=transform_workers,
+            partition_size=transform_partition_size, aggregates=aggregates, partitioned=partitioned,
+            retention_months=retention_months)
+        print("--- ETL Finished ---\n")
+
+    # Create data reports (REPORTS=0 for an ETL-only run: the report modules are then not even imported)
+    run_reports = os.environ.get('REPORTS', '1') == '1'
 
-        print("Reports saved to project folder.")
+    print("--- Running Data Analysis from PostgreSQL Data ---")
+    try:
+        if not run_reports:
+            print("Reports skipped (REPORTS=0).")
+        else:
+            from report import report_tasks_from_db, render_reports
+
+            convert_rate = 25000
+            report_path =  os.environ.get('REPORT_PATH')
+
+            os.makedirs(report_path, exist_ok=True)
+
+            # Tech terms of the tech trend chart (TECH_TERMS_PATH: term list file, see techterms.load_tech_terms)
+            if os.environ.get('TECH_TERMS_PATH'):
+                from techterms import configure_tech_terms
+                configure_tech_terms(os.environ.get('TECH_TERMS_PATH'))
+
+            # The aggregations are computed in PostgreSQL, only the small results are fetched
+            # 1. Vẽ biểu đồ phân bố mức lương theo vị trí
+            # 2. Vẽ bản đồ nhiệt (heatmap) phân bố việc làm theo khu vực
+            # 3. Biểu đồ xu hướng công nghệ hot
+            with stage('report_query') as record:
+                report_tasks = report_tasks_from_db(db_conn_uri, tgt_table, convert_rate, report_path, engine=engine,
+                                                    aggregates=aggregates)
+                record['rows_out'] = sum(len(data) for _, _, data, _ in report_tasks)
+
+            # The charts are drawn at the same time in a process pool (REPORT_PARALLEL=0 to draw one after another)
+            # A chart whose data and parameters did not change since the last run is not drawn again
+            # (REPORT_CACHE=0 to disable the cache, REPORT_FORCE=1 to draw every chart anyway)
+            with stage('report_render', rows_in=len(report_tasks)) as record:
+                drawn = render_reports(report_tasks, parallel=os.environ.get('REPORT_PARALLEL', '1') == '1',
+                                       cache=os.environ.get('REPORT_CACHE', '1') == '1',
+                                       force=os.environ.get('REPORT_FORCE') == '1',
+                                       params={'convert_rate': convert_rate})
+                record['rows_out'] = len(drawn)
+
+            print("Reports saved to project folder.")
     except Exception as e:
         print(f"Could not run analysis: {e}")
+    finally:
+        # Close the connections of the pool (also done at exit)
+        dispose_engines()
+
+        # Time, CPU, peak memory and rows of each stage as one JSON line, to find the slow stage of a run
+        # (RUN_SUMMARY_PATH: also append it to this JSON lines file). PROFILE_STAGE/PROFILE: see instrument.py
+        log_run_summary(os.environ.get('RUN_SUMMARY_PATH'))
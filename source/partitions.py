@@ -0,0 +1,131 @@
+import re
+import datetime
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import text
+from aggregates import agg_tables, apply_rows, delete_empty_groups
+
+# Optional schema of the target table partitioned by month of created_date (load.loadtodb, partitioned=True):
+# - one partition per month ({tgt_table}_pYYYYMM), created by the load before the rows of a new month are merged
+# - a default partition ({tgt_table}_default) for the rows without created_date
+# - indexes on job_group, city and the natural key, created on the parent so every partition gets them
+# - retention: whole partitions older than the retention are dropped, instead of DELETE row by row
+#
+# The unique keys of a partitioned table must contain created_date: the merge conflicts on (id, created_date)
+# or (job_key, created_date). A posting whose created_date changed is deleted from its old partition
+# before the merge (see delete_moved_rows), so id and job_key stay unique in the whole table
+
+def is_partitioned(connection, tgt_table):
+    return connection.execute(text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+                                   "WHERE partrelid = to_regclass(:tgt_table));"),
+                              {'tgt_table': tgt_table}).scalar()
+
+def create_partitioned_table(connection, tgt_table):
+    # Same columns as the table of load.create_tables, with the columns of the incremental mode
+    # Only a new table is created partitioned: an existing plain table is not migrated, it stays unpartitioned
+    # (to migrate: rename it, load its rows into a new partitioned table, then drop it)
+    exists = connection.execute(text("SELECT to_regclass(:tgt_table) IS NOT NULL;"),
+                                {'tgt_table': tgt_table}).scalar()
+    if exists and not is_partitioned(connection, tgt_table):
+        print(f"Warning: {tgt_table} already exists and is not partitioned, it is loaded unpartitioned")
+        return
+
+    connection.execute(text(f'''
+        CREATE TABLE IF NOT EXISTS {tgt_table} (
+            id SERIAL,
+            created_date DATE,
+            job_title TEXT NOT NULL,
+            company TEXT,
+            salary TEXT,
+            address TEXT,
+            time VARCHAR(256),
+            link_description TEXT NOT NULL,
+            min_salary NUMERIC(12, 2),
+            max_salary NUMERIC(12, 2),
+            unit VARCHAR(25),
+            city TEXT,
+            district TEXT,
+            job_group TEXT,
+            job_key TEXT,
+            content_hash BIGINT)
+        PARTITION BY RANGE (created_date);'''))
+
+    connection.execute(text(f"CREATE TABLE IF NOT EXISTS {tgt_table}_default PARTITION OF {tgt_table} DEFAULT;"))
+
+    # Unique keys of the merges (see load.merge_tables and load.merge_incremental) and indexes of the report filters
+    connection.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {tgt_table}_id_idx ON {tgt_table} (id, created_date);"))
+    connection.execute(text(f'''
+        CREATE UNIQUE INDEX IF NOT EXISTS {tgt_table}_job_key_idx ON {tgt_table} (job_key, created_date);'''))
+    connection.execute(text(f"CREATE INDEX IF NOT EXISTS {tgt_table}_job_group_idx ON {tgt_table} (job_group);"))
+    connection.execute(text(f"CREATE INDEX IF NOT EXISTS {tgt_table}_city_idx ON {tgt_table} (city);"))
+
+def create_month_partitions(connection, tgt_table, tmp_table):
+    # Create the partitions of the months of the temp table which do not have one yet
+    months = connection.execute(text(f'''
+        SELECT DISTINCT date_trunc('month', created_date)::date AS month
+        FROM {tmp_table}
+        WHERE created_date IS NOT NULL;''')).scalars().all()
+
+    for month in months:
+        connection.execute(text(f'''
+            CREATE TABLE IF NOT EXISTS {tgt_table}_p{month:%Y%m} PARTITION OF {tgt_table}
+            FOR VALUES FROM ('{month}') TO ('{month + relativedelta(months=1)}');'''))
+
+def delete_moved_rows(connection, tgt_table, tmp_table, incremental):
+    # Delete the target rows whose created_date changed (they move to another partition: the merge inserts them
+    # again) and the rows without created_date (NULL is not a conflict for the unique keys)
+    # Return the number of deleted rows
+    if incremental:
+        source = f'''(SELECT DISTINCT ON (job_key) job_key, created_date
+                      FROM {tmp_table}
+                      ORDER BY job_key, id DESC)'''
+        key_column = 'job_key'
+    else:
+        source = tmp_table
+        key_column = 'id'
+
+    result = connection.execute(text(f'''
+        DELETE FROM {tgt_table} AS t
+        USING {source} AS s
+        WHERE t.{key_column} = s.{key_column}
+          AND (t.created_date IS DISTINCT FROM s.created_date OR s.created_date IS NULL);'''))
+    return result.rowcount
+
+def list_partitions(connection, tgt_table):
+    # (name, first day, first day after the partition) of the month partitions, oldest first
+    rows = connection.execute(text('''
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) AS bound
+        FROM pg_inherits AS i
+        JOIN pg_class AS c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:tgt_table);'''), {'tgt_table': tgt_table}).all()
+
+    partitions = []
+    for name, bound in rows:
+        # FOR VALUES FROM ('2025-11-01') TO ('2025-12-01'), or DEFAULT
+        dates = re.findall(r"'(\d{4}-\d{2}-\d{2})'", bound)
+        if len(dates) == 2:
+            partitions.append((name, datetime.date.fromisoformat(dates[0]), datetime.date.fromisoformat(dates[1])))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+def drop_expired_partitions(connection, tgt_table, retention_months, today=None, aggregates=False):
+    # Drop the partitions whose rows are all older than retention_months months (before today - retention)
+    # aggregates=True: subtract their rows from the aggregate tables first (see aggregates.py)
+    # Return the names of the dropped partitions
+    today = today or datetime.date.today()
+    cutoff = today - relativedelta(months=retention_months)
+
+    dropped = []
+    for name, start, end in list_partitions(connection, tgt_table):
+        if end > cutoff:
+            continue
+
+        if aggregates and connection.execute(text("SELECT to_regclass(:table) IS NOT NULL;"),
+                                             {'table': agg_tables(tgt_table)['jobs']}).scalar():
+            apply_rows(connection, tgt_table, f"created_date >= '{start}' AND created_date < '{end}'", -1)
+            delete_empty_groups(connection, tgt_table)
+
+        connection.execute(text(f"DROP TABLE {name};"))
+        dropped.append(name)
+
+    if dropped:
+        print(f"Retention: {len(dropped)} partitions older than {cutoff} dropped ({', '.join(dropped)})")
+    return dropped
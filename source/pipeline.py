@@ -0,0 +1,183 @@
+import queue
+import threading
+import pandas as pd
+from transform import cleaning_data
+from load import loadtodb
+from crawl_state import load_crawl_state, save_crawl_state, remember_job_ids, append_checkpoint_jobs, \
+    load_checkpoint_jobs, clear_checkpoint_jobs
+from data_scrapping_TopCV import topcv_url, iter_scrape_pages
+from staging import job_columns
+from schema import apply_schema
+from instrument import stage
+
+# Streaming pipeline scraper -> cleaning_data -> loadtodb, without the CSV files:
+# each scraped page is a micro-batch, transformed and upserted as soon as it is crawled.
+# The 3 stages run at the same time (scraper thread, transform thread, loader in the calling thread)
+# and are connected by bounded queues: a slow stage makes the previous one wait, memory stays bounded
+
+# End of a stream
+end_of_stream = None
+
+def put_until_stopped(q, item, stop):
+    # queue.put that gives up when the pipeline is stopped (the next stage may not read any more)
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+def get_until_stopped(q, stop):
+    # queue.get that returns end_of_stream when the pipeline is stopped (the previous stage may not write any more)
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.5)
+        except queue.Empty:
+            pass
+    return end_of_stream
+
+def transform_page(jobs):
+    # DataFrame of the jobs of one page, with the same columns as the ETL of data.csv
+    # (job_description is not a column of JobList)
+    df = pd.DataFrame(jobs, columns=job_columns)
+
+    # job_title and link_description are NOT NULL in the target table
+    missing = df['job_title'].isna() | df['link_description'].isna()
+    if missing.any():
+        print(f"{missing.sum()} jobs without title or link skipped")
+        df = df[~missing].reset_index(drop=True)
+
+    apply_schema(df)
+    cleaning_data(df, typed=True)
+    return df
+
+def scrape_stage(pages_queue, stop, crawl_options, progress):
+    try:
+        # Each page goes with the number of known postings in a row at its end (saved in the checkpoint:
+        # progress has moved on to the next pages when the page is loaded)
+        for page_number, jobs in iter_scrape_pages(progress=progress, **crawl_options):
+            if not put_until_stopped(pages_queue, (page_number, jobs, progress['known_streak']), stop):
+                return
+    except Exception as e:
+        print(f"Error while scrapping data: {e}")
+    finally:
+        put_until_stopped(pages_queue, end_of_stream, stop)
+
+def transform_stage(pages_queue, batches_queue, stop, status):
+    try:
+        while True:
+            page = get_until_stopped(pages_queue, stop)
+            if page is end_of_stream:
+                break
+
+            page_number, jobs, known_streak = page
+            if jobs:
+                with stage('transform', rows_in=len(jobs)) as record:
+                    batch = (page_number, transform_page(jobs), known_streak)
+                    record['rows_out'] = len(batch[1])
+            else:
+                batch = (page_number, None, known_streak)
+
+            if not put_until_stopped(batches_queue, batch, stop):
+                return
+    except Exception as e:
+        print(f"Error while transforming data: {e}")
+        status['failed'] = True
+    finally:
+        put_until_stopped(batches_queue, end_of_stream, stop)
+
+def run_pipeline(db_conn_uri, tgt_table, base_url=topcv_url, first_page=1, last_page=4, known_job_ids=None,
+                 stop_after_known=3, state_path=None, queue_size=2, engine=None, aggregates=False,
+                 partitioned=False, retention_months=None):
+    # Crawl the pages (see data_scrapping_TopCV.iter_scrape_pages) and upsert each page into tgt_table
+    # (incremental load on the natural key, see load.loadtodb) while the next pages are crawled
+    # queue_size: number of pages waiting between 2 stages
+    # aggregates=True: maintain the aggregate tables of the reports with each page (see aggregates.py)
+    # partitioned=True / retention_months: target table partitioned by month, old partitions dropped (see partitions.py)
+    # state_path: checkpoint after each loaded page (see crawl_state.py), an interrupted run resumes from it
+    # Return the total number of inserted, updated and skipped rows
+    totals = {'pages': 0, 'inserted': 0, 'updated': 0, 'skipped': 0}
+    loaded_links = []
+    progress = {'next_page': first_page, 'existed_links': set(), 'known_streak': 0}
+
+    # The checkpoint keeps the links of the loaded jobs (their rows are in the database)
+    state = load_crawl_state(state_path)
+    checkpoint = state['checkpoint']
+    loaded_jobs = None
+    if checkpoint and checkpoint.get('mode') == 'pipeline' and checkpoint['base_url'] == base_url:
+        loaded_jobs = load_checkpoint_jobs(state_path, checkpoint['jobs_count'])
+
+    if loaded_jobs is not None:
+        loaded_links = [job['link_description'] for job in loaded_jobs]
+        progress = {'next_page': checkpoint['next_page'], 'existed_links': set(loaded_links),
+                    'known_streak': checkpoint['known_streak']}
+        print(f"Resume the pipeline from page {progress['next_page']}")
+    elif checkpoint and checkpoint.get('mode') != 'pipeline':
+        # Checkpoint of an interrupted sequential crawl (data_scrapping_TopCV.data_scrapping) in the same file:
+        # kept for that crawl to resume, this run is not checkpointed
+        print(f"{state_path} has the checkpoint of another crawl: the pipeline runs without checkpoint")
+        state_path = None
+    elif state_path:
+        clear_checkpoint_jobs(state_path)
+
+    crawl_options = {'base_url': base_url, 'first_page': first_page, 'last_page': last_page,
+                     'known_job_ids': known_job_ids, 'stop_after_known': stop_after_known}
+
+    pages_queue = queue.Queue(maxsize=queue_size)
+    batches_queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    # failed: a page could not be transformed or loaded, the crawl is not finished
+    status = {'failed': False}
+
+    threads = [
+        threading.Thread(target=scrape_stage, args=(pages_queue, stop, crawl_options, progress), daemon=True),
+        threading.Thread(target=transform_stage, args=(pages_queue, batches_queue, stop, status), daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            batch = batches_queue.get()
+            if batch is end_of_stream:
+                break
+
+            page_number, df, known_streak = batch
+            page_links = []
+            if df is not None and len(df):
+                with stage('load', rows_in=len(df)) as record:
+                    counts = loadtodb(df, db_conn_uri, tgt_table, incremental=True, engine=engine,
+                                      aggregates=aggregates, partitioned=partitioned,
+                                      retention_months=retention_months)
+                    record['rows_out'] = counts['inserted'] + counts['updated'] if counts else None
+                if counts is None:
+                    # loadtodb printed the error and rolled back this page: stop, the run can resume from it
+                    status['failed'] = True
+                    break
+
+                for key in ['inserted', 'updated', 'skipped']:
+                    totals[key] += counts[key]
+                page_links = list(df['link_description'])
+                loaded_links.extend(page_links)
+
+            totals['pages'] += 1
+
+            # Checkpoint: the page is in the database
+            if state_path:
+                append_checkpoint_jobs(state_path, [{'link_description': link} for link in page_links])
+                state['checkpoint'] = {'mode': 'pipeline', 'base_url': base_url, 'next_page': page_number + 1,
+                                       'jobs_count': len(loaded_links), 'known_streak': known_streak}
+                save_crawl_state(state_path, state)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    if state_path and progress['finished'] and not status['failed']:
+        remember_job_ids(state_path, [{'link_description': link} for link in loaded_links])
+
+    print(f"Pipeline: {totals['pages']} pages, {totals['inserted']} inserted, {totals['updated']} updated, "
+          f"{totals['skipped']} skipped")
+    return totals
@@ -1,57 +1,135 @@
-import matplotlib.pyplot as plt
-import seaborn as sns
+import concurrent.futures
+import hashlib
+import json
+import os
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine
-import re
+from db import get_engine
+from report_query import query_job_counts, query_salary_stats, query_tech_term_counts
+from techterms import get_tech_term_matcher
 
-def getdata_fromdb(db_conn_uri,tgt_table):
+# matplotlib and seaborn are imported inside the drawing functions:
+# importing this module (e.g. from main.py for an ETL-only run) does not load them
+
+def getdata_fromdb(db_conn_uri,tgt_table, engine=None):
     try:
-        engine = create_engine(db_conn_uri)
+        if engine is None:
+            engine = get_engine(db_conn_uri)
         df = pd.read_sql(f"SELECT * FROM {tgt_table}", engine)
         return df
     except Exception as e:
         print(f"Could not run analysis: {e}")
 
+def salary_mil_vnd(df, convert_rate):
+    # Salary of each job converted to million VND (columnar, no Python loop over the rows)
+    # USD salaries are multiplied by convert_rate. Average of min/max, or the only one known, NaN if none
+    min_salary = pd.to_numeric(df['min_salary'], errors='coerce').to_numpy(dtype=float)
+    max_salary = pd.to_numeric(df['max_salary'], errors='coerce').to_numpy(dtype=float)
+
+    is_usd = df['unit'].isin(['usd', 'USD']).to_numpy()
+    min_salary = np.where(is_usd, min_salary * convert_rate, min_salary)
+    max_salary = np.where(is_usd, max_salary * convert_rate, max_salary)
+
+    salary = np.where(np.isnan(min_salary), max_salary, min_salary)
+    salary = np.where(np.isnan(min_salary) | np.isnan(max_salary), salary, (min_salary + max_salary) / 2)
+
+    return pd.Series(salary / 1000000, index=df.index)
+
 def convert_salary(df, convert_rate):
     # Create new salary column converted to (million) VND
-    def apply_salary(row):
-        min_salary = row['min_salary']
-        max_salary = row['max_salary']
-        unit = row['unit']
-
-        if unit == 'usd' or unit == 'USD':
-            min_salary = min_salary * convert_rate
-            max_salary = max_salary * convert_rate
-
-        if pd.notna(min_salary) and pd.notna(max_salary):
-            return ((min_salary + max_salary) / 2) / 1000000
-        elif pd.notna(min_salary):
-            return min_salary / 1000000
-        elif pd.notna(max_salary):
-            return max_salary / 1000000
-        else:
-            return None
-
-    df['converted_salary(mil VND)'] = df.apply(apply_salary, axis=1)
+    df['converted_salary(mil VND)'] = salary_mil_vnd(df, convert_rate)
     # Shink to lower than 1000 mil VND because some data are too large (might cause report imbalance)
     df = df[df['converted_salary(mil VND)'] < 1000]
     return df
 
+def new_figure(figsize=(12, 8)):
+    # Object-oriented Figure drawn with the Agg backend, not registered in pyplot's global state,
+    # so several charts can be drawn at the same time (in threads or processes)
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig, fig.subplots()
+
+def save_figure(fig, ax, report_path):
+    try:
+        for label in ax.get_xticklabels():
+            label.set_rotation(45)
+            label.set_horizontalalignment('right')
+        fig.tight_layout()
+        fig.savefig(report_path)
+    finally:
+        # Close the figure explicitly so that many reports in one process do not keep the memory
+        fig.clear()
+
+def draw_salary_distribution(df_salary, report_path):
+    import matplotlib
+    import seaborn as sns
+
+    # rc_context: the seaborn theme is only applied to this chart
+    with matplotlib.rc_context():
+        sns.set_theme()
+        fig, ax = new_figure()
+        sns.boxplot(data=df_salary, x='job_group', y='converted_salary(mil VND)', hue='job_group',
+                    palette='viridis', legend=False, ax=ax)
+        ax.set_title('Salary distribution (million VND) by job group', fontsize=20)
+        ax.set_ylabel('Average salary (million VND)')
+        ax.set_xlabel('Job group')
+        save_figure(fig, ax, report_path)
+
+def draw_salary_stats(df_stats, report_path):
+    # Draw the salary box plot from precomputed statistics (see report_query.query_salary_stats)
+    import matplotlib
+    import seaborn as sns
+
+    stats = [{'label': row.job_group, 'mean': row.mean, 'q1': row.q1, 'med': row.med, 'q3': row.q3,
+              'whislo': row.whislo, 'whishi': row.whishi} for row in df_stats.itertuples()]
+
+    with matplotlib.rc_context():
+        sns.set_theme()
+        fig, ax = new_figure()
+        boxes = ax.bxp(stats, showfliers=False, patch_artist=True, medianprops={'color': 'black'})
+        for box, color in zip(boxes['boxes'], sns.color_palette('viridis', len(stats))):
+            box.set_facecolor(color)
+        ax.set_title('Salary distribution (million VND) by job group', fontsize=20)
+        ax.set_ylabel('Average salary (million VND)')
+        ax.set_xlabel('Job group')
+        save_figure(fig, ax, report_path)
+
+def draw_job_heatmap(df_job_pivot, report_path):
+    import matplotlib
+    import seaborn as sns
+
+    with matplotlib.rc_context():
+        sns.set_theme()
+        fig, ax = new_figure()
+        sns.heatmap(df_job_pivot, annot=True, fmt='d', cmap='viridis', linecolor='white', linewidths=0.5, ax=ax)
+        ax.set_title('Job distribution heat map', fontsize=20)
+        ax.set_xlabel('Job group', fontsize=12)
+        ax.set_ylabel('City', fontsize=12)
+        save_figure(fig, ax, report_path)
+
+def draw_techtrend(df_techtrend, report_path):
+    import matplotlib
+    import seaborn as sns
+
+    with matplotlib.rc_context():
+        sns.set_theme()
+        fig, ax = new_figure()
+        sns.barplot(data=df_techtrend, x='tech', y='count', hue='tech', palette='viridis', legend=False, ax=ax)
+        ax.set_title('Technology trends', fontsize=20)
+        ax.set_xlabel('Technology', fontsize=12)
+        ax.set_ylabel('Number of job recruitments', fontsize=12)
+        save_figure(fig, ax, report_path)
+
 def plot_salary_distribution(df, convert_rate, report_path):
     try:
         report_path = f'{report_path}/salary_distribution.png'
 
         df_salary = convert_salary(df, convert_rate)
 
-        sns.set_theme()
-        plt.figure(figsize=(12, 8))
-        sns.boxplot(data=df_salary, x='job_group', y='converted_salary(mil VND)' , palette='viridis');
-        plt.xticks(rotation=45, ha='right')
-        plt.title('Salary distribution (million VND) by job group', fontsize=20)
-        plt.ylabel('Average salary (million VND)')
-        plt.xlabel('Job group')
-        plt.tight_layout()
-        plt.savefig(report_path)
+        draw_salary_distribution(df_salary, report_path)
     except Exception as e:
         print(f"Could not plot salary distribution: {e}")
 
@@ -62,48 +140,128 @@ def plot_job_heatmap(df, report_path):
         df_job = df[df['city'] != 'Toàn Quốc']
         df_job_pivot = pd.pivot_table(df_job, index='city', columns='job_group', aggfunc='size', fill_value=0)
 
-        plt.figure(figsize=(12, 8))
-        sns.heatmap(df_job_pivot, annot=True, fmt='d', cmap='viridis', linecolor='white', linewidths=0.5)
-        plt.title('Job distribution heat map', fontsize=20)
-        plt.xlabel('Job group', fontsize=12)
-        plt.ylabel('City', fontsize=12)
-        plt.xticks(rotation=45, ha='right')
-        plt.tight_layout()
-        plt.savefig(report_path)
+        draw_job_heatmap(df_job_pivot, report_path)
     except Exception as e:
         print(f"Could not plot job heatmap: {e}")
 
 
+def techtrend_counts(df):
+    # Number of postings mentioning each tech term in job_title (and job_description when df has it),
+    # all the terms are found in one pass over the text (see techterms.py)
+    _, df_techtrend = get_tech_term_matcher().extract(df)
+    return df_techtrend
+
 def plot_techtrend(df, report_path):
     try:
         report_path = f'{report_path}/techtrend.png'
 
-        # Declare current technology trends keyword
-        tech_keyword = ['BA', 'devops', 'data', '.net', 'python','java','react','aws','docker','node']
-        tech_keyword = [tech.lower() for tech in tech_keyword]
+        df_techtrend = techtrend_counts(df)
 
-        series_job = df['job_group']
+        draw_techtrend(df_techtrend, report_path)
+    except Exception as e:
+        print(f"Could not plot tech trends: {e}")
 
-        tech_counts = {}
+# The functions below compute the report data in PostgreSQL (see report_query.py) instead of SELECT * into pandas.
+# engine=None: use the shared engine of db_conn_uri (see db.get_engine)
 
-        for tech in tech_keyword:
-            pattern = re.escape(tech)
+def report_tasks_from_db(db_conn_uri, tgt_table, convert_rate, report_path, engine=None, aggregates=False):
+    # Query the data of every chart. Return a list of (chart name, draw function, data, output file)
+    # A chart whose query fails is skipped, the other charts are still drawn
+    # aggregates=True: read the aggregate tables maintained by the load (see aggregates.py)
+    if engine is None:
+        engine = get_engine(db_conn_uri)
 
-            mask = series_job.str.contains(pattern, case=False, regex=True, na=False)
+    queries = [
+        ('salary distribution', draw_salary_stats,
+         lambda: query_salary_stats(engine, tgt_table, convert_rate, aggregates=aggregates),
+         f'{report_path}/salary_distribution.png'),
+        ('job heatmap', draw_job_heatmap,
+         lambda: query_job_counts(engine, tgt_table, aggregates=aggregates),
+         f'{report_path}/job_heatmap.png'),
+        ('tech trends', draw_techtrend,
+         lambda: query_tech_term_counts(engine, tgt_table, get_tech_term_matcher(), aggregates=aggregates),
+         f'{report_path}/techtrend.png'),
+    ]
 
-            count = (mask[mask == True].count())
+    tasks = []
+    for name, draw, query, output_path in queries:
+        try:
+            tasks.append((name, draw, query(), output_path))
+        except Exception as e:
+            print(f"Could not plot {name}: {e}")
+    return tasks
 
-            tech_counts[tech] = count
+def report_fingerprint(name, data, params=None):
+    # Fingerprint of the input of a chart: its name, the parameters of the report (e.g. convert_rate)
+    # and the aggregated data (a few hundred rows at most: hashing it costs much less than drawing the chart)
+    digest = hashlib.sha256()
+    digest.update(json.dumps([name, params or {}], sort_keys=True, default=str).encode('utf-8'))
+    digest.update(json.dumps([str(column) for column in data.columns]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
 
-        # Create a tech trend dataframe based on technology keywords
-        df_techtrend = pd.DataFrame(tech_counts.items(), columns=['tech', 'count'])
+def fingerprint_path(report_path):
+    # The fingerprint is stored next to the chart: salary_distribution.png -> salary_distribution.png.fingerprint
+    return f'{report_path}.fingerprint'
 
-        plt.figure(figsize=(12, 8))
-        sns.barplot(data=df_techtrend, x='tech', y='count', palette='viridis')
-        plt.title('Technology trends', fontsize=20)
-        plt.xlabel('Technology', fontsize=12)
-        plt.ylabel('Number of job recruitments', fontsize=12)
-        plt.tight_layout()
-        plt.savefig(report_path)
-    except Exception as e:
-        print(f"Could not plot tech trends: {e}")
\ No newline at end of file
+def is_report_cached(report_path, fingerprint):
+    # The chart exists and was drawn from the same input
+    try:
+        with open(fingerprint_path(report_path), encoding='utf-8') as f:
+            return os.path.exists(report_path) and f.read().strip() == fingerprint
+    except OSError:
+        return False
+
+def save_fingerprint(report_path, fingerprint):
+    try:
+        with open(fingerprint_path(report_path), 'w', encoding='utf-8') as f:
+            f.write(fingerprint)
+    except OSError as e:
+        print(f"Could not save the fingerprint of {report_path}: {e}")
+
+def render_reports(tasks, parallel=True, max_workers=None, cache=False, force=False, params=None):
+    # Draw the charts of report_tasks_from_db(), at the same time in a process pool when parallel=True
+    # cache=True: skip the charts whose input did not change since they were drawn (see report_fingerprint),
+    #             params: parameters of the reports, part of the fingerprint (e.g. {'convert_rate': 25000})
+    # force=True: draw every chart, even if unchanged
+    # Return the names of the drawn charts
+    fingerprints = {}
+    if cache:
+        changed_tasks = []
+        for name, draw, data, report_path in tasks:
+            fingerprint = report_fingerprint(name, data, params)
+            if not force and is_report_cached(report_path, fingerprint):
+                print(f"{name}: unchanged, {report_path} kept")
+                continue
+            fingerprints[report_path] = fingerprint
+            changed_tasks.append((name, draw, data, report_path))
+        tasks = changed_tasks
+
+    drawn = []
+    if not tasks:
+        return drawn
+
+    if not parallel:
+        for name, draw, data, report_path in tasks:
+            try:
+                draw(data, report_path)
+                drawn.append(name)
+            except Exception as e:
+                print(f"Could not plot {name}: {e}")
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers or len(tasks)) as executor:
+            futures = {executor.submit(draw, data, report_path): name for name, draw, data, report_path in tasks}
+
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    future.result()
+                    drawn.append(futures[future])
+                except Exception as e:
+                    print(f"Could not plot {futures[future]}: {e}")
+
+    # Remember the input of the charts drawn (a failed chart is drawn again next time)
+    for name, draw, data, report_path in tasks:
+        if name in drawn and report_path in fingerprints:
+            save_fingerprint(report_path, fingerprints[report_path])
+
+    return drawn
@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from aggregates import agg_tables
+
+# Aggregations of the reports computed in PostgreSQL: only the small results are fetched into pandas,
+# whatever the size of the table
+# aggregates=True: read the aggregate tables maintained by the load (see aggregates.py) instead of the table
+
+def query_job_counts(engine, tgt_table, aggregates=False):
+    # Number of jobs per city and job group (without 'Toàn Quốc')
+    # Return a DataFrame city x job_group, like pd.pivot_table(..., aggfunc='size', fill_value=0)
+    if aggregates:
+        job_count, source = 'SUM(job_count)::bigint', agg_tables(tgt_table)['jobs']
+    else:
+        job_count, source = 'COUNT(*)', tgt_table
+
+    df = pd.read_sql(text(f'''
+        SELECT city, job_group, {job_count} AS job_count
+        FROM {source}
+        WHERE city <> 'Toàn Quốc' AND job_group IS NOT NULL
+        GROUP BY city, job_group'''), engine)
+
+    return df.pivot_table(index='city', columns='job_group', values='job_count', aggfunc='sum', fill_value=0)
+
+def query_salary_stats(engine, tgt_table, convert_rate, aggregates=False):
+    # Box plot statistics of the salary (million VND) per job group, same rules as report.convert_salary:
+    # USD converted with convert_rate, average of min/max (or the only one known), salaries >= 1000 removed
+    # Whiskers: furthest salaries within 1.5 IQR of the quartiles (same as matplotlib/seaborn boxplot)
+    if aggregates:
+        return query_salary_stats_from_histogram(engine, tgt_table, convert_rate)
+
+    return pd.read_sql(text(f'''
+        WITH converted AS (
+            SELECT job_group,
+                   CASE WHEN unit IN ('usd', 'USD') THEN min_salary::float8 * :convert_rate
+                        ELSE min_salary::float8 END AS min_salary,
+                   CASE WHEN unit IN ('usd', 'USD') THEN max_salary::float8 * :convert_rate
+                        ELSE max_salary::float8 END AS max_salary
+            FROM {tgt_table}
+            WHERE job_group IS NOT NULL
+        ),
+        salary AS (
+            SELECT job_group,
+                   COALESCE((min_salary + max_salary) / 2, min_salary, max_salary) / 1000000 AS salary
+            FROM converted
+        ),
+        filtered AS (
+            SELECT job_group, salary
+            FROM salary
+            WHERE salary < 1000
+        ),
+        quartiles AS (
+            SELECT job_group,
+                   COUNT(*) AS salary_count,
+                   AVG(salary) AS mean,
+                   percentile_cont(0.25) WITHIN GROUP (ORDER BY salary) AS q1,
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY salary) AS med,
+                   percentile_cont(0.75) WITHIN GROUP (ORDER BY salary) AS q3
+            FROM filtered
+            GROUP BY job_group
+        )
+        SELECT q.job_group, q.salary_count, q.mean, q.q1, q.med, q.q3,
+               MIN(f.salary) FILTER (WHERE f.salary >= q.q1 - 1.5 * (q.q3 - q.q1)) AS whislo,
+               MAX(f.salary) FILTER (WHERE f.salary <= q.q3 + 1.5 * (q.q3 - q.q1)) AS whishi,
+               COUNT(*) FILTER (WHERE f.salary < q.q1 - 1.5 * (q.q3 - q.q1)
+                                   OR f.salary > q.q3 + 1.5 * (q.q3 - q.q1)) AS flier_count
+        FROM quartiles AS q
+        JOIN filtered AS f ON f.job_group = q.job_group
+        GROUP BY q.job_group, q.salary_count, q.mean, q.q1, q.med, q.q3
+        ORDER BY q.job_group'''), engine, params={'convert_rate': convert_rate})
+
+def salary_histogram(engine, tgt_table, convert_rate):
+    # Number of jobs per job group and salary (million VND, same conversion as query_salary_stats)
+    return pd.read_sql(text(f'''
+        WITH converted AS (
+            SELECT job_group, job_count,
+                   CASE WHEN is_usd THEN min_salary::float8 * :convert_rate ELSE min_salary::float8 END AS min_salary,
+                   CASE WHEN is_usd THEN max_salary::float8 * :convert_rate ELSE max_salary::float8 END AS max_salary
+            FROM {agg_tables(tgt_table)['salary']}
+        ),
+        salary AS (
+            SELECT job_group, job_count,
+                   COALESCE((min_salary + max_salary) / 2, min_salary, max_salary) / 1000000 AS salary
+            FROM converted
+        )
+        SELECT job_group, salary, SUM(job_count)::bigint AS job_count
+        FROM salary
+        WHERE salary < 1000
+        GROUP BY job_group, salary
+        ORDER BY job_group, salary'''), engine, params={'convert_rate': convert_rate})
+
+def weighted_percentile(values, cumulative_counts, p):
+    # percentile_cont(p) of the sorted values repeated by their counts (cumulative_counts = cumsum of the counts)
+    position = p * (cumulative_counts[-1] - 1)
+    lower = int(np.floor(position))
+
+    # Value at the 0-based position k: first value whose cumulative count is greater than k
+    value_lower = values[np.searchsorted(cumulative_counts, lower, side='right')]
+    if position == lower:
+        return value_lower
+    value_upper = values[np.searchsorted(cumulative_counts, lower + 1, side='right')]
+    return value_lower + (position - lower) * (value_upper - value_lower)
+
+def query_salary_stats_from_histogram(engine, tgt_table, convert_rate):
+    # Same statistics as query_salary_stats, computed from the salary histogram of the aggregate table
+    histogram = salary_histogram(engine, tgt_table, convert_rate)
+
+    stats = []
+    for job_group, group in histogram.groupby('job_group', sort=True):
+        values = group['salary'].to_numpy()
+        counts = group['job_count'].to_numpy()
+        cumulative_counts = np.cumsum(counts)
+
+        q1, med, q3 = (weighted_percentile(values, cumulative_counts, p) for p in [0.25, 0.5, 0.75])
+        low, high = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+        inside = (values >= low) & (values <= high)
+
+        stats.append({'job_group': job_group, 'salary_count': int(cumulative_counts[-1]),
+                      'mean': float((values * counts).sum() / cumulative_counts[-1]),
+                      'q1': q1, 'med': med, 'q3': q3,
+                      'whislo': values[values >= low].min(), 'whishi': values[values <= high].max(),
+                      'flier_count': int(counts[~inside].sum())})
+
+    return pd.DataFrame(stats, columns=['job_group', 'salary_count', 'mean', 'q1', 'med', 'q3', 'whislo', 'whishi',
+                                        'flier_count'])
+
+def query_title_counts(engine, tgt_table, aggregates=False):
+    # Number of jobs per job title (far fewer distinct titles than jobs)
+    if aggregates:
+        job_count, source = 'SUM(job_count)::bigint', agg_tables(tgt_table)['titles']
+    else:
+        job_count, source = 'COUNT(*)', tgt_table
+
+    return pd.read_sql(text(f'''
+        SELECT job_title, {job_count} AS job_count
+        FROM {source}
+        GROUP BY job_title'''), engine)
+
+def query_tech_term_counts(engine, tgt_table, matcher, aggregates=False):
+    # Number of jobs whose title mentions each term of matcher (see techterms.TechTermMatcher),
+    # each distinct title is scanned once. Return a DataFrame with columns 'tech', 'count'
+    titles = query_title_counts(engine, tgt_table, aggregates=aggregates)
+    return matcher.term_counts(matcher.match_series(titles['job_title']), titles['job_count'].to_numpy())
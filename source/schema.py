@@ -0,0 +1,58 @@
+import pandas as pd
+
+# Typed schema of the job DataFrames, from extract to load:
+# - created_date parsed while reading (datetime64)
+# - low-cardinality columns (a few hundred distinct values for thousands of rows) as categoricals:
+#   one small integer code per row instead of one Python string object
+# - large free-text columns as Arrow-backed strings (one contiguous buffer instead of Python objects)
+# The values are unchanged: the load writes the same rows into PostgreSQL
+
+def text_dtype():
+    # Arrow-backed strings when pyarrow is installed, else pandas strings
+    try:
+        import pyarrow
+        return pd.StringDtype('pyarrow')
+    except ImportError:
+        return pd.StringDtype('python')
+
+# Columns of the extracted files (created_date is parsed with parse_dates)
+source_dtypes = {
+    'job_title': 'text',
+    'company': 'category',
+    'salary': 'category',
+    'address': 'category',
+    'time': 'category',
+    'link_description': 'text',
+    'job_description': 'text',
+}
+
+# Columns added by transform.cleaning_data
+derived_dtypes = {
+    'min_salary': 'float64',
+    'max_salary': 'float64',
+    'unit': 'category',
+    'city': 'category',
+    'district': 'category',
+    'job_group': 'category',
+}
+
+def resolve_dtype(dtype):
+    return text_dtype() if dtype == 'text' else dtype
+
+def read_dtypes(columns=None):
+    # dtype argument of pd.read_csv for the source columns (only those in columns when given)
+    return {column: resolve_dtype(dtype) for column, dtype in source_dtypes.items()
+            if columns is None or column in columns}
+
+def apply_schema(df, columns=None):
+    # Convert the columns of df (all those of the schema, or only columns) to their schema dtype, in place
+    schema = {**source_dtypes, **derived_dtypes}
+
+    for column in columns or schema:
+        if column in df.columns and column in schema:
+            df[column] = df[column].astype(resolve_dtype(schema[column]))
+
+    if 'created_date' in df.columns and (columns is None or 'created_date' in columns):
+        df['created_date'] = pd.to_datetime(df['created_date'])
+
+    return df
@@ -0,0 +1,127 @@
+import os
+import sys
+import pandas as pd
+from schema import read_dtypes, apply_schema, text_dtype
+
+# Staging files of DATA_PATH: CSV (data.csv, dataTopCV.csv) or Parquet datasets (directories *.parquet)
+# Parquet keeps the types (created_date is a date, no pd.to_datetime at each run), is compressed,
+# and is partitioned by created_date (one directory created_date=YYYY-MM-DD per day):
+# a run reads only the days and the columns it needs. pyarrow is only needed for Parquet
+
+# Columns of the jobs loaded into JobList (dataTopCV also has job_description)
+job_columns = ['created_date', 'job_title', 'company', 'salary', 'address', 'time', 'link_description']
+
+def is_parquet(path):
+    return path.endswith('.parquet') or os.path.isdir(path)
+
+def created_date_partitioning():
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    return ds.partitioning(pa.schema([('created_date', pa.date32())]), flavor='hive')
+
+def write_parquet(df, path, compression='zstd'):
+    # Write df as a Parquet dataset partitioned by created_date.
+    # The days of df replace the same days already in the dataset, the other days are kept
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    df = df.copy()
+    df['created_date'] = pd.to_datetime(df['created_date']).dt.date
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    ds.write_dataset(table, path, format='parquet', partitioning=created_date_partitioning(),
+                     existing_data_behavior='delete_matching',
+                     file_options=ds.ParquetFileFormat().make_write_options(compression=compression))
+
+def parquet_filter(start_date=None, end_date=None):
+    # Filter on the partition column: the other days are not read at all
+    import pyarrow.dataset as ds
+
+    condition = None
+    for date, is_start in [(start_date, True), (end_date, False)]:
+        if date is None:
+            continue
+
+        date = pd.Timestamp(date).date()
+        term = ds.field('created_date') >= date if is_start else ds.field('created_date') <= date
+        condition = term if condition is None else condition & term
+
+    return condition
+
+def to_frame(table, typed=False):
+    # created_date as datetime64, like pd.to_datetime on the CSV
+    # typed=True: dtypes of schema.py, strings converted by Arrow directly (no Python string objects)
+    import pyarrow as pa
+
+    types_mapper = {pa.string(): text_dtype(), pa.large_string(): text_dtype()}.get if typed else None
+    df = table.to_pandas(date_as_object=False, types_mapper=types_mapper)
+    if 'created_date' in df.columns:
+        df['created_date'] = df['created_date'].astype('datetime64[ns]')
+    if typed:
+        apply_schema(df)
+    return df
+
+def filter_dates(df, start_date=None, end_date=None):
+    df['created_date'] = pd.to_datetime(df['created_date'])
+
+    if start_date is not None:
+        df = df[df['created_date'] >= pd.Timestamp(start_date)].copy()
+    if end_date is not None:
+        df = df[df['created_date'] <= pd.Timestamp(end_date)].copy()
+
+    return df
+
+def read_csv_options(columns, typed):
+    # typed=True: dtypes of schema.py given to the CSV parser, created_date parsed while reading
+    if typed:
+        return {'dtype': read_dtypes(columns), 'parse_dates': ['created_date']}
+    return {}
+
+def read_staging(path, columns=None, start_date=None, end_date=None, typed=False):
+    # Read a staging file (CSV or Parquet dataset) into a DataFrame with created_date as datetime64
+    # columns: columns to read (None = all), start_date/end_date: only the jobs created between these days
+    # typed=True: categoricals and Arrow strings of schema.py instead of Python strings
+    if is_parquet(path):
+        import pyarrow.dataset as ds
+
+        dataset = ds.dataset(path, format='parquet', partitioning=created_date_partitioning())
+        if columns is None:
+            # The partition column is stored in the directory names: put it back in front
+            columns = ['created_date'] + [name for name in dataset.schema.names if name != 'created_date']
+
+        return to_frame(dataset.to_table(columns=columns, filter=parquet_filter(start_date, end_date)), typed)
+
+    df = pd.read_csv(path, delimiter=',', usecols=columns, **read_csv_options(columns, typed))
+    if columns is not None:
+        # Same column order as requested (usecols keeps the order of the file)
+        df = df[columns]
+    return filter_dates(df, start_date, end_date)
+
+def iter_staging(path, chunksize, columns=None, start_date=None, end_date=None, typed=False):
+    # Same as read_staging, chunksize rows at a time
+    if is_parquet(path):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        dataset = ds.dataset(path, format='parquet', partitioning=created_date_partitioning())
+        if columns is None:
+            columns = ['created_date'] + [name for name in dataset.schema.names if name != 'created_date']
+
+        for batch in dataset.to_batches(columns=columns, filter=parquet_filter(start_date, end_date),
+                                        batch_size=chunksize):
+            if batch.num_rows:
+                yield to_frame(pa.Table.from_batches([batch]), typed)
+        return
+
+    for df in pd.read_csv(path, delimiter=',', usecols=columns, chunksize=chunksize, **read_csv_options(columns, typed)):
+        if columns is not None:
+            df = df[columns]
+        yield filter_dates(df, start_date, end_date)
+
+if __name__ == '__main__':
+    # Convert a CSV staging file to a Parquet dataset
+    # Usage: python source/staging.py data/data.csv data/data.parquet
+    csv_path, parquet_path = sys.argv[1], sys.argv[2]
+    write_parquet(pd.read_csv(csv_path), parquet_path)
+    print(f"{csv_path} -> {parquet_path}")
@@ -0,0 +1,103 @@
+import re
+import numpy as np
+import pandas as pd
+from transform import keyword_trie_regex
+
+# Tech terms mentioned by the postings, found in job_title and job_description in one pass:
+# all the terms (and their aliases) are compiled into one trie-shaped regex (see transform.keyword_trie_regex),
+# so the cost per posting grows with the length of its text, not with the number of terms.
+# A term only matches as a whole word: 'java' is not found in 'javascript', 'ba' not in 'bank'
+
+# Term of the tech trend report -> its aliases (lower case)
+default_tech_terms = {
+    'ba': ['ba', 'business analyst'],
+    'devops': ['devops'],
+    'data': ['data'],
+    '.net': ['.net', 'asp.net', 'dotnet'],
+    'python': ['python'],
+    'java': ['java'],
+    'react': ['react', 'reactjs', 'react.js'],
+    'aws': ['aws', 'amazon web services'],
+    'docker': ['docker'],
+    'node': ['node', 'nodejs', 'node.js'],
+}
+
+def load_tech_terms(path):
+    # Read a term list file, one term per line: 'term' or 'term: alias, alias' (# starts a comment)
+    terms = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#')[0].strip()
+            if not line:
+                continue
+            term, _, aliases = line.partition(':')
+            term = term.strip().lower()
+            terms[term] = [term] + [alias.strip().lower() for alias in aliases.split(',') if alias.strip()]
+    return terms
+
+class TechTermMatcher:
+    # terms: list of terms, or dict term -> aliases
+    def __init__(self, terms):
+        if not isinstance(terms, dict):
+            terms = {term.lower(): [term.lower()] for term in terms}
+        self.terms = list(terms)
+
+        # Alias -> term (an alias shared by 2 terms goes to the first one)
+        self.alias_term = {}
+        for term, aliases in terms.items():
+            for alias in aliases:
+                self.alias_term.setdefault(alias.lower(), term)
+
+        # Word boundaries: no letter or digit just before or after the alias.
+        # The trie returns the longest alias at a position, and backtracks to a shorter one at a word boundary
+        self.pattern = re.compile(r'(?<!\w)(' + keyword_trie_regex(self.alias_term) + r')(?!\w)')
+
+    def find_terms(self, text):
+        # Set of the terms in a text
+        if not isinstance(text, str):
+            return frozenset()
+        return frozenset(self.alias_term[match.group(1)] for match in self.pattern.finditer(text.lower()))
+
+    def match_series(self, text_series):
+        # Term set of each text of a Series. Each distinct text is scanned once (titles repeat a lot)
+        codes, uniques = pd.factorize(text_series)
+
+        # Missing values get code -1, which takes the empty set appended at the end
+        term_sets = np.empty(len(uniques) + 1, dtype=object)
+        term_sets[:] = [self.find_terms(text) for text in uniques] + [frozenset()]
+        return pd.Series(term_sets[codes], index=text_series.index)
+
+    def term_counts(self, term_sets, weights=None):
+        # Number of postings mentioning each term (weights: number of postings of each term set)
+        # Return a DataFrame with columns 'tech', 'count', in the order of the terms
+        counts = dict.fromkeys(self.terms, 0)
+        if weights is None:
+            weights = np.ones(len(term_sets), dtype=np.int64)
+        for term_set, weight in zip(term_sets, weights):
+            for term in term_set:
+                counts[term] += int(weight)
+        return pd.DataFrame({'tech': self.terms, 'count': list(counts.values())})
+
+    def extract(self, df, columns=('job_title', 'job_description')):
+        # Term sets of the postings of df (the columns present are scanned together) and the count of each term
+        # Return (Series of frozensets with the index of df, DataFrame 'tech', 'count')
+        columns = [column for column in columns if column in df.columns]
+        text = df[columns[0]].astype(object).fillna('')
+        for column in columns[1:]:
+            text = text + '\n' + df[column].astype(object).fillna('')
+
+        term_sets = self.match_series(text)
+        return term_sets, self.term_counts(term_sets)
+
+tech_term_matcher = TechTermMatcher(default_tech_terms)
+
+def configure_tech_terms(terms):
+    # Use another term list (list, dict term -> aliases, or path of a term list file) for the tech trend report
+    global tech_term_matcher
+    if isinstance(terms, str):
+        terms = load_tech_terms(terms)
+    tech_term_matcher = TechTermMatcher(terms)
+    return tech_term_matcher
+
+def get_tech_term_matcher():
+    return tech_term_matcher
@@ -1,4 +1,23 @@
 import re
+import os
+import concurrent.futures
+from functools import lru_cache
+from itertools import repeat
+import numpy as np
+import pandas as pd
+from schema import apply_schema
+
+# Multiplier applied for each money word found in the salary string
+currency_multiply = {
+    'tỷ': 1000000000,
+    'triệu': 1000000,
+    'nghìn': 1000,
+    'ngàn': 1000
+}
+
+# Regular salary forms handled by the columnar parser, after removing every character except digits, '-', '.', ','
+salary_range_pattern = r'^(\d+(?:[.,]\d+)?)-(\d+(?:[.,]\d+)?)$'
+salary_single_pattern = r'^\d+(?:[.,]\d+)?$'
 
 def add_salary(salary_str):
     # Check salary_str passed in as str
@@ -18,13 +37,6 @@ def add_salary(salary_str):
     else:
         unit = 'VND'
 
-    currency_multiply = {
-        'tỷ': 1000000000,
-        'triệu': 1000000,
-        'nghìn': 1000,
-        'ngàn': 1000
-    }
-
     multiplier = 1
 
     for key, value in currency_multiply.items():
@@ -57,6 +69,70 @@ def add_salary(salary_str):
             min_salary = salary
     return min_salary, max_salary, unit
 
+def add_salary_series(salary_series):
+    # Columnar version of add_salary(): parse a whole salary Series in one pass
+    # Return a DataFrame with 'min_salary', 'max_salary', 'unit' (same index as salary_series)
+
+    # Salary strings repeat a lot: parse each distinct value once, then broadcast with the factorized codes.
+    # Missing values get code -1, which takes the extra None appended at the end
+    codes, uniques = pd.factorize(salary_series)
+    salary = pd.Series(list(uniques) + [None], dtype=object)
+    n = len(salary)
+
+    salary_str = salary.str.lower().str.strip()
+
+    # Non-string values become NaN with the .str accessor
+    is_str = salary_str.notna().to_numpy()
+    salary_str = salary_str.fillna('')
+
+    # Standardize and process "Thoả thuận"
+    is_agreement = salary_str.str.contains('thoả thuận', regex=False).to_numpy()
+
+    unit = np.where(salary_str.str.contains('usd', regex=False).to_numpy(), 'USD', 'VND').astype(object)
+
+    # The last money word in currency_multiply found in the string wins (same as add_salary)
+    multiplier = np.ones(n)
+    for key, value in currency_multiply.items():
+        multiplier[salary_str.str.contains(key, regex=False).to_numpy()] = value
+
+    cleaned_salary_str = salary_str.str.replace(r'[^\d\-.,]', '', regex=True).str.strip()
+
+    has_digit = cleaned_salary_str.str.contains(r'\d', regex=True).to_numpy()
+    range_parts = cleaned_salary_str.str.extract(salary_range_pattern)
+    is_range = range_parts[0].notna().to_numpy()
+    is_single = cleaned_salary_str.str.match(salary_single_pattern).to_numpy()
+
+    min_salary = np.full(n, np.nan)
+    max_salary = np.full(n, np.nan)
+
+    # Standardize and process "X - Y"
+    range_min = range_parts[0].str.replace(',', '', regex=False).astype(float).to_numpy()
+    range_max = range_parts[1].str.replace(',', '', regex=False).astype(float).to_numpy()
+    min_salary = np.where(is_range, range_min * multiplier, min_salary)
+    max_salary = np.where(is_range, range_max * multiplier, max_salary)
+
+    # Standardize and process "Tới X" or "Trên X"
+    single_value = cleaned_salary_str.where(is_single).str.replace(',', '', regex=False).astype(float).to_numpy() * multiplier
+    is_to = salary_str.str.contains('tới', regex=False).to_numpy()
+    is_from = salary_str.str.contains('trên', regex=False).to_numpy() & ~is_to
+    min_salary = np.where(is_single & ~is_to, single_value, min_salary)
+    max_salary = np.where(is_single & ~is_from, single_value, max_salary)
+
+    # Non-string values and "Thoả thuận" have neither salary nor unit
+    unit[~is_str | is_agreement] = None
+    min_salary[~is_str | is_agreement] = np.nan
+    max_salary[~is_str | is_agreement] = np.nan
+
+    # Irregular strings (e.g. '10-20-30 triệu', '1,000,000 VND') fall back to add_salary row by row
+    is_irregular = is_str & ~is_agreement & has_digit & ~is_range & ~is_single
+    for i in np.flatnonzero(is_irregular):
+        min_value, max_value, unit[i] = add_salary(salary.iat[i])
+        min_salary[i] = np.nan if min_value is None else min_value
+        max_salary[i] = np.nan if max_value is None else max_value
+
+    return pd.DataFrame({'min_salary': min_salary[codes], 'max_salary': max_salary[codes], 'unit': unit[codes]},
+                        index=salary_series.index)
+
 def split_address(address_str):
     # Check address_str passed in as str
     if not isinstance(address_str, str):
@@ -73,63 +149,223 @@ def split_address(address_str):
         district = None
     return city, district
 
+# Define job groups
+# The order is the priority: a title matching keywords of several groups goes to the first group
+job_group_keyword = {
+    'Intern': ['thực tập sinh', 'intern'],
+    'Project Management': ['project manager', 'quản lý dự án', 'scrum master'],
+    'Product Management': ['product owner'],
+    'Tech Lead': ['tech lead', 'trưởng nhóm', 'trưởng bộ phận'],
+    'Business Analyst': ['business analyst', 'ba'],
+    'Tester': ['qa', 'tester'],
+    'IT Support': ['it support', 'helpdesk', 'triển khai phần mềm', 'cộng tác viên it'],
+    'System': ['system admin', 'infra'],
+    'DevOps': ['devops', 'sre'],
+    'Data': ['ai engineer', 'business intelligence', 'bi', 'big data'],
+    'Fullstack Developer': ['full-stack'],
+    'Frontend Developer': ['front end', 'angularjs', 'vuejs', 'web designer', 'html/css'],
+    'Backend Developer': ['backend'],
+    'Mobile Developer': ['mobile'],
+    '.NET Developer': ['.net'],
+    'Java Developer': ['java'],
+    'Embedded Developer': ['embedded'],
+    'Software Engineer': ['developer', 'lập trình', 'engineer', 'phần mềm', 'web'],
+    'Business Development': ['business development'],
+    'Marketing': ['marketing'],
+    'Admin': ['secretary', 'thư ký'],
+}
+
+def keyword_trie_regex(keywords):
+    # Build a regex matching any of the keywords, shaped as a trie ('b(?:a|i(?:g data)?)' for 'ba', 'bi', 'big data')
+    # At each position the regex only follows the branch of the next character, and returns the longest keyword
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def to_regex(node):
+        branches = [re.escape(char) + to_regex(child) for char, child in sorted(node.items()) if char != '']
+        if not branches:
+            return ''
+
+        regex = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # A keyword ends here: the rest is optional
+        if '' in node:
+            regex = '(?:' + regex + ')?'
+        return regex
+
+    return to_regex(trie)
+
+class JobTitleClassifier:
+    # Classify job titles into job groups with one precompiled regex
+    # Built once, the cost per title grows with the title length, not with the number of keywords
+    def __init__(self, job_group, default_group='Other'):
+        self.default_group = default_group
+        self.groups = list(job_group.keys())
+
+        # Priority of a keyword = index of the first group containing it
+        keyword_priority = {}
+        for priority, keywords in enumerate(job_group.values()):
+            for keyword in keywords:
+                keyword_priority.setdefault(keyword, priority)
+
+        # The regex returns the longest keyword at a position, but all its prefixes which are keywords
+        # (e.g. 'bi' for 'big data') match there too -> keep the best priority of the keyword and its prefixes
+        self.keyword_priority = {}
+        for keyword in keyword_priority:
+            self.keyword_priority[keyword] = min(priority for prefix, priority in keyword_priority.items()
+                                                 if keyword.startswith(prefix))
+
+        # The lookahead makes the regex try every position of the title, so overlapping keywords are not missed
+        self.pattern = re.compile('(?=(' + keyword_trie_regex(keyword_priority) + '))')
+
+    def classify(self, job_title_str):
+        job_title_str = job_title_str.lower().strip()
+
+        best_priority = None
+        for match in self.pattern.finditer(job_title_str):
+            priority = self.keyword_priority[match.group(1)]
+            if best_priority is None or priority < best_priority:
+                best_priority = priority
+
+        if best_priority is None:
+            return self.default_group
+        return self.groups[best_priority]
+
+    def classify_series(self, job_title_series):
+        # Batch version of classify() for a whole job_title Series. Non-string titles go to the default group
+        # Each distinct title is classified once, then broadcast with the factorized codes
+        codes, uniques = pd.factorize(job_title_series)
+
+        # Missing values get code -1, which takes the default group appended at the end
+        group_list = [self.classify(x) if isinstance(x, str) else self.default_group for x in uniques]
+        group_list.append(self.default_group)
+
+        return pd.Series(np.array(group_list, dtype=object)[codes], index=job_title_series.index)
+
+job_title_classifier = JobTitleClassifier(job_group_keyword)
+
 def group_job_tile(job_title_str):
-    # Define job groups
-    job_group = {
-        'Intern': ['thực tập sinh', 'intern'],
-        'Project Management': ['project manager', 'quản lý dự án', 'scrum master'],
-        'Product Management': ['product owner'],
-        'Tech Lead': ['tech lead', 'trưởng nhóm', 'trưởng bộ phận'],
-        'Business Analyst': ['business analyst', 'ba'],
-        'Tester': ['qa', 'tester'],
-        'IT Support': ['it support', 'helpdesk', 'triển khai phần mềm', 'cộng tác viên it'],
-        'System': ['system admin', 'infra'],
-        'DevOps': ['devops', 'sre'],
-        'Data': ['ai engineer', 'business intelligence', 'bi', 'big data'],
-        'Fullstack Developer': ['full-stack'],
-        'Frontend Developer': ['front end', 'angularjs', 'vuejs', 'web designer', 'html/css'],
-        'Backend Developer': ['backend'],
-        'Mobile Developer': ['mobile'],
-        '.NET Developer': ['.net'],
-        'Java Developer': ['java'],
-        'Embedded Developer': ['embedded'],
-        'Software Engineer': ['developer', 'lập trình', 'engineer', 'phần mềm', 'web'],
-        'Business Development': ['business development'],
-        'Marketing': ['marketing'],
-        'Admin': ['secretary', 'thư ký'],
-    }
-    job_title_str = job_title_str.lower().strip()
-
-    for key in job_group.keys():
-        for value in job_group[key]:
-            if value in job_title_str:
-                return key
-
-    return 'Other'
-
-def cleaning_data(df):
+    # Missing (non-string) titles go to the default group, as in group_job_tile_series
+    if not isinstance(job_title_str, str):
+        return job_title_classifier.default_group
+    return job_title_classifier.classify(job_title_str)
+
+def group_job_tile_series(job_title_series):
+    return job_title_classifier.classify_series(job_title_series)
+
+# Max number of distinct values remembered by each cache of the memoize mode.
+# The caches live for the whole process, so they are reused by every chunk and every ETL run in the process
+memo_cache_size = 65536
+
+def configure_memo_cache(maxsize):
+    # Create new (empty) caches for the memoize mode with the given size
+    global memo_cache_size, add_salary_cached, split_address_cached, group_job_tile_cached
+    memo_cache_size = maxsize
+    add_salary_cached = lru_cache(maxsize=maxsize)(add_salary)
+    split_address_cached = lru_cache(maxsize=maxsize)(split_address)
+    group_job_tile_cached = lru_cache(maxsize=maxsize)(group_job_tile)
+
+def clear_memo_cache():
+    add_salary_cached.cache_clear()
+    split_address_cached.cache_clear()
+    group_job_tile_cached.cache_clear()
+
+configure_memo_cache(memo_cache_size)
+
+def broadcast_unique(series, func, columns=None):
+    # Run func once per distinct value of series, then map the results back to every row via the factorized codes
+    # Return a Series (columns=None) or a DataFrame with the given columns (func returns a tuple)
+    codes, uniques = pd.factorize(series)
+    results = [func(value) for value in uniques]
+
+    # Missing values get code -1, which takes the last result: the result of the missing value
+    is_missing = codes == -1
+    if is_missing.any():
+        results.append(func(series[is_missing].iloc[0]))
+
+    if columns is None:
+        return pd.Series(pd.Series(results, dtype=object).take(codes).to_numpy(), index=series.index)
+
+    result = pd.DataFrame(results, columns=columns).take(codes)
+    result.index = series.index
+    return result
+
+# Columns read and columns added by cleaning_data
+source_columns = ['salary', 'address', 'job_title']
+derived_columns = ['min_salary', 'max_salary', 'unit', 'city', 'district', 'job_group']
+
+def derive_partition(part, memoize, typed):
+    # Worker of the parallel mode: the derived columns of one partition (runs in a worker process)
+    cleaning_data(part, memoize=memoize, typed=typed)
+    return part[derived_columns]
+
+def cleaning_data_parallel(df, memoize=False, typed=False, workers=None, partition_size=100000, executor=None):
+    # Split the rows into partitions of partition_size rows, derive their columns in a process pool
+    # and put the results back in the original row order (executor.map keeps the order of the partitions):
+    # same result as the serial cleaning_data
+    # Only the source columns are sent to the workers, only the derived columns come back
+    source = df[source_columns]
+    parts = [source.iloc[start:start + partition_size] for start in range(0, len(df), partition_size)]
+
+    if executor is None:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(derive_partition, parts, repeat(memoize), repeat(typed)))
+    else:
+        results = list(executor.map(derive_partition, parts, repeat(memoize), repeat(typed)))
+
+    derived = pd.concat(results)
+    for column in derived_columns:
+        df[column] = derived[column].to_numpy()
+
+    # The categories of each partition only have its own values: build the categories of the whole column
+    if typed:
+        apply_schema(df, derived_columns)
+
+def cleaning_data(df, memoize=False, typed=False, workers=1, partition_size=100000, executor=None):
+    # memoize=True: add_salary, split_address and group_job_tile run once per distinct value (with an LRU cache)
+    # instead of once per row. Faster when the data has a lot of repeated salary/address/job_title values
+    # typed=True: the new columns get the dtypes of schema.derived_dtypes (categoricals instead of Python strings)
+    # workers > 1 (None: one per CPU): parallel mode, partitions of partition_size rows transformed in a process pool
+    # (see cleaning_data_parallel). executor: pool to reuse between calls (e.g. one pool for all the chunks)
+    if workers != 1 and len(df) > partition_size:
+        cleaning_data_parallel(df, memoize=memoize, typed=typed, workers=workers or os.cpu_count(),
+                               partition_size=partition_size, executor=executor)
+        return
+
     # 1. Chuẩn hóa cột salary về dạng số, xử lý các giá trị như "Thoả thuận", "Trên X triệu", "X - Y triệu", "Tới X triệu"
     # 2. Tạo thêm các cột phụ: min_salary, max_salary, salary_unit (VND/USD)
-    salary_list = []
-
-    for salary_str in df['salary']:
-        result = add_salary(salary_str)
-        salary_list.append(result)
+    if memoize:
+        salary = broadcast_unique(df['salary'], add_salary_cached, ['min_salary', 'max_salary', 'unit'])
+    else:
+        salary = add_salary_series(df['salary'])
 
-    df[['min_salary', 'max_salary', 'unit']] = salary_list
+    df[['min_salary', 'max_salary', 'unit']] = salary
+    if typed:
+        apply_schema(df, ['min_salary', 'max_salary', 'unit'])
 
     # 3. Xử lý cột address để tách thành city và district
-    address_list = []
-    for address_str in df['address']:
-        result = split_address(address_str)
-        address_list.append(result)
+    if memoize:
+        address_list = broadcast_unique(df['address'], split_address_cached, ['city', 'district'])
+    elif typed:
+        # Categorical address: split each category once
+        address_list = broadcast_unique(df['address'], split_address, ['city', 'district'])
+    else:
+        address_list = []
+        for address_str in df['address']:
+            result = split_address(address_str)
+            address_list.append(result)
 
     df[['city', 'district']] = address_list
+    if typed:
+        apply_schema(df, ['city', 'district'])
 
     # 4. Chuẩn hóa job_title để gom nhóm các vị trí tương tự (ví dụ: "Software Engineer", "Developer", "Programmer" có thể gom vào một nhóm)
-    job_group_list = []
-    for job_group_str in df['job_title']:
-        result = group_job_tile(job_group_str)
-        job_group_list.append(result)
-
-    df['job_group'] = job_group_list
+    if memoize:
+        df['job_group'] = broadcast_unique(df['job_title'], group_job_tile_cached)
+    else:
+        df['job_group'] = group_job_tile_series(df['job_title'])
+    if typed:
+        apply_schema(df, ['job_group'])
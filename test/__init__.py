@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules in source/ import each other by module name (as when main.py is run as a script)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'source'))
@@ -0,0 +1,115 @@
+import unittest
+import os
+import re
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest import mock
+from source.crawl_async import data_scrapping_async
+from source.http_client import HttpClient
+from source.data_scrapping_TopCV import data_scrapping
+from pandas.testing import assert_frame_equal
+
+# Get current file directory
+current_dir = os.path.dirname(__file__)
+
+# Saved TopCV pages (links use __BASE__ in place of https://www.topcv.vn)
+fixture_dir = os.path.join(current_dir, 'fixtures', 'topcv')
+
+class TopCVHandler(BaseHTTPRequestHandler):
+    # Local stand-in for TopCV serving the saved pages
+    def do_GET(self):
+        page = re.search(r'[?&]page=(\d+)', self.path)
+        detail = re.search(r'/viec-lam/[^/]+/(\d+)\.html', self.path)
+
+        # Detail pages answering 429 once (Retry-After: 0)
+        # (servers of the other test modules reusing this handler have no throttled set)
+        if detail and detail[1] in getattr(self.server, 'throttled', ()):
+            self.server.throttled.discard(detail[1])
+            self.send_response(429)
+            self.send_header('Retry-After', '0')
+            self.end_headers()
+            return
+
+        if page:
+            file_name = f'listing_{page[1]}.html'
+            if not os.path.exists(os.path.join(fixture_dir, file_name)):
+                file_name = 'listing_empty.html'
+        elif detail:
+            file_name = f'detail_{detail[1]}.html'
+        else:
+            file_name = None
+
+        if file_name is None or not os.path.exists(os.path.join(fixture_dir, file_name)):
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        with open(os.path.join(fixture_dir, file_name), encoding='utf-8') as f:
+            body = f.read().replace('__BASE__', self.server.base).encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class TestCrawlAsync(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), TopCVHandler)
+        cls.server.base = f'http://127.0.0.1:{cls.server.server_port}'
+        cls.server.throttled = set()
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+        cls.base_url = cls.server.base + '/tim-viec-lam-moi-nhat?type_keyword=1&page={}&sba=1'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_crawl_async(self):
+        # Test the jobs of the listing pages with their details, until the first empty page
+        df = data_scrapping_async(base_url=self.base_url, pages=range(1, 5))
+
+        self.assertEqual(list(df.columns), ['created_date', 'job_title', 'company', 'salary', 'address',
+                                            'link_description', 'time', 'job_description'])
+        # 3 jobs on page 1, 3 jobs on page 2 but 1 already on page 1, page 3 is empty
+        self.assertEqual(len(df), 5)
+        self.assertEqual(df.loc[1, 'address'], 'Hồ Chí Minh: Quận 1')
+        self.assertEqual(df.loc[2, 'address'], 'Hà Nội:Đà Nẵng')
+        self.assertEqual(df.loc[0, 'link_description'],
+                         self.server.base + '/viec-lam/business-analyst/1080379.html?ta_source=JobSearchList_LinkDetail')
+        self.assertEqual(df.loc[0, 'time'], 'Hạn nộp hồ sơ: Còn 25 ngày để ứng tuyển')
+        self.assertTrue(df.loc[4, 'job_description'].startswith('Phát triển giao diện ReactJS'))
+
+    def test_crawl_async_same_as_data_scrapping(self):
+        # Test the async engine gives the same DataFrame as data_scrapping (without its waiting time)
+        with mock.patch('time.sleep'):
+            expected = data_scrapping(base_url=self.base_url)
+
+        result = data_scrapping_async(base_url=self.base_url, pages=range(1, 5))
+
+        assert_frame_equal(result, expected)
+        # The details were scraped, not missing on both sides
+        self.assertTrue(result['time'].notna().all())
+        self.assertTrue(result['job_description'].notna().all())
+
+    def test_throttled_detail_retried(self):
+        # Test a 429 slows down the rate limiter of the client and the detail page is retried after Retry-After
+        client = HttpClient(rate=20, burst=20, retries=2)
+        self.server.throttled.add('1080379')
+
+        result = data_scrapping_async(base_url=self.base_url, pages=range(1, 5), client=client)
+
+        self.assertEqual(self.server.throttled, set())
+        self.assertEqual(result.loc[0, 'time'], 'Hạn nộp hồ sơ: Còn 25 ngày để ứng tuyển')
+        self.assertLess(client.limiter(self.base_url).rate, 20)
+        client.close()
+
+if __name__ == '__main__':
+    unittest.main()
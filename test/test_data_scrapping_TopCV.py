@@ -0,0 +1,139 @@
+import unittest
+import glob
+import os
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer
+from unittest import mock
+from source.data_scrapping_TopCV import parse_job_list, parse_job_item, parse_job_detail, parser_backends, \
+    set_parser_backend, data_scrapping, get_client
+from source.crawl_state import load_crawl_state, save_crawl_state, append_checkpoint_jobs, load_checkpoint_jobs, \
+    checkpoint_jobs_path
+from test.test_crawl_async import TopCVHandler
+
+# Get current file directory
+current_dir = os.path.dirname(__file__)
+
+# Saved TopCV pages
+fixture_dir = os.path.join(current_dir, 'fixtures', 'topcv')
+
+def read_fixture(file_name):
+    with open(os.path.join(fixture_dir, file_name), encoding='utf-8') as f:
+        return f.read()
+
+class TestParserBackends(unittest.TestCase):
+    def test_listing_same_fields(self):
+        # Test every backend extracts the same jobs as html5lib (whole page) from the listing pages
+        for file_name in ['listing_1.html', 'listing_2.html', 'listing_empty.html']:
+            html = read_fixture(file_name)
+            expected = [parse_job_item(job) for job in parse_job_list(html, 'html5lib')]
+
+            for backend in parser_backends:
+                with self.subTest(file_name=file_name, backend=backend):
+                    self.assertEqual([parse_job_item(job) for job in parse_job_list(html, backend)], expected)
+
+        self.assertEqual(len(expected), 0)
+        self.assertEqual(len(parse_job_list(read_fixture('listing_1.html'))), 3)
+
+    def test_detail_same_fields(self):
+        # Test every backend extracts the same deadline and description from the detail pages
+        for path in sorted(glob.glob(os.path.join(fixture_dir, 'detail_*.html'))):
+            html = read_fixture(os.path.basename(path))
+            expected = parse_job_detail(html, 'html5lib')
+            self.assertIsNotNone(expected[0])
+            self.assertIsNotNone(expected[1])
+
+            for backend in parser_backends:
+                with self.subTest(path=path, backend=backend):
+                    self.assertEqual(parse_job_detail(html, backend), expected)
+
+    def test_unknown_backend(self):
+        # Test an unknown backend is refused
+        with self.assertRaises(ValueError):
+            set_parser_backend('regex')
+
+class TestCrawlFrontier(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), TopCVHandler)
+        cls.server.base = f'http://127.0.0.1:{cls.server.server_port}'
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+        cls.base_url = cls.server.base + '/tim-viec-lam-moi-nhat?type_keyword=1&page={}&sba=1'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.state_path = os.path.join(self.tmp_dir.name, 'crawl_state.json')
+
+        # No waiting time between the pages
+        self.sleep_patch = mock.patch('time.sleep')
+        self.sleep_patch.start()
+
+    def tearDown(self):
+        self.sleep_patch.stop()
+        self.tmp_dir.cleanup()
+
+    def test_resume_after_interruption(self):
+        # Test a crawl interrupted on page 2 resumes from page 2 with the jobs of page 1
+        expected = data_scrapping(base_url=self.base_url)
+        self.assertTrue(expected['time'].notna().all())
+        self.assertTrue(expected['job_description'].notna().all())
+
+        parse_pages = [parse_job_list, mock.Mock(side_effect=RuntimeError('interrupted'))]
+        with mock.patch('source.data_scrapping_TopCV.parse_job_list', side_effect=lambda html: parse_pages.pop(0)(html)):
+            data_scrapping(base_url=self.base_url, state_path=self.state_path)
+
+        # The state file keeps the position of the crawl, the jobs of page 1 are in the jobs file
+        checkpoint = load_crawl_state(self.state_path)['checkpoint']
+        self.assertEqual((checkpoint['next_page'], checkpoint['jobs_count']), (2, 3))
+        self.assertNotIn('jobs', checkpoint)
+        self.assertEqual(len(load_checkpoint_jobs(self.state_path, 3)), 3)
+
+        # A page appended when the crawl stopped, before its checkpoint, is not resumed
+        append_checkpoint_jobs(self.state_path, [{'link_description': 'https://www.topcv.vn/viec-lam/x/9.html'}])
+
+        client = get_client()
+        with mock.patch.object(client, 'get', wraps=client.get) as client_get:
+            result = data_scrapping(base_url=self.base_url, state_path=self.state_path)
+
+        self.assertEqual(result.to_dict('records'), expected.to_dict('records'))
+        # Page 1 was not requested again
+        self.assertNotIn('page=1&', ' '.join(call.args[0] for call in client_get.call_args_list))
+
+        state = load_crawl_state(self.state_path)
+        self.assertIsNone(state['checkpoint'])
+        self.assertEqual(state['known_job_ids'], ['1049696', '1080379', '1090001', '1090002', '1090003'])
+        self.assertFalse(os.path.exists(checkpoint_jobs_path(self.state_path)))
+
+    def test_checkpoint_jobs_missing(self):
+        # Test a checkpoint whose jobs file lost rows (truncated line) is not resumed: the crawl starts again
+        expected = data_scrapping(base_url=self.base_url)
+
+        append_checkpoint_jobs(self.state_path, [{'link_description': 'a'}])
+        with open(checkpoint_jobs_path(self.state_path), 'a', encoding='utf-8') as f:
+            f.write('{"link_descr')
+        save_crawl_state(self.state_path, {'known_job_ids': [], 'checkpoint': {
+            'mode': 'scrape', 'base_url': self.base_url, 'next_page': 2, 'jobs_count': 2, 'known_streak': 0}})
+
+        result = data_scrapping(base_url=self.base_url, state_path=self.state_path)
+        self.assertEqual(result.to_dict('records'), expected.to_dict('records'))
+        self.assertTrue(result['job_description'].notna().all())
+
+    def test_incremental_stop(self):
+        # Test the crawl stops after stop_after_known postings already scraped in a row
+        result = data_scrapping(base_url=self.base_url, known_job_ids={'1049696', '1090001'}, stop_after_known=2)
+        self.assertEqual(len(result), 1)
+
+        # Known postings are skipped, the crawl goes on after a new one
+        result = data_scrapping(base_url=self.base_url, known_job_ids={'1049696', '1090001'}, stop_after_known=3)
+        self.assertEqual([link.split('/')[-1].split('.')[0] for link in result['link_description']],
+                         ['1080379', '1090002', '1090003'])
+
+if __name__ == '__main__':
+    unittest.main()
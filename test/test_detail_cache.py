@@ -0,0 +1,98 @@
+import unittest
+import os
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest import mock
+from source.detail_cache import job_id_from_link
+# The cache used by the scraper (same module instance as its flat 'from detail_cache import ...')
+from source.data_scrapping_TopCV import detail_scrapping, configure_detail_cache, get_detail_cache
+
+class ETagHandler(BaseHTTPRequestHandler):
+    # Detail page with an ETag: 304 when the client already has this version
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests.append((self.path, self.headers.get('If-None-Match')))
+
+        etag = '"v1"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        body = ('<span class="deadline">Còn 10 ngày</span>'
+                '<div class="job-description__item--content"><p>Mô tả</p></div>').encode('utf-8')
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class TestDetailCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), ETagHandler)
+        cls.server.lock = threading.Lock()
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+        cls.base = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.requests = []
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmp_dir.name, 'detail_cache.sqlite3')
+
+    def tearDown(self):
+        configure_detail_cache(None)
+        self.tmp_dir.cleanup()
+
+    def test_job_id_from_link(self):
+        # Test the key is the TopCV job id, whatever the tracking parameters
+        self.assertEqual(job_id_from_link('https://www.topcv.vn/viec-lam/ba/1080379.html?ta_source=A'), '1080379')
+        self.assertEqual(job_id_from_link('https://www.topcv.vn/brand/abc/tuyen-dung?x=1'),
+                         'https://www.topcv.vn/brand/abc/tuyen-dung')
+
+    def test_missing_link(self):
+        # Test a listing item without link gives no detail, as without the cache
+        configure_detail_cache(self.cache_path, ttl=3600)
+        self.assertEqual(detail_scrapping(None, retries=1), (None, None))
+        self.assertEqual(self.server.requests, [])
+
+    def test_fresh_entry_no_request(self):
+        # Test a fresh entry is used without request, also after reopening the cache file (next run)
+        configure_detail_cache(self.cache_path, ttl=3600)
+        expected = detail_scrapping(f'{self.base}/viec-lam/a/1.html?ta_source=A')
+
+        configure_detail_cache(self.cache_path, ttl=3600)
+        result = detail_scrapping(f'{self.base}/viec-lam/a/1.html?ta_source=B')
+
+        self.assertEqual(result, expected)
+        self.assertEqual(result, ('Còn 10 ngày', 'Mô tả'))
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(get_detail_cache().stats['hit'], 1)
+
+    def test_stale_entry_conditional_request(self):
+        # Test an expired entry is revalidated with If-None-Match and kept on 304
+        configure_detail_cache(self.cache_path, ttl=0)
+        expected = detail_scrapping(f'{self.base}/viec-lam/a/2.html')
+
+        with mock.patch('time.sleep'):
+            result = detail_scrapping(f'{self.base}/viec-lam/a/2.html')
+
+        self.assertEqual(result, expected)
+        self.assertEqual(self.server.requests[1][1], '"v1"')
+        self.assertEqual(get_detail_cache().stats, {'hit': 0, 'not_modified': 1, 'miss': 1})
+
+if __name__ == '__main__':
+    unittest.main()
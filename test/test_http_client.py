@@ -0,0 +1,152 @@
+import unittest
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest import mock
+from source.http_client import RateLimiter, HttpClient, parse_retry_after, backoff_delay
+# The shared client used by the scraper (same module instance as its flat 'from http_client import ...')
+from source.data_scrapping_TopCV import detail_scrapping, configure_client, get_client
+
+class FakeClock:
+    # Clock of the rate limiter moved by its sleep calls
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+class ThrottlingHandler(BaseHTTPRequestHandler):
+    # Answer 429 (Retry-After: 0) to the first request of each path, then the detail page
+    def do_GET(self):
+        with self.server.lock:
+            first = self.path not in self.server.seen
+            self.server.seen.add(self.path)
+
+        if first:
+            self.send_response(429)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        body = ('<span class="deadline">Còn 10 ngày</span>'
+                '<div class="job-description__item--content"><p>Mô tả</p></div>').encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class TestRetryHelpers(unittest.TestCase):
+    def test_parse_retry_after(self):
+        # Test Retry-After as seconds, as HTTP date (in the past -> 0) and invalid values
+        self.assertEqual(parse_retry_after('120'), 120.0)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+        self.assertIsNone(parse_retry_after('soon'))
+        self.assertIsNone(parse_retry_after(None))
+
+    def test_backoff_delay(self):
+        # Test the backoff grows exponentially and is capped
+        for attempt in range(10):
+            delay = backoff_delay(attempt, base=1.0, cap=30.0)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(30.0, 2 ** attempt))
+
+class TestRateLimiter(unittest.TestCase):
+    def test_retry_delay(self):
+        # Test no extra wait after Retry-After (the limiter is paused), backoff otherwise
+        client = HttpClient(backoff_base=1.0, backoff_cap=60.0)
+        throttled = mock.Mock(status_code=429, headers={'Retry-After': '30'})
+        with mock.patch('random.uniform', side_effect=lambda low, high: high):
+            self.assertEqual(client.retry_delay(0, throttled), 0.0)
+            self.assertEqual(client.retry_delay(2, mock.Mock(status_code=429, headers={})), 4.0)
+            self.assertEqual(client.retry_delay(1, mock.Mock(status_code=500, headers={'Retry-After': '30'})), 2.0)
+            self.assertEqual(client.retry_delay(0), 1.0)
+        client.close()
+
+    def test_token_bucket(self):
+        # Test a burst passes without waiting, then 1 request per 1/rate seconds
+        clock = FakeClock()
+        limiter = RateLimiter(rate=2.0, burst=3, clock=clock, sleep=clock.sleep)
+
+        for _ in range(3):
+            limiter.acquire()
+        self.assertEqual(clock.now, 100.0)
+
+        limiter.acquire()
+        limiter.acquire()
+        self.assertAlmostEqual(clock.now, 101.0)
+
+    def test_adapts_to_throttling(self):
+        # Test the rate is halved (once for a burst of throttles), Retry-After is respected, successes speed up again
+        clock = FakeClock()
+        limiter = RateLimiter(rate=4.0, burst=4, min_rate=1.0, step=0.5, clock=clock, sleep=clock.sleep)
+
+        limiter.on_throttle(retry_after=5)
+        limiter.on_throttle()
+        self.assertEqual(limiter.rate, 2.0)
+
+        limiter.acquire()
+        self.assertAlmostEqual(clock.now, 105.0)
+
+        limiter.on_success()
+        self.assertEqual(limiter.rate, 2.5)
+
+        for _ in range(5):
+            clock.now += 1
+            limiter.on_throttle()
+        self.assertEqual(limiter.rate, 1.0)
+
+class TestDetailScrapping(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), ThrottlingHandler)
+        cls.server.lock = threading.Lock()
+        cls.server.seen = set()
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+        cls.base = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        # Back to the default settings for the other tests
+        configure_client(rate=5.0, burst=5, retries=3)
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        configure_client(rate=50.0, burst=5, retries=3)
+
+    def test_retry_after_throttle(self):
+        # Test detail_scrapping retries after a 429 and slows down the host
+        with mock.patch('time.sleep'):
+            result = detail_scrapping(f'{self.base}/viec-lam/a/1.html')
+
+        self.assertEqual(result, ('Còn 10 ngày', 'Mô tả'))
+        self.assertLess(get_client().limiter(self.base).rate, 50.0)
+
+    def test_retry_budget(self):
+        # Test no more attempts than the retry budget
+        with mock.patch('time.sleep'):
+            result = detail_scrapping(f'{self.base}/viec-lam/b/2.html', retries=1)
+
+        self.assertEqual(result, (None, None))
+
+    def test_no_retry_on_invalid_url(self):
+        # Test an error which is not a network error (no URL) is not retried and does not wait
+        with mock.patch('time.sleep') as sleep, mock.patch.object(get_client().session, 'get',
+                                                                  wraps=get_client().session.get) as get:
+            result = detail_scrapping(None)
+
+        self.assertEqual(result, (None, None))
+        self.assertEqual(get.call_count, 1)
+        sleep.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+import os
+import pstats
+import tempfile
+import time
+from unittest import mock
+from source.instrument import stage, iter_stage, reset_stages, run_summary
+
+class TestStages(unittest.TestCase):
+    def setUp(self):
+        reset_stages()
+
+    def tearDown(self):
+        reset_stages()
+
+    def stage_summary(self, name):
+        return next(summary for summary in run_summary()['stages'] if summary['stage'] == name)
+
+    def test_stage_record(self):
+        # Test a stage records its wall time, CPU time, peak RSS and rows
+        with stage('transform', rows_in=3) as record:
+            sum(i * i for i in range(200000))
+            record['rows_out'] = 2
+
+        summary = self.stage_summary('transform')
+        self.assertEqual(summary['calls'], 1)
+        self.assertGreater(summary['wall_seconds'], 0)
+        self.assertGreater(summary['cpu_seconds'], 0)
+        self.assertGreater(summary['peak_rss_mb'], 0)
+        self.assertEqual((summary['rows_in'], summary['rows_out']), (3, 2))
+
+    def test_nested_stages(self):
+        # Test the self time of a stage excludes the stages run inside it
+        with stage('load'):
+            with stage('transform'):
+                time.sleep(0.2)
+            time.sleep(0.05)
+
+        load = self.stage_summary('load')
+        self.assertGreaterEqual(load['wall_seconds'], 0.25)
+        self.assertLess(load['self_seconds'], 0.2)
+        self.assertGreaterEqual(self.stage_summary('transform')['self_seconds'], 0.2)
+
+    def test_iter_stage(self):
+        # Test each item of an iterable is one run of the stage, the calls and rows are summed
+        chunks = list(iter_stage('extract', [[1, 2], [3, 4, 5]]))
+
+        self.assertEqual(chunks, [[1, 2], [3, 4, 5]])
+        summary = self.stage_summary('extract')
+        self.assertEqual((summary['calls'], summary['rows_out']), (2, 5))
+
+    def test_stage_error(self):
+        # Test a stage is recorded when it raises
+        with self.assertRaises(ValueError):
+            with stage('load'):
+                raise ValueError('Data error')
+
+        self.assertEqual(self.stage_summary('load')['calls'], 1)
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        reset_stages()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        reset_stages()
+        self.tmp_dir.cleanup()
+
+    def test_cprofile(self):
+        # Test PROFILE_STAGE writes the cProfile stats of this stage only
+        with mock.patch.dict(os.environ, {'PROFILE_STAGE': 'transform', 'PROFILE': 'cprofile',
+                                          'PROFILE_DIR': self.tmp_dir.name}):
+            with stage('extract'):
+                pass
+            with stage('transform'):
+                sorted(range(1000), key=lambda i: -i)
+
+        self.assertEqual(os.listdir(self.tmp_dir.name), ['transform-1.prof'])
+        stats = pstats.Stats(os.path.join(self.tmp_dir.name, 'transform-1.prof'))
+        self.assertTrue(any(func[2] == '<lambda>' for func in stats.stats))
+
+    def test_tracemalloc(self):
+        # Test PROFILE=tracemalloc writes a snapshot for each run of the stage
+        with mock.patch.dict(os.environ, {'PROFILE_STAGE': 'transform', 'PROFILE': 'tracemalloc',
+                                          'PROFILE_DIR': self.tmp_dir.name}):
+            for _ in range(2):
+                with stage('transform'):
+                    data = [str(i) for i in range(10000)]
+
+        self.assertEqual(sorted(os.listdir(self.tmp_dir.name)), ['transform-1.tracemalloc', 'transform-2.tracemalloc'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,13 @@
 import unittest
 import os
+import datetime
 import pandas as pd
+from dateutil.relativedelta import relativedelta
 from dotenv import load_dotenv
 from sqlalchemy import create_engine, text
-from source.load import loadtodb
+from source.load import loadtodb, loadtodb_chunks
+from source.transform import cleaning_data
+from source.schema import apply_schema
 from pandas.testing import assert_frame_equal
 
 # Get current file directory
@@ -100,6 +104,35 @@ class TestLoadToDB(unittest.TestCase):
         # Test if the sample dataframe and the dataframe taken from the database are the same
         assert_frame_equal(sample_data, db_data, check_dtype=False)
 
+    def test_loadtodb_typed(self):
+        # Test a DataFrame with the typed schema (categoricals, Arrow strings, NA) loads the same rows
+        print("\nRun Test: Load typed data into database")
+
+        sample_data = pd.DataFrame({
+            'created_date': ['2025-01-01', '2025-01-02'],
+            'job_title': ['Tester', 'Data Engineer'],
+            'company': ['Test Company', None],
+            'salary': ['10 - 20 triệu', 'Thoả thuận'],
+            'address': ['Hà Nội', 'Hồ Chí Minh: Quận 1'],
+            'time': ['Còn 10 ngày', None],
+            'link_description': ['http://www.google.com/1', 'http://www.google.com/2'],
+            'min_salary': [10000000.0, None],
+            'max_salary': [20000000.0, None],
+            'unit': ['VND', 'VND'],
+            'city': ['Hà Nội', 'Hồ Chí Minh'],
+            'district': [None, 'Quận 1'],
+            'job_group': ['Software Engineer', 'Data Engineer']
+        })
+
+        loadtodb(apply_schema(sample_data.copy()), db_conn_uri, self.tgt_table)
+
+        db_data = self.getdata_fromdb().sort_values('id').drop(columns=['id']).reset_index(drop=True)
+        expected = sample_data.astype(object).where(sample_data.notna(), None)
+        expected['created_date'] = pd.to_datetime(expected['created_date']).dt.date
+
+        assert_frame_equal(expected[sorted(expected.columns)], db_data[sorted(db_data.columns)].astype(object)
+                           .where(db_data.notna(), None), check_dtype=False)
+
     def test_rollback(self):
         # Test logic ROLLBACK.
         print("\nChạy Test: Logic ROLLBACK...")
@@ -129,5 +162,192 @@ class TestLoadToDB(unittest.TestCase):
         # Check the length of dataframe db_data, if = 0 means error -> ROLLBACK successful
         self.assertEqual(len(db_data), 0)
 
+    def test_loadtodb_chunks(self):
+        # Test loading chunk by chunk gives the same table as loading the whole dataframe
+        print("\nRun Test: Load data into database chunk by chunk")
+
+        # Create sample dataframe
+        sample_data = pd.DataFrame({
+            'created_date': [pd.to_datetime('2025-01-01').date()] * 5,
+            'job_title': ['Tester'] * 5,
+            'company': ['Test Company'] * 5,
+            'salary': ['10 - 20 triệu'] * 5,
+            'address': ['Hà Nội'] * 5,
+            'time': ['Còn 10 ngày'] * 5,
+            'link_description': [f'http://www.google.com/{i}' for i in range(5)],
+            'min_salary': [10000000.0] * 5,
+            'max_salary': [20000000.0] * 5,
+            'unit': ['VND'] * 5,
+            'city': ['Hà Nội'] * 5,
+            'district': [None] * 5,
+            'job_group': ['Software Engineer'] * 5
+        })
+
+        # Load data into database, 2 rows per chunk
+        chunks = (sample_data.iloc[i:i + 2] for i in range(0, len(sample_data), 2))
+        loadtodb_chunks(chunks, db_conn_uri, self.tgt_table)
+
+        db_data = self.getdata_fromdb().sort_values('id').reset_index(drop=True)
+
+        # Rows keep the order of the chunks
+        self.assertEqual(list(db_data['id']), [1, 2, 3, 4, 5])
+        self.assertEqual(list(db_data['link_description']), list(sample_data['link_description']))
+
+    def test_loadtodb_incremental(self):
+        # Test incremental mode: unchanged rows are skipped, changed rows are updated, new rows are inserted
+        print("\nRun Test: Incremental load into database")
+
+        # Create sample dataframe
+        sample_data = pd.DataFrame({
+            'created_date': [pd.to_datetime('2025-01-01').date()] * 2,
+            'job_title': ['Tester', 'Java Developer'],
+            'company': ['Test Company'] * 2,
+            'salary': ['10 - 20 triệu'] * 2,
+            'address': ['Hà Nội'] * 2,
+            'time': ['Còn 10 ngày'] * 2,
+            'link_description': ['https://www.topcv.vn/viec-lam/tester/1.html?ta_source=A',
+                                 'https://www.topcv.vn/viec-lam/java/2.html?ta_source=A'],
+            'min_salary': [10000000.0] * 2,
+            'max_salary': [20000000.0] * 2,
+            'unit': ['VND'] * 2,
+            'city': ['Hà Nội'] * 2,
+            'district': [None] * 2,
+            'job_group': ['Tester', 'Java Developer']
+        })
+
+        counts = loadtodb(sample_data, db_conn_uri, self.tgt_table, incremental=True)
+        self.assertEqual(counts, {'inserted': 2, 'updated': 0, 'skipped': 0})
+
+        # Same postings (other tracking parameter in the link), one of them changed + one new posting
+        new_data = sample_data.copy()
+        new_data['link_description'] = new_data['link_description'].str.replace('ta_source=A', 'ta_source=B')
+        new_data.loc[1, 'salary'] = 'Thoả thuận'
+        new_row = sample_data.iloc[[0]].assign(link_description='https://www.topcv.vn/viec-lam/tester/3.html')
+        new_data = pd.concat([new_data, new_row], ignore_index=True)
+
+        counts = loadtodb(new_data, db_conn_uri, self.tgt_table, incremental=True)
+        self.assertEqual(counts, {'inserted': 1, 'updated': 1, 'skipped': 1})
+
+        db_data = self.getdata_fromdb()
+        self.assertEqual(len(db_data), 3)
+        self.assertEqual(sorted(db_data['job_key']), ['1', '2', '3'])
+
+    def test_switch_load_mode(self):
+        # Test a default load over the rows of an incremental load: the next incremental load writes
+        # the overwritten postings again instead of skipping them
+        print("\nRun Test: Switch between incremental and default load")
+
+        data = pd.DataFrame({
+            'created_date': [pd.to_datetime('2025-01-01').date()] * 4,
+            'job_title': ['Tester', 'Java Developer', 'Data Engineer', 'Kế toán'],
+            'company': ['Test Company'] * 4,
+            'salary': ['10 - 20 triệu'] * 4,
+            'address': ['Hà Nội'] * 4,
+            'time': ['Còn 10 ngày'] * 4,
+            'link_description': [f'https://www.topcv.vn/viec-lam/job/{i}.html?ta_source=A' for i in range(1, 5)],
+            'min_salary': [10000000.0] * 4,
+            'max_salary': [20000000.0] * 4,
+            'unit': ['VND'] * 4,
+            'city': ['Hà Nội'] * 4,
+            'district': [None] * 4,
+            'job_group': ['Tester', 'Java Developer', 'Data Engineer', 'Other']
+        })
+
+        loadtodb(data.iloc[:2], db_conn_uri, self.tgt_table, incremental=True)
+        # Default mode: the ids 1, 2 of the temp table overwrite the postings 1, 2
+        loadtodb(data.iloc[2:], db_conn_uri, self.tgt_table)
+
+        counts = loadtodb(data.iloc[:2], db_conn_uri, self.tgt_table, incremental=True)
+        self.assertEqual(counts, {'inserted': 2, 'updated': 0, 'skipped': 0})
+
+        db_data = self.getdata_fromdb()
+        self.assertEqual(sorted(db_data['link_description']), sorted(data['link_description']))
+        self.assertTrue((db_data['job_key'] == db_data['link_description'].str.extract(r'/(\d+)\.html')[0]).all())
+
+part_table = 'Test_Part_JobList'
+
+class TestPartitionedLoad(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        try:
+            cls.engine = create_engine(db_conn_uri)
+            with cls.engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+        except Exception as e:
+            raise unittest.SkipTest(f"Không thể kết nối DB Test. Lỗi: {e}")
+
+        # data.csv spread over this month and the 3 previous ones
+        month = datetime.date.today().replace(day=1)
+        cls.months = [month - relativedelta(months=i) for i in range(4)]
+
+        cls.data = pd.read_csv(os.path.join(project_dir, 'data', 'data.csv')).head(400)
+        cls.data['created_date'] = pd.to_datetime([cls.months[i % 4] for i in range(len(cls.data))])
+        cleaning_data(cls.data)
+
+    def setUp(self):
+        self.drop_tables()
+
+    def tearDown(self):
+        self.drop_tables()
+
+    def drop_tables(self):
+        with self.engine.begin() as connection:
+            for table in [part_table, f'{part_table}_agg_jobs', f'{part_table}_agg_salary',
+                          f'{part_table}_agg_titles', f'{part_table}_agg_state']:
+                connection.execute(text(f"DROP TABLE IF EXISTS {table}"))
+
+    def partition_counts(self):
+        # Number of rows per partition
+        return pd.read_sql(f"SELECT tableoid::regclass::text AS name, COUNT(*) AS n FROM {part_table} GROUP BY 1",
+                           self.engine).set_index('name')['n'].to_dict()
+
+    def test_partitions_and_indexes(self):
+        # Test one partition per month is created by the load, with the indexes of the parent table
+        loadtodb(self.data, db_conn_uri, part_table, partitioned=True)
+
+        expected = {f'{part_table.lower()}_p{month:%Y%m}': 100 for month in self.months}
+        self.assertEqual(self.partition_counts(), expected)
+
+        indexes = pd.read_sql(f"SELECT indexname FROM pg_indexes WHERE tablename = '{part_table.lower()}'",
+                              self.engine)['indexname']
+        for column in ['id', 'job_key', 'job_group', 'city']:
+            self.assertIn(f'{part_table.lower()}_{column}_idx', list(indexes))
+
+        # Merge on id: loading again replaces the rows
+        loadtodb(self.data, db_conn_uri, part_table)
+        self.assertEqual(sum(self.partition_counts().values()), len(self.data))
+
+    def test_existing_plain_table(self):
+        # Test partitioned=True on an existing plain table: the load goes on unpartitioned
+        loadtodb(self.data.head(10), db_conn_uri, part_table)
+        loadtodb(self.data, db_conn_uri, part_table, partitioned=True)
+
+        self.assertEqual(self.partition_counts(), {part_table.lower(): len(self.data)})
+
+    def test_incremental_moved_posting(self):
+        # Test a posting whose created_date changes month moves to the other partition, once
+        counts = loadtodb(self.data, db_conn_uri, part_table, incremental=True, partitioned=True)
+        self.assertEqual(counts['inserted'], len(self.data))
+
+        moved = self.data.iloc[[1]].assign(created_date=pd.Timestamp(self.months[0]))
+        counts = loadtodb(moved, db_conn_uri, part_table, incremental=True)
+        self.assertEqual(counts, {'inserted': 0, 'updated': 1, 'skipped': 0})
+
+        counts = self.partition_counts()
+        self.assertEqual(counts[f'{part_table.lower()}_p{self.months[0]:%Y%m}'], 101)
+        self.assertEqual(counts[f'{part_table.lower()}_p{self.months[1]:%Y%m}'], 99)
+
+    def test_retention(self):
+        # Test the partitions whose rows are all older than the retention are dropped (the partition of 2 months
+        # ago has rows within 2 months: kept), and their rows are removed from the aggregates
+        loadtodb(self.data, db_conn_uri, part_table, partitioned=True, aggregates=True)
+        loadtodb(self.data.head(4), db_conn_uri, part_table, aggregates=True, retention_months=2)
+
+        self.assertEqual(set(self.partition_counts()),
+                         {f'{part_table.lower()}_p{month:%Y%m}' for month in self.months[:3]})
+
+        total = pd.read_sql(f"SELECT SUM(job_count) AS total FROM {part_table}_agg_jobs", self.engine)
+        self.assertEqual(total.at[0, 'total'], 300)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,138 @@
+import unittest
+import os
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer
+from unittest import mock
+import pandas as pd
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+from source.pipeline import run_pipeline
+from source.crawl_state import load_crawl_state, save_crawl_state, append_checkpoint_jobs, checkpoint_jobs_path
+from source.load import loadtodb
+from test.test_crawl_async import TopCVHandler
+
+# Get current file directory
+current_dir = os.path.dirname(__file__)
+
+# Get project root directory
+project_dir = os.path.abspath(os.path.join(current_dir, '..'))
+
+# Get file .env directory
+env_path = os.path.join(project_dir, '.env')
+
+# Connect to file .env
+load_dotenv(dotenv_path=env_path)
+
+db_host = os.environ.get('DB_HOST')
+db_port = os.environ.get('DB_PORT')
+db_name = os.environ.get('DB_NAME')
+db_user = os.environ.get('DB_USER')
+db_pass = os.environ.get('DB_PASS')
+
+db_conn_uri = f'postgresql://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}'
+
+tgt_table = 'Test_Pipeline_JobList'
+
+class TestPipeline(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        try:
+            cls.engine = create_engine(db_conn_uri)
+            with cls.engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+        except Exception as e:
+            raise unittest.SkipTest(f"Không thể kết nối DB Test. Lỗi: {e}")
+
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), TopCVHandler)
+        cls.server.base = f'http://127.0.0.1:{cls.server.server_port}'
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+        cls.base_url = cls.server.base + '/tim-viec-lam-moi-nhat?type_keyword=1&page={}&sba=1'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.engine.dispose()
+
+    def setUp(self):
+        with self.engine.begin() as connection:
+            connection.execute(text(f"DROP TABLE IF EXISTS {tgt_table}"))
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.state_path = os.path.join(self.tmp_dir.name, 'crawl_state.json')
+
+        # No waiting time between the pages
+        self.sleep_patch = mock.patch('time.sleep')
+        self.sleep_patch.start()
+
+    def tearDown(self):
+        self.sleep_patch.stop()
+        self.tmp_dir.cleanup()
+
+        with self.engine.begin() as connection:
+            connection.execute(text(f"DROP TABLE IF EXISTS {tgt_table}"))
+
+    def test_run_pipeline(self):
+        # Test every scraped page is transformed and upserted, then a second run only skips unchanged postings
+        totals = run_pipeline(db_conn_uri, tgt_table, base_url=self.base_url, state_path=self.state_path,
+                              queue_size=1)
+        self.assertEqual(totals, {'pages': 2, 'inserted': 5, 'updated': 0, 'skipped': 0})
+
+        df = pd.read_sql(f"SELECT * FROM {tgt_table} ORDER BY job_key", self.engine)
+        self.assertEqual(list(df['job_key']), ['1049696', '1080379', '1090001', '1090002', '1090003'])
+        self.assertEqual(df.loc[1, 'job_group'], 'Business Analyst')
+        self.assertEqual(df.loc[2, 'city'], 'Hà Nội')
+        # The deadline of each posting comes from its detail page
+        self.assertTrue(df['time'].notna().all())
+
+        state = load_crawl_state(self.state_path)
+        self.assertIsNone(state['checkpoint'])
+        self.assertEqual(len(state['known_job_ids']), 5)
+
+        totals = run_pipeline(db_conn_uri, tgt_table, base_url=self.base_url, queue_size=1)
+        self.assertEqual(totals, {'pages': 2, 'inserted': 0, 'updated': 0, 'skipped': 5})
+
+    def test_run_pipeline_known_jobs(self):
+        # Test the postings already known are skipped without loading them (incremental crawl)
+        totals = run_pipeline(db_conn_uri, tgt_table, base_url=self.base_url, known_job_ids={'1049696', '1090001'},
+                              queue_size=1)
+        self.assertEqual(totals['inserted'], 3)
+
+        df = pd.read_sql(f"SELECT * FROM {tgt_table} ORDER BY job_key", self.engine)
+        self.assertEqual(list(df['job_key']), ['1080379', '1090002', '1090003'])
+
+    def test_resume_known_streak(self):
+        # Test the checkpoint keeps the known postings in a row at the end of the loaded page, the resumed run
+        # stops where the uninterrupted run would
+        known_job_ids = {'1049696', '1090001'}
+        # Page 1: 1 new posting then 2 known ones, the load of page 2 fails
+        loads = [loadtodb, mock.Mock(return_value=None)]
+        with mock.patch('source.pipeline.loadtodb', side_effect=lambda *args, **kwargs: loads.pop(0)(*args, **kwargs)):
+            run_pipeline(db_conn_uri, tgt_table, base_url=self.base_url, known_job_ids=known_job_ids,
+                         state_path=self.state_path, queue_size=1)
+
+        checkpoint = load_crawl_state(self.state_path)['checkpoint']
+        self.assertEqual((checkpoint['next_page'], checkpoint['known_streak']), (2, 2))
+
+        # Page 2 starts with a known posting: 3 in a row, stop
+        totals = run_pipeline(db_conn_uri, tgt_table, base_url=self.base_url, known_job_ids=known_job_ids | {'1090002'},
+                              state_path=self.state_path, queue_size=1)
+        self.assertEqual(totals['inserted'], 0)
+
+    def test_keep_other_checkpoint(self):
+        # Test the checkpoint of an interrupted sequential crawl in the same state file is kept
+        append_checkpoint_jobs(self.state_path, [{'link_description': 'a'}])
+        checkpoint = {'mode': 'scrape', 'base_url': self.base_url, 'next_page': 2, 'jobs_count': 1, 'known_streak': 0}
+        save_crawl_state(self.state_path, {'known_job_ids': [], 'checkpoint': checkpoint})
+
+        totals = run_pipeline(db_conn_uri, tgt_table, base_url=self.base_url, state_path=self.state_path, queue_size=1)
+
+        self.assertEqual(totals['inserted'], 5)
+        self.assertEqual(load_crawl_state(self.state_path)['checkpoint'], checkpoint)
+        self.assertTrue(os.path.exists(checkpoint_jobs_path(self.state_path)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,306 @@
+import unittest
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from unittest import mock
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from matplotlib import cbook
+from sqlalchemy import create_engine, text
+from source.transform import cleaning_data
+from source.load import loadtodb
+from source.report import convert_salary, salary_mil_vnd, draw_job_heatmap, draw_salary_stats, \
+    draw_techtrend, render_reports, report_tasks_from_db
+from source.report_query import query_job_counts, query_salary_stats, query_tech_term_counts
+from source.techterms import TechTermMatcher, default_tech_terms
+from pandas.testing import assert_frame_equal
+
+# Get current file directory
+current_dir = os.path.dirname(__file__)
+
+# Get project root directory
+project_dir = os.path.abspath(os.path.join(current_dir, '..'))
+
+# Get file .env directory
+env_path = os.path.join(project_dir, '.env')
+
+# Connect to file .env
+load_dotenv(dotenv_path=env_path)
+
+db_host = os.environ.get('DB_HOST')
+db_port = os.environ.get('DB_PORT')
+db_name = os.environ.get('DB_NAME')
+db_user = os.environ.get('DB_USER')
+db_pass = os.environ.get('DB_PASS')
+
+db_conn_uri = f'postgresql://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}'
+
+tgt_table = 'Test_Report_JobList'
+
+class TestReportQuery(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Run 1 time before all test cases: load data.csv into the test table
+        try:
+            cls.engine = create_engine(db_conn_uri)
+            with cls.engine.begin() as connection:
+                connection.execute(text(f"DROP TABLE IF EXISTS {tgt_table}"))
+        except Exception as e:
+            raise unittest.SkipTest(f"Không thể kết nối DB Test. Lỗi: {e}")
+
+        df = pd.read_csv(os.path.join(project_dir, 'data', 'data.csv'))
+        df['created_date'] = pd.to_datetime(df['created_date'])
+        cleaning_data(df)
+        loadtodb(df, db_conn_uri, tgt_table)
+
+        cls.df = pd.read_sql(f"SELECT * FROM {tgt_table}", cls.engine)
+
+    @classmethod
+    def tearDownClass(cls):
+        with cls.engine.begin() as connection:
+            connection.execute(text(f"DROP TABLE IF EXISTS {tgt_table}"))
+
+    def test_query_job_counts(self):
+        # Test counts computed in SQL are the same as the pivot table computed in pandas
+        result = query_job_counts(self.engine, tgt_table)
+
+        df_job = self.df[self.df['city'] != 'Toàn Quốc']
+        expected = pd.pivot_table(df_job, index='city', columns='job_group', aggfunc='size', fill_value=0)
+
+        assert_frame_equal(result, expected, check_dtype=False, check_names=False)
+
+    def test_query_salary_stats(self):
+        # Test box plot statistics computed in SQL are the same as matplotlib's on the pandas salaries
+        result = query_salary_stats(self.engine, tgt_table, 25000).set_index('job_group')
+
+        df_salary = convert_salary(self.df.copy(), 25000)
+        for job_group, salary in df_salary.groupby('job_group')['converted_salary(mil VND)']:
+            expected = cbook.boxplot_stats(salary.to_numpy())[0]
+            for key in ['q1', 'med', 'q3', 'whislo', 'whishi', 'mean']:
+                self.assertAlmostEqual(result.at[job_group, key], expected[key], places=6)
+            self.assertEqual(result.at[job_group, 'flier_count'], len(expected['fliers']))
+
+    def test_query_tech_counts(self):
+        # Test term counts computed from the distinct titles are the same as one search per alias in pandas
+        result = query_tech_term_counts(self.engine, tgt_table, TechTermMatcher(default_tech_terms))
+
+        titles = self.df['job_title'].str.lower()
+        expected = [titles.apply(lambda title: any(re.search(r'(?<!\w)' + re.escape(alias) + r'(?!\w)', title)
+                                                   for alias in aliases)).sum()
+                    for aliases in default_tech_terms.values()]
+        self.assertEqual(list(result['tech']), list(default_tech_terms))
+        self.assertEqual(list(result['count']), expected)
+
+    def test_query_tech_term_counts_custom_terms(self):
+        # Test a custom term list (TECH_TERMS_PATH): its order is kept, aliases are counted, unknown terms count 0
+        terms = {'tester': ['tester', 'qa', 'qc'], 'kế toán': ['kế toán', 'accountant'], 'cobol': ['cobol']}
+        matcher = TechTermMatcher(terms)
+        result = query_tech_term_counts(self.engine, tgt_table, matcher)
+
+        assert_frame_equal(result, matcher.extract(self.df[['job_title']])[1])
+        self.assertEqual(list(result['tech']), list(terms))
+        self.assertEqual(result.set_index('tech').at['cobol', 'count'], 0)
+        self.assertGreater(result['count'].sum(), 0)
+
+    def test_report_tasks_query_error(self):
+        # Test a chart whose query fails is skipped, the other charts keep their data
+        with mock.patch('source.report.query_tech_term_counts', side_effect=ValueError('bad term list')):
+            tasks = report_tasks_from_db(db_conn_uri, tgt_table, 25000, 'reports', engine=self.engine)
+
+        self.assertEqual([name for name, _, _, _ in tasks], ['salary distribution', 'job heatmap'])
+        self.assertTrue(all(len(data) for _, _, data, _ in tasks))
+
+agg_table = 'Test_Agg_JobList'
+
+class TestReportAggregates(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        try:
+            cls.engine = create_engine(db_conn_uri)
+            with cls.engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+        except Exception as e:
+            raise unittest.SkipTest(f"Không thể kết nối DB Test. Lỗi: {e}")
+
+        cls.data = pd.read_csv(os.path.join(project_dir, 'data', 'data.csv'))
+        cls.data['created_date'] = pd.to_datetime(cls.data['created_date'])
+        cleaning_data(cls.data)
+
+    def setUp(self):
+        self.drop_tables()
+
+    def tearDown(self):
+        self.drop_tables()
+
+    def drop_tables(self):
+        with self.engine.begin() as connection:
+            for table in [agg_table, f'{agg_table}_agg_jobs', f'{agg_table}_agg_salary',
+                          f'{agg_table}_agg_titles', f'{agg_table}_agg_state']:
+                connection.execute(text(f"DROP TABLE IF EXISTS {table}"))
+
+    def assert_aggregates_match(self):
+        # The reports read from the aggregates are the same as the reports computed on the whole table
+        assert_frame_equal(query_job_counts(self.engine, agg_table, aggregates=True),
+                           query_job_counts(self.engine, agg_table))
+
+        matcher = TechTermMatcher(default_tech_terms)
+        assert_frame_equal(query_tech_term_counts(self.engine, agg_table, matcher, aggregates=True),
+                           query_tech_term_counts(self.engine, agg_table, matcher))
+
+        assert_frame_equal(query_salary_stats(self.engine, agg_table, 25000, aggregates=True),
+                           query_salary_stats(self.engine, agg_table, 25000), check_dtype=False)
+
+    def test_incremental_delta(self):
+        # Test the aggregates follow inserted and updated postings, unchanged postings are skipped
+        half = len(self.data) // 2
+        first, second = self.data.iloc[:half].copy(), self.data.iloc[half:].copy()
+        counts = loadtodb(first, db_conn_uri, agg_table, incremental=True, aggregates=True)
+        self.assertEqual(counts['inserted'], half)
+        self.assert_aggregates_match()
+
+        # Some postings of the first load change city, job group and salary
+        changed = first.iloc[:50].copy()
+        changed['city'] = 'Đà Nẵng'
+        changed['job_group'] = 'Data'
+        changed['min_salary'] = changed['max_salary'] = 30000000
+        changed['unit'] = 'VND'
+
+        counts = loadtodb(pd.concat([changed, first.iloc[50:100], second]), db_conn_uri, agg_table,
+                          incremental=True, aggregates=True)
+        self.assertEqual(counts['skipped'], 50)
+        self.assert_aggregates_match()
+
+    def test_merge_on_id_and_rebuild(self):
+        # Test the merge on id (rows replaced) and the rebuild when the target table was created again
+        loadtodb(self.data, db_conn_uri, agg_table, aggregates=True)
+        loadtodb(self.data.iloc[:200].assign(job_group='Tester'), db_conn_uri, agg_table, aggregates=True)
+        self.assert_aggregates_match()
+
+        with self.engine.begin() as connection:
+            connection.execute(text(f"DROP TABLE {agg_table}"))
+
+        loadtodb(self.data.iloc[:300], db_conn_uri, agg_table, aggregates=True)
+        self.assert_aggregates_match()
+        total = pd.read_sql(f"SELECT SUM(job_count) AS total FROM {agg_table}_agg_jobs", self.engine)
+        self.assertEqual(total.at[0, 'total'], 300)
+
+    def test_rebuild_after_load_without_aggregates(self):
+        # Test a load without aggregates (same number of rows, other job groups) makes the next load rebuild them
+        loadtodb(self.data, db_conn_uri, agg_table, aggregates=True)
+        loadtodb(self.data.iloc[:200].assign(job_group='Tester', city=None), db_conn_uri, agg_table)
+        state = pd.read_sql(f"SELECT COUNT(*) AS count FROM {agg_table}_agg_state", self.engine)
+        self.assertEqual(state.at[0, 'count'], 0)
+
+        loadtodb(self.data.iloc[200:300], db_conn_uri, agg_table, aggregates=True)
+        self.assert_aggregates_match()
+
+def convert_salary_rowwise(df, convert_rate):
+    # Previous implementation of convert_salary() (df.apply row by row), reference for the parity test
+    def apply_salary(row):
+        min_salary = row['min_salary']
+        max_salary = row['max_salary']
+        unit = row['unit']
+
+        if unit == 'usd' or unit == 'USD':
+            min_salary = min_salary * convert_rate
+            max_salary = max_salary * convert_rate
+
+        if pd.notna(min_salary) and pd.notna(max_salary):
+            return ((min_salary + max_salary) / 2) / 1000000
+        elif pd.notna(min_salary):
+            return min_salary / 1000000
+        elif pd.notna(max_salary):
+            return max_salary / 1000000
+        else:
+            return None
+
+    df['converted_salary(mil VND)'] = df.apply(apply_salary, axis=1)
+    df = df[df['converted_salary(mil VND)'] < 1000]
+    return df
+
+class TestConvertSalary(unittest.TestCase):
+    def setUp(self):
+        # Create sample dataframe
+        self.sample_data = pd.DataFrame({
+            'job_group': ['Tester', 'Data', 'Intern', 'Tester', 'Data', 'Other', 'Other', 'Tester'],
+            'min_salary': [10000000, 1000, None, 500, np.nan, None, 5000000000, 12345678],
+            'max_salary': [20000000, 2000, 15000000, None, 3000, None, 6000000000, 23456789],
+            'unit': ['VND', 'USD', 'VND', 'usd', 'USD', None, 'VND', 'VND']
+        }, index=[10, 11, 12, 13, 14, 15, 16, 17])
+
+    def test_salary_mil_vnd(self):
+        # Test the converted salary of each case
+        result = salary_mil_vnd(self.sample_data, 25000)
+        expected = [15.0, 37.5, 15.0, 12.5, 75.0, np.nan, 5500.0, 17.9012335]
+        np.testing.assert_allclose(result.to_numpy(), expected)
+        self.assertEqual(list(result.index), list(self.sample_data.index))
+
+    def test_convert_salary_parity(self):
+        # Test the columnar convert_salary() gives the same result as the previous row by row version
+        result = convert_salary(self.sample_data.copy(), 25000)
+        expected = convert_salary_rowwise(self.sample_data.copy(), 25000)
+
+        assert_frame_equal(result, expected, check_dtype=False)
+
+class TestRenderReports(unittest.TestCase):
+    def setUp(self):
+        self.report_dir = tempfile.TemporaryDirectory()
+        report_path = self.report_dir.name
+
+        df_stats = pd.DataFrame({'job_group': ['Data', 'Tester'], 'mean': [20.0, 15.0], 'q1': [10.0, 8.0],
+                                 'med': [18.0, 14.0], 'q3': [30.0, 20.0], 'whislo': [5.0, 4.0],
+                                 'whishi': [50.0, 30.0]})
+        df_job_pivot = pd.DataFrame({'Data': [3, 1], 'Tester': [0, 2]}, index=['Hà Nội', 'Hồ Chí Minh'])
+        df_techtrend = pd.DataFrame({'tech': ['data', 'java'], 'count': [4, 2]})
+
+        self.tasks = [
+            ('salary distribution', draw_salary_stats, df_stats, f'{report_path}/salary_distribution.png'),
+            ('job heatmap', draw_job_heatmap, df_job_pivot, f'{report_path}/job_heatmap.png'),
+            ('tech trends', draw_techtrend, df_techtrend, f'{report_path}/techtrend.png'),
+        ]
+
+    def tearDown(self):
+        self.report_dir.cleanup()
+
+    def test_render_reports_serial(self):
+        render_reports(self.tasks, parallel=False)
+        for task in self.tasks:
+            self.assertTrue(os.path.getsize(task[3]) > 0)
+
+    def test_render_reports_parallel(self):
+        render_reports(self.tasks, parallel=True, max_workers=2)
+        for task in self.tasks:
+            self.assertTrue(os.path.getsize(task[3]) > 0)
+
+    def test_render_reports_cache(self):
+        # Test unchanged charts are skipped, a changed input or parameter or force=True draws them again
+        params = {'convert_rate': 25000}
+        self.assertEqual(len(render_reports(self.tasks, parallel=False, cache=True, params=params)), 3)
+        self.assertTrue(os.path.exists(self.tasks[0][3] + '.fingerprint'))
+        self.assertEqual(render_reports(self.tasks, parallel=False, cache=True, params=params), [])
+
+        name, draw, df_techtrend, report_path = self.tasks[2]
+        self.tasks[2] = (name, draw, df_techtrend.assign(count=[5, 2]), report_path)
+        self.assertEqual(render_reports(self.tasks, parallel=False, cache=True, params=params), ['tech trends'])
+
+        self.assertEqual(len(render_reports(self.tasks, parallel=False, cache=True, params={'convert_rate': 24000})), 3)
+        self.assertEqual(len(render_reports(self.tasks, parallel=True, cache=True, force=True,
+                                            params={'convert_rate': 24000})), 3)
+
+        # A deleted chart is drawn again
+        os.remove(report_path)
+        self.assertEqual(render_reports(self.tasks, parallel=False, cache=True, params={'convert_rate': 24000}),
+                         ['tech trends'])
+
+    def test_import_without_matplotlib(self):
+        # Test importing report.py does not import matplotlib/seaborn (only needed when drawing)
+        code = "import sys, report; print('matplotlib' in sys.modules or 'seaborn' in sys.modules)"
+        result = subprocess.run([sys.executable, '-c', code], cwd=os.path.join(project_dir, 'source'),
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), 'False')
+
+if __name__ == '__main__':
+    unittest.main()
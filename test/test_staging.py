@@ -0,0 +1,78 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from source.staging import write_parquet, read_staging, iter_staging, job_columns
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+# Get current file directory
+current_dir = os.path.dirname(__file__)
+
+# Get project root directory
+project_dir = os.path.abspath(os.path.join(current_dir, '..'))
+
+# Scraper output: 100 jobs over 8 days
+csv_path = os.path.join(project_dir, 'data', 'dataTopCV.csv')
+
+@unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+class TestParquetStaging(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.parquet_path = os.path.join(self.tmp_dir.name, 'dataTopCV.parquet')
+
+        self.expected = read_staging(csv_path)
+        write_parquet(pd.read_csv(csv_path), self.parquet_path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def sort_jobs(self, df):
+        # Parquet rows are grouped by day, missing strings are None instead of NaN
+        return df.sort_values(['created_date', 'link_description']).reset_index(drop=True).fillna(np.nan)
+
+    def test_roundtrip(self):
+        # Test the Parquet dataset gives the same data as the CSV, one partition per day
+        self.assertEqual(len(os.listdir(self.parquet_path)), self.expected['created_date'].nunique())
+
+        df = read_staging(self.parquet_path)
+        self.assertEqual(list(df.columns), list(self.expected.columns))
+        assert_frame_equal(self.sort_jobs(df), self.sort_jobs(self.expected))
+
+    def test_read_columns_and_days(self):
+        # Test only the requested columns and days are read, same as the CSV
+        start_date, end_date = '2025-11-10', '2025-11-14'
+
+        df = read_staging(self.parquet_path, columns=job_columns, start_date=start_date, end_date=end_date)
+        expected = read_staging(csv_path, columns=job_columns, start_date=start_date, end_date=end_date)
+
+        self.assertGreater(len(expected), 0)
+        self.assertLess(len(expected), len(self.expected))
+        assert_frame_equal(self.sort_jobs(df), self.sort_jobs(expected))
+
+    def test_iter_staging(self):
+        # Test the chunks cover all the rows
+        chunks = list(iter_staging(self.parquet_path, chunksize=30, columns=job_columns))
+        self.assertTrue(all(len(chunk) <= 30 for chunk in chunks))
+        self.assertEqual(sum(len(chunk) for chunk in chunks), len(self.expected))
+
+    def test_rewrite_days(self):
+        # Test writing again replaces the days written, the other days are kept
+        last_day = self.expected['created_date'].max()
+        df_last_day = pd.read_csv(csv_path)
+        df_last_day = df_last_day[pd.to_datetime(df_last_day['created_date']) == last_day].head(1)
+
+        write_parquet(df_last_day, self.parquet_path)
+
+        df = read_staging(self.parquet_path)
+        self.assertEqual(len(df[df['created_date'] == last_day]), 1)
+        self.assertEqual(len(df[df['created_date'] != last_day]),
+                         len(self.expected[self.expected['created_date'] != last_day]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import os
+import re
+import tempfile
+import pandas as pd
+from source.techterms import TechTermMatcher, default_tech_terms, load_tech_terms
+
+class TestTechTermMatcher(unittest.TestCase):
+    def setUp(self):
+        self.matcher = TechTermMatcher(default_tech_terms)
+
+    def test_word_boundaries(self):
+        # Test a term only matches as a whole word
+        self.assertEqual(self.matcher.find_terms('Lập trình viên Java'), {'java'})
+        self.assertEqual(self.matcher.find_terms('Frontend JavaScript Developer'), set())
+        self.assertEqual(self.matcher.find_terms('Nhân viên Bank Teller'), set())
+        self.assertEqual(self.matcher.find_terms('Big Data Engineer (Python/AWS)'), {'data', 'python', 'aws'})
+        self.assertEqual(self.matcher.find_terms('Kỹ sư Database'), set())
+
+    def test_aliases(self):
+        # Test the aliases of a term are counted as the term
+        self.assertEqual(self.matcher.find_terms('ASP.NET Core Developer'), {'.net'})
+        self.assertEqual(self.matcher.find_terms('Thực tập sinh .NET'), {'.net'})
+        self.assertEqual(self.matcher.find_terms('Fullstack ReactJS, NodeJS'), {'react', 'node'})
+        self.assertEqual(self.matcher.find_terms('Chuyên Viên Business Analyst'), {'ba'})
+        self.assertEqual(self.matcher.find_terms(None), set())
+
+    def test_extract(self):
+        # Test the title and the description are scanned, each posting counts once per term
+        df = pd.DataFrame({
+            'job_title': ['Java Developer', 'Data Analyst', 'Kế toán', None],
+            'job_description': ['Java, Spring, Docker. Java 17', None, 'Excel, python', 'Docker, AWS'],
+        })
+        term_sets, counts = self.matcher.extract(df)
+
+        self.assertEqual(list(term_sets), [{'java', 'docker'}, {'data'}, {'python'}, {'docker', 'aws'}])
+        self.assertEqual(list(counts['tech']), list(default_tech_terms))
+        self.assertEqual(dict(zip(counts['tech'], counts['count'])),
+                         {'ba': 0, 'devops': 0, 'data': 1, '.net': 0, 'python': 1, 'java': 1, 'react': 0,
+                          'aws': 1, 'docker': 2, 'node': 0})
+
+        # Only the title when df has no job_description
+        _, counts = self.matcher.extract(df[['job_title']])
+        self.assertEqual(counts['count'].sum(), 2)
+
+    def test_term_counts_weights(self):
+        # Test the weights (number of postings of each distinct title) are summed
+        term_sets = self.matcher.match_series(pd.Series(['Java Developer', 'Python, Java']))
+        counts = self.matcher.term_counts(term_sets, weights=[3, 2])
+        self.assertEqual(dict(zip(counts['tech'], counts['count']))['java'], 5)
+        self.assertEqual(dict(zip(counts['tech'], counts['count']))['python'], 2)
+
+    def test_same_as_keyword_loop(self):
+        # Test the single pass finds the same postings as one search per keyword, with many terms
+        terms = {f'term{i}': [f'term{i}', f'term {i} lib'] for i in range(300)}
+        matcher = TechTermMatcher(terms)
+        texts = pd.Series([f'Uses term{i}, term{i * 7 % 300}0 and term {i * 3 % 300} lib' for i in range(300)])
+
+        term_sets = matcher.match_series(texts)
+        for term, aliases in terms.items():
+            expected = texts.str.lower().apply(lambda text: any(
+                re.search(r'(?<!\w)' + re.escape(alias) + r'(?!\w)', text) for alias in aliases))
+            self.assertEqual(list(term_sets.apply(lambda term_set: term in term_set)), list(expected), term)
+
+    def test_load_tech_terms(self):
+        # Test the term list file: one term per line with its aliases, comments skipped
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'tech_terms.txt')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('# Tech terms\nPython\n\nKubernetes: k8s, K8S  # container\n')
+
+            self.assertEqual(load_tech_terms(path), {'python': ['python'], 'kubernetes': ['kubernetes', 'k8s', 'k8s']})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,18 @@
 import unittest
+import os
+import numpy as np
 import pandas as pd
-from source.transform import add_salary, split_address, group_job_tile, cleaning_data
+from source.transform import add_salary, add_salary_series, split_address, group_job_tile, group_job_tile_series, \
+    JobTitleClassifier, cleaning_data, clear_memo_cache, add_salary_cached
+from source.schema import apply_schema
 from pandas.testing import assert_frame_equal
 
+# Get current file directory
+current_dir = os.path.dirname(__file__)
+
+# Get project root directory
+project_dir = os.path.abspath(os.path.join(current_dir, '..'))
+
 class Test_CleaningData(unittest.TestCase):
     def setUp(self):
         # Create sample dataframe
@@ -104,6 +114,23 @@ class Test_CleaningData(unittest.TestCase):
         expected = (None, None, None)
         self.assertEqual(result, expected)
 
+    # Test function add_salary_series()
+    def test_add_salary_series_equal_add_salary(self):
+        # Test the columnar parser gives the same result as add_salary() row by row
+        salary_list = [
+            '10 - 20 triệu', '500 - 1,000 USD', '1,5 - 2,5 tỷ', 'Thoả thuận', 'Trên 2000 USD', 'Tới 15 triệu',
+            'Tới 1.5 tỷ', 'Trên 500 nghìn', '300 ngàn', '15 triệu', 'Cạnh tranh', '', None, np.nan, 12345,
+            '10-20-30 triệu', '1,000,000 VND', ' Tới 2,000 usd '
+        ]
+        salary_series = pd.Series(salary_list, index=range(10, 10 + len(salary_list)))
+
+        result = add_salary_series(salary_series)
+
+        expected = pd.DataFrame([add_salary(x) for x in salary_list], index=salary_series.index,
+                                columns=['min_salary', 'max_salary', 'unit'])
+
+        assert_frame_equal(result, expected, check_dtype=False)
+
     # 2. Test function split_address()
     # Separation rules Address = City:District
     def test_split_address_full(self):
@@ -146,6 +173,21 @@ class Test_CleaningData(unittest.TestCase):
         result = group_job_tile('Kế toán')
         self.assertEqual(result, 'Other')
 
+    def test_group_job_tile_series(self):
+        # Test batch classification gives the same result as group_job_tile() row by row
+        job_title_list = ['Thực tập sinh .NET', 'Senior Java Developer (Lập trình viên)', 'Kế toán',
+                          'QA Engineer', 'Business Intelligence Developer', 'Web Designer']
+        result = group_job_tile_series(pd.Series(job_title_list))
+        expected = [group_job_tile(x) for x in job_title_list]
+        self.assertEqual(list(result), expected)
+
+    def test_job_title_classifier_priority(self):
+        # Test overlapping keywords: the first group wins even if its keyword appears later in the title
+        classifier = JobTitleClassifier({'Data': ['data engineer'], 'Software Engineer': ['engineer', 'data']})
+        self.assertEqual(classifier.classify('Big Data Engineer'), 'Data')
+        self.assertEqual(classifier.classify('Data Analyst'), 'Software Engineer')
+        self.assertEqual(classifier.classify('Kế toán'), 'Other')
+
     # 4. Test function cleaning_data()
     def test_cleaning_data_integration(self):
         cleaning_data(self.sample_data)
@@ -156,5 +198,64 @@ class Test_CleaningData(unittest.TestCase):
 
         assert_frame_equal(self.sample_data, self.expected_data, check_dtype=False)
 
+    def test_cleaning_data_memoize(self):
+        # Test memoize mode gives the same result as the default mode, with repeated values
+        sample_data = pd.concat([self.sample_data] * 3, ignore_index=True)
+        expected_data = sample_data.copy()
+        cleaning_data(expected_data)
+
+        clear_memo_cache()
+        cleaning_data(sample_data, memoize=True)
+
+        assert_frame_equal(sample_data, expected_data, check_dtype=False)
+        # Each distinct salary is parsed only once
+        self.assertEqual(add_salary_cached.cache_info().misses, 4)
+
+    def test_cleaning_data_memoize_missing_title(self):
+        # Test a missing job_title goes to the default group in memoize mode too
+        sample_data = self.sample_data.copy()
+        sample_data.loc[1, 'job_title'] = np.nan
+        expected_data = sample_data.copy()
+        cleaning_data(expected_data)
+
+        cleaning_data(sample_data, memoize=True)
+
+        self.assertEqual(sample_data.loc[1, 'job_group'], 'Other')
+        assert_frame_equal(sample_data, expected_data, check_dtype=False)
+
+    def test_cleaning_data_typed(self):
+        # Test the typed schema gives the same values with categorical derived columns and less memory
+        sample_data = pd.concat([self.sample_data] * 50, ignore_index=True)
+        expected_data = sample_data.copy()
+        cleaning_data(expected_data)
+
+        apply_schema(sample_data)
+        cleaning_data(sample_data, typed=True)
+
+        for column in ['unit', 'city', 'district', 'job_group']:
+            self.assertIsInstance(sample_data[column].dtype, pd.CategoricalDtype)
+        self.assertLess(sample_data.memory_usage(deep=True).sum(), expected_data.memory_usage(deep=True).sum() / 3)
+
+        # Same values (missing values as None)
+        result = sample_data.astype(object).where(sample_data.notna(), None)
+        expected_data = expected_data.astype(object).where(expected_data.notna(), None)
+        assert_frame_equal(result, expected_data)
+
+    def test_cleaning_data_parallel(self):
+        # Test the parallel mode gives exactly the serial result, in the same row order
+        data = pd.read_csv(os.path.join(project_dir, 'data', 'data.csv'))
+
+        for typed in [False, True]:
+            with self.subTest(typed=typed):
+                expected_data = data.copy()
+                if typed:
+                    apply_schema(expected_data)
+                parallel_data = expected_data.copy()
+
+                cleaning_data(expected_data, typed=typed)
+                cleaning_data(parallel_data, typed=typed, workers=2, partition_size=300)
+
+                assert_frame_equal(parallel_data, expected_data)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file